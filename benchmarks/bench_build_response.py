@@ -0,0 +1,178 @@
+"""Benchmark of the construction of the report from the dataframes of a workflow.
+
+Compares `build_response` with its previous implementation, which looked up the motivation
+of each company in the whole motivations frame and validated every labeled chunk, on
+synthetic frames of growing universes. Run with:
+
+    uv run python benchmarks/bench_build_response.py --rows 100000
+"""
+
+import argparse
+import math
+import os
+import time
+import tracemalloc
+
+os.environ.setdefault("BIGDATA_API_KEY", "benchmark")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from bigdata_thematic_screener.models import (  # noqa: E402
+    CompanyScoring,
+    LabeledChunk,
+    LabeledContent,
+    ThematicScreenerResponse,
+    ThemeScore,
+    ThemeScoring,
+    ThemeTaxonomy,
+)
+from bigdata_thematic_screener.service import (  # noqa: E402
+    SemanticTree,
+    build_response,
+)
+
+
+def build_response_before(
+    df_company: pd.DataFrame,
+    df_motivation: pd.DataFrame,
+    df_labeled: pd.DataFrame,
+    theme_tree: SemanticTree,
+) -> ThematicScreenerResponse:
+    """`build_response` before the column-oriented construction."""
+    theme_scoring = {}
+    for record in df_company.to_dict(orient="records"):
+        company = record.pop("Company")
+        ticker = record.pop("Ticker")
+        industry = record.pop("Industry")
+        motivation = df_motivation.loc[df_motivation["Company"] == company][
+            "Motivation"
+        ].values[0]
+        composite_score = record.pop("Composite Score")
+        theme_scoring[company] = CompanyScoring(
+            ticker=ticker,
+            industry=industry,
+            motivation=motivation,
+            composite_score=composite_score,
+            themes=ThemeScore(
+                root={
+                    k: v
+                    for k, v in record.items()
+                    if isinstance(v, int) and not math.isnan(v)
+                }
+            ),
+        )
+
+    return ThematicScreenerResponse(
+        theme_taxonomy=ThemeTaxonomy(**theme_tree._to_dict()),  # ty: ignore[missing-argument]
+        theme_scoring=ThemeScoring(root=theme_scoring),
+        content=LabeledContent(
+            root=[
+                LabeledChunk(
+                    time_period=record["Time Period"],
+                    date=record["Date"],
+                    company=record["Company"],
+                    sector=record["Sector"],
+                    industry=record["Industry"],
+                    country=record["Country"],
+                    ticker=record["Ticker"],
+                    document_id=record["Document ID"],
+                    headline=record["Headline"],
+                    quote=record["Quote"],
+                    motivation=record["Motivation"],
+                    theme=record["Theme"],
+                )
+                for record in df_labeled.to_dict(orient="records")
+            ]
+        ),
+    )
+
+
+def make_frames(
+    companies: int, rows: int, themes: int, seed: int = 0
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, SemanticTree]:
+    rng = np.random.default_rng(seed)
+    names = [f"Company {i}" for i in range(companies)]
+    theme_names = [f"Theme {i}" for i in range(themes)]
+    scores = rng.integers(0, 20, size=(companies, themes))
+    df_company = pd.DataFrame(scores, columns=theme_names)
+    df_company.insert(0, "Company", names)
+    df_company.insert(1, "Ticker", [f"T{i}" for i in range(companies)])
+    df_company.insert(2, "Industry", [f"Industry {i % 50}" for i in range(companies)])
+    df_company["Composite Score"] = scores.sum(axis=1)
+    df_motivation = pd.DataFrame(
+        {"Company": names, "Motivation": [f"Motivation of {name}" for name in names]}
+    )
+
+    company_index = rng.integers(0, companies, size=rows)
+    df_labeled = pd.DataFrame(
+        {
+            "Time Period": [f"2025Q{i % 4 + 1}" for i in range(rows)],
+            "Date": [f"2025-01-{i % 28 + 1:02d}" for i in range(rows)],
+            "Company": [names[i] for i in company_index],
+            "Sector": [f"Sector {i % 11}" for i in company_index],
+            "Industry": [f"Industry {i % 50}" for i in company_index],
+            "Country": "US",
+            "Ticker": [f"T{i}" for i in company_index],
+            "Document ID": [f"D{i}" for i in range(rows)],
+            "Headline": [f"Headline {i % 1000}" for i in range(rows)],
+            "Quote": [f"Quote {i} about the theme of the company" for i in range(rows)],
+            "Motivation": [f"Label motivation {i % 100}" for i in range(rows)],
+            "Theme": [theme_names[i % themes] for i in range(rows)],
+        }
+    )
+    theme_tree = SemanticTree(
+        label="Root",
+        node=1,
+        summary="Root",
+        children=[
+            SemanticTree(label=name, node=i + 2, summary=name)
+            for i, name in enumerate(theme_names)
+        ],
+    )
+    return df_company, df_motivation, df_labeled, theme_tree
+
+
+def measure(function, frames, repeat: int) -> tuple[float, float]:
+    """Best time in seconds over `repeat` runs, and peak memory in MiB of one run."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*frames)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    function(*frames)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings), peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--companies", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--themes", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        f"{'companies':>9} {'rows':>8} {'before s':>9} {'after s':>8} {'speedup':>8} "
+        f"{'before MiB':>10} {'after MiB':>9}"
+    )
+    for companies in args.companies:
+        frames = make_frames(companies, args.rows, args.themes)
+        assert build_response_before(*frames) == build_response(*frames)
+        before_seconds, before_memory = measure(
+            build_response_before, frames, args.repeat
+        )
+        after_seconds, after_memory = measure(build_response, frames, args.repeat)
+        print(
+            f"{companies:>9} {args.rows:>8} {before_seconds:>9.2f} {after_seconds:>8.2f} "
+            f"{before_seconds / after_seconds:>7.1f}x {before_memory:>10.1f} "
+            f"{after_memory:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Benchmark of the storage of reports as plain and compressed JSON in a SQLite database.
+
+Stores synthetic reports of growing numbers of labeled chunks in each report format, and
+reports the stored size, the compression ratio against plain JSON and the time to write and
+read a report. zstd is only measured when zstandard is installed. Run with:
+
+    uv run python benchmarks/bench_report_storage.py --chunks 1000 10000 50000
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from uuid import uuid4
+
+os.environ.setdefault("BIGDATA_API_KEY", "benchmark")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from sqlmodel import Session, SQLModel, create_engine  # noqa: E402
+
+from bigdata_thematic_screener.api.models import (  # noqa: E402
+    DocumentType,
+    FrequencyEnum,
+    ThematicScreenRequest,
+)
+from bigdata_thematic_screener.api.report_format import (  # noqa: E402
+    GZIP_REPORT_FORMAT,
+    JSON_REPORT_FORMAT,
+    ZSTD_AVAILABLE,
+    ZSTD_REPORT_FORMAT,
+)
+from bigdata_thematic_screener.api.sql_models import (  # noqa: E402
+    SQLThematicScreenerReport,
+)
+from bigdata_thematic_screener.models import (  # noqa: E402
+    CompanyScoring,
+    LabeledChunk,
+    LabeledContent,
+    ThematicScreenerResponse,
+    ThemeScore,
+    ThemeScoring,
+    ThemeTaxonomy,
+)
+
+WORDS = (
+    "supply chain reshoring manufacturing capacity tariffs suppliers Mexico Vietnam "
+    "nearshoring inventory logistics costs margin demand customers production plants "
+    "investment quarter guidance growth risk exposure diversification semiconductors"
+).split()
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_report(chunks: int, companies: int = 500, seed: int = 0):
+    rng = random.Random(seed)
+    themes = [f"Theme {i}" for i in range(10)]
+    names = [f"Company {i}" for i in range(companies)]
+    return ThematicScreenerResponse(
+        theme_taxonomy=ThemeTaxonomy(label="Root", node=1, summary="Root"),
+        theme_scoring=ThemeScoring(
+            root={
+                name: CompanyScoring(
+                    ticker=f"T{i}",
+                    industry=f"Industry {i % 50}",
+                    motivation=sentence(rng, 60),
+                    composite_score=10,
+                    themes=ThemeScore(root={theme: 1 for theme in themes}),
+                )
+                for i, name in enumerate(names)
+            }
+        ),
+        content=LabeledContent(
+            root=[
+                LabeledChunk(
+                    time_period=f"2025Q{i % 4 + 1}",
+                    date=f"2025-01-{i % 28 + 1:02d}",
+                    company=names[i % companies],
+                    sector=f"Sector {i % 11}",
+                    industry=f"Industry {i % 50}",
+                    country="US",
+                    ticker=f"T{i % companies}",
+                    document_id=f"{rng.getrandbits(128):032X}",
+                    headline=sentence(rng, 8),
+                    quote=sentence(rng, 50),
+                    motivation=sentence(rng, 25),
+                    theme=themes[i % len(themes)],
+                )
+                for i in range(chunks)
+            ]
+        ),
+    )
+
+
+def measure(engine, request, report, report_format: str, repeat: int):
+    """Stored size in bytes, and best write and read times in seconds."""
+    write_timings, read_timings = [], []
+    for _ in range(repeat):
+        request_id = uuid4()
+        start = time.perf_counter()
+        with Session(engine) as session:
+            session.add(
+                SQLThematicScreenerReport.from_thematic_screener_response(
+                    request_id, request, report, report_format=report_format
+                )
+            )
+            session.commit()
+        write_timings.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with Session(engine) as session:
+            sql_report = session.get(SQLThematicScreenerReport, request_id)
+            sql_report.load_report()  # ty: ignore[possibly-missing-attribute]
+        read_timings.append(time.perf_counter() - start)
+
+        size = (
+            len(json.dumps(sql_report.screener_report).encode())  # ty: ignore[possibly-missing-attribute]
+            if report_format == JSON_REPORT_FORMAT
+            else len(sql_report.report_blob)  # ty: ignore[possibly-missing-attribute, invalid-argument-type]
+        )
+    return size, min(write_timings), min(read_timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    report_formats = [JSON_REPORT_FORMAT, GZIP_REPORT_FORMAT]
+    if ZSTD_AVAILABLE:
+        report_formats.append(ZSTD_REPORT_FORMAT)
+    request = ThematicScreenRequest(
+        theme="Supply Chain Reshaping",
+        companies=["4A6F00"],
+        start_date="2025-01-01",
+        end_date="2025-12-31",
+        fiscal_year=2025,
+        document_type=DocumentType.TRANSCRIPTS,
+        frequency=FrequencyEnum.monthly,
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{directory}/benchmark.db")
+        SQLModel.metadata.create_all(engine)
+        print(
+            f"{'chunks':>7} {'format':>12} {'MiB':>8} {'ratio':>6} {'write s':>8} "
+            f"{'read s':>7}"
+        )
+        for chunks in args.chunks:
+            report = make_report(chunks)
+            json_size = None
+            for report_format in report_formats:
+                size, write_seconds, read_seconds = measure(
+                    engine, request, report, report_format, args.repeat
+                )
+                json_size = json_size or size
+                print(
+                    f"{chunks:>7} {report_format:>12} {size / 1024 / 1024:>8.2f} "
+                    f"{json_size / size:>5.1f}x {write_seconds:>8.3f} {read_seconds:>7.3f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
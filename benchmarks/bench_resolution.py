@@ -0,0 +1,80 @@
+"""Benchmark of the entity resolution of large universes against a fake knowledge graph.
+
+The fake knowledge graph answers after a fixed round-trip latency plus a latency per
+requested ID, like a real service serializing larger payloads. Run with:
+
+    uv run python benchmarks/bench_resolution.py --universe-size 5000
+"""
+
+import argparse
+import os
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("BIGDATA_API_KEY", "benchmark")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from bigdata_thematic_screener.resolution import (  # noqa: E402
+    get_entities_in_chunks,
+)
+
+
+class FakeKnowledgeGraph:
+    def __init__(self, round_trip_seconds: float, seconds_per_id: float):
+        self.round_trip_seconds = round_trip_seconds
+        self.seconds_per_id = seconds_per_id
+
+    def get_entities(self, entity_ids: list[str]) -> list:
+        time.sleep(self.round_trip_seconds + self.seconds_per_id * len(entity_ids))
+        return [
+            SimpleNamespace(id=entity_id, entity_type="COMP")
+            for entity_id in entity_ids
+        ]
+
+
+def run(bigdata, entity_ids: list[str], repeat: int, **kwargs) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        get_entities_in_chunks(bigdata, entity_ids, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--universe-size", type=int, default=5000)
+    parser.add_argument("--round-trip-ms", type=float, default=100)
+    parser.add_argument("--ms-per-id", type=float, default=0.5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    bigdata = SimpleNamespace(
+        knowledge_graph=FakeKnowledgeGraph(
+            args.round_trip_ms / 1000, args.ms_per_id / 1000
+        )
+    )
+    entity_ids = [f"{i:06X}" for i in range(args.universe_size)]
+
+    single_call = run(
+        bigdata, entity_ids, args.repeat, chunk_size=len(entity_ids), max_workers=1
+    )
+    print(f"{'chunk size':>10} {'workers':>8} {'seconds':>8} {'speedup':>8}")
+    print(f"{len(entity_ids):>10} {1:>8} {single_call:>8.2f} {1:>8.1f}x")
+    for chunk_size in (250, 500, 1000):
+        for max_workers in (2, 4, 8):
+            elapsed = run(
+                bigdata,
+                entity_ids,
+                args.repeat,
+                chunk_size=chunk_size,
+                max_workers=max_workers,
+            )
+            print(
+                f"{chunk_size:>10} {max_workers:>8} {elapsed:>8.2f} "
+                f"{single_call / elapsed:>8.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
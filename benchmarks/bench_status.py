@@ -0,0 +1,130 @@
+"""Benchmark of `/status` for completed reports, served as stored or validated again.
+
+Stores the same synthetic report as a report stored before reports were tagged with their
+format, which is validated and serialized again on every request as all reports were
+before, and as tagged JSON and gzip reports, which are sent as stored. Prints the response
+time and the peak memory of the first request, and the best response time of the following
+ones, answered from the encoded body cache for tagged reports. Run with:
+
+    uv run python benchmarks/bench_status.py --chunks 10000 100000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from uuid import uuid4
+
+directory = tempfile.mkdtemp()
+os.environ.setdefault("BIGDATA_API_KEY", "benchmark")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ["DB_STRING"] = f"sqlite:///{directory}/benchmark.db"
+os.environ["ENCODED_BODY_CACHE_PATH"] = f"{directory}/encoded_body_cache.db"
+
+from bench_report_storage import make_report  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+
+from bigdata_thematic_screener.api.app import (  # noqa: E402
+    app,
+    create_db_and_tables,
+    engine,
+)
+from bigdata_thematic_screener.api.models import (  # noqa: E402
+    DocumentType,
+    FrequencyEnum,
+    ThematicScreenRequest,
+)
+from bigdata_thematic_screener.api.report_format import (  # noqa: E402
+    GZIP_REPORT_FORMAT,
+    JSON_REPORT_FORMAT,
+)
+from bigdata_thematic_screener.api.storage import StorageManager  # noqa: E402
+
+# Reports stored before they were tagged with their format
+UNTAGGED = "untagged"
+
+
+def store_report(report, report_format: str):
+    request = ThematicScreenRequest(
+        theme="Supply Chain Reshaping",
+        companies=["4A6F00"],
+        start_date="2025-01-01",
+        end_date="2025-12-31",
+        fiscal_year=2025,
+        document_type=DocumentType.TRANSCRIPTS,
+        frequency=FrequencyEnum.monthly,
+    )
+    request_id = uuid4()
+    with Session(engine) as session:
+        storage_manager = StorageManager(session)
+        storage_manager.create_workflow(request_id, request, None, 60)
+        storage_manager.mark_workflow_as_completed(request_id, request, report)
+        sql_report = storage_manager._get_workflow_report(request_id)
+        sql_report.store_report(  # ty: ignore[possibly-missing-attribute]
+            report,
+            JSON_REPORT_FORMAT if report_format == UNTAGGED else report_format,
+        )
+        if report_format == UNTAGGED:
+            sql_report.report_format = None  # ty: ignore[invalid-assignment]
+        session.commit()
+    return request_id
+
+
+def measure(
+    client, request_id, memory_request_id, repeat: int
+) -> tuple[float, float, float, dict]:
+    """Time in seconds of the first request of `request_id`, peak memory in MiB of the first
+    request of `memory_request_id`, storing the same report, best time in seconds of `repeat`
+    more requests, answered from the encoded body cache when the report is sent as stored,
+    and the report sent."""
+    start = time.perf_counter()
+    response = client.get(f"/status/{request_id}")
+    first_seconds = time.perf_counter() - start
+    tracemalloc.start()
+    client.get(f"/status/{memory_request_id}")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        client.get(f"/status/{request_id}")
+        timings.append(time.perf_counter() - start)
+    return first_seconds, peak / 1024 / 1024, min(timings), response.json()["report"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    client = TestClient(app)
+    print(
+        f"{'chunks':>7} {'stored as':>12} {'first s':>8} {'speedup':>8} {'MiB':>8} "
+        f"{'repeat s':>9}"
+    )
+    for chunks in args.chunks:
+        report = make_report(chunks)
+        untagged_seconds = None
+        sent_reports = []
+        for report_format in (UNTAGGED, JSON_REPORT_FORMAT, GZIP_REPORT_FORMAT):
+            seconds, memory, repeat_seconds, sent_report = measure(
+                client,
+                store_report(report, report_format),
+                store_report(report, report_format),
+                args.repeat,
+            )
+            untagged_seconds = untagged_seconds or seconds
+            sent_reports.append(sent_report)
+            print(
+                f"{chunks:>7} {report_format:>12} {seconds:>8.2f} "
+                f"{untagged_seconds / seconds:>7.1f}x {memory:>8.1f} {repeat_seconds:>9.3f}"
+            )
+        assert all(sent == sent_reports[0] for sent in sent_reports)
+
+
+if __name__ == "__main__":
+    main()
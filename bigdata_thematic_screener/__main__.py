@@ -1,10 +1,33 @@
+import argparse
+
 from bigdata_thematic_screener import LOG_LEVEL
-from bigdata_thematic_screener.api.app import app
 from bigdata_thematic_screener.settings import settings
 
 if __name__ == "__main__":
-    import uvicorn
-
-    uvicorn.run(
-        app, host=settings.HOST, port=settings.PORT, log_level=LOG_LEVEL.lower()
+    parser = argparse.ArgumentParser(prog="python -m bigdata_thematic_screener")
+    parser.add_argument(
+        "mode",
+        nargs="?",
+        choices=["api", "worker", "migrate-reports"],
+        default="api",
+        help="Serve the API (default), run the workflows queued in the database, or "
+        "convert the stored reports to the format set by REPORT_COMPRESSION.",
     )
+    args = parser.parse_args()
+
+    if args.mode == "worker":
+        from bigdata_thematic_screener.worker import run_worker
+
+        run_worker()
+    elif args.mode == "migrate-reports":
+        from bigdata_thematic_screener.api.sql_models import run_report_migration
+
+        run_report_migration()
+    else:
+        import uvicorn
+
+        from bigdata_thematic_screener.api.app import app
+
+        uvicorn.run(
+            app, host=settings.HOST, port=settings.PORT, log_level=LOG_LEVEL.lower()
+        )
@@ -1,37 +1,103 @@
-from functools import partial
+from collections.abc import AsyncIterator, Iterator
+from datetime import date, timedelta
+from threading import Lock
 from typing import Annotated
 from uuid import UUID, uuid4
 
 from bigdata_client import Bigdata
 from bigdata_client.models.search import DocumentType
-from fastapi import BackgroundTasks, Body, Depends, FastAPI, HTTPException, Security
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import (
+    Body,
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    Security,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from pydantic import ValidationError
 from sqlmodel import Session, SQLModel, create_engine
 
 from bigdata_thematic_screener import LOG_LEVEL, __version__, logger
+from bigdata_thematic_screener.api.compression import (
+    CachedStaticFiles,
+    CompressionMiddleware,
+    encode_body,
+    encoded_body_stats,
+    encoded_response,
+    get_encoded_body_cache,
+    negotiate_encoding,
+)
+from bigdata_thematic_screener.api.events import (
+    TERMINAL_STATUSES,
+    WorkflowEvent,
+    WorkflowEventType,
+    event_broker,
+)
 from bigdata_thematic_screener.api.models import (
+    BatchReport,
+    CachedThemeTaxonomy,
+    CacheMode,
     ExampleWatchlists,
+    LabeledContentPage,
+    ThematicScreenBatchRequest,
+    ThematicScreenBatchResponse,
     ThematicScreenerAcceptedResponse,
     ThematicScreenerStatusResponse,
+    ThematicScreenExtendRequest,
     ThematicScreenRequest,
     WorkflowStatus,
 )
+from bigdata_thematic_screener.api.scheduler import (
+    JobScheduler,
+    QueueFullError,
+    RepeatingTask,
+)
 from bigdata_thematic_screener.api.secure import query_scheme
+from bigdata_thematic_screener.api.sql_models import (
+    add_missing_columns,
+    migrate_workflow_logs,
+)
 from bigdata_thematic_screener.api.storage import StorageManager
-from bigdata_thematic_screener.api.utils import get_example_values_from_schema
-from bigdata_thematic_screener.service import process_request
+from bigdata_thematic_screener.api.utils import (
+    compute_etag,
+    dumps_json,
+    dumps_with_raw_json,
+    etag_matches,
+    get_example_values_from_schema,
+)
+from bigdata_thematic_screener.cache import all_cache_stats, get_cache_stats
+from bigdata_thematic_screener.checkpoints import get_workflow_checkpoints
+from bigdata_thematic_screener.llm_cache import install_configured_llm_response_cache
+from bigdata_thematic_screener.rate_limit import install_configured_rate_limits
 from bigdata_thematic_screener.settings import UNSET, settings
 from bigdata_thematic_screener.templates import loader
 from bigdata_thematic_screener.traces import TraceEventName, send_trace
+from bigdata_thematic_screener.worker import WorkflowWorker
 
 BIGDATA: Bigdata | None = None
+# Runs the workflows in this process, unless RUN_WORKFLOWS is disabled
+WORKER: WorkflowWorker | None = None
 engine = create_engine(settings.DB_STRING, echo=LOG_LEVEL == "DEBUG")
+report_cache_stats = get_cache_stats("reports")
+# Serializes the lookup of a running identical workflow and the creation of a new one
+coalescing_lock = Lock()
+scheduler = JobScheduler(
+    max_concurrent_jobs=settings.MAX_CONCURRENT_WORKFLOWS,
+    max_queued_jobs=settings.MAX_QUEUED_WORKFLOWS,
+)
 
 
 def create_db_and_tables():
     logger.info("Setting up data storage", db_string=settings.DB_STRING)
     SQLModel.metadata.create_all(engine)
+    add_missing_columns(engine)
+    migrate_workflow_logs(engine)
 
 
 def get_session():
@@ -40,11 +106,11 @@ def get_session():
 
 
 def get_storage_manager(session: Session = Depends(get_session)) -> StorageManager:
-    return StorageManager(session)
+    return StorageManager(session, event_broker=event_broker)
 
 
 def lifespan(app: FastAPI):
-    global BIGDATA
+    global BIGDATA, WORKER
     logger.info("Starting thematic screener service")
 
     # Instantiate Bigdata client
@@ -60,8 +126,35 @@ def lifespan(app: FastAPI):
         )
 
     create_db_and_tables()
+    if settings.RUN_WORKFLOWS:
+        install_configured_llm_response_cache()
+        install_configured_rate_limits(engine)
+        WORKER = WorkflowWorker(
+            engine, bigdata=BIGDATA, scheduler=scheduler, event_broker=event_broker
+        )
+        scheduler.start()
+        # Resume the workflows left behind by a previous run of the service
+        maintain_workflow_queue()
+        lease_maintenance.start()
     yield
 
+    if WORKER is not None:
+        lease_maintenance.stop()
+        scheduler.shutdown(wait=False)
+        WORKER = None
+
+
+def maintain_workflow_queue():
+    if WORKER is not None:
+        WORKER.maintain_queue()
+
+
+lease_maintenance = RepeatingTask(
+    "workflow-lease-maintenance",
+    interval=settings.WORKFLOW_LEASE_SECONDS / 3,
+    function=maintain_workflow_queue,
+)
+
 
 app = FastAPI(
     title="Thematic screener API",
@@ -70,7 +163,13 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
-app.mount("/static", StaticFiles(directory=settings.STATIC_DIR), name="static")
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.RESPONSE_COMPRESSION_MIN_BYTES,
+    # Static files are compressed, and cached, by `CachedStaticFiles`
+    excluded_paths=("/static/",),
+)
+app.mount("/static", CachedStaticFiles(directory=settings.STATIC_DIR), name="static")
 
 
 @app.get(
@@ -81,6 +180,57 @@ def health_check():
     return {"status": "ok", "version": __version__}
 
 
+@app.get(
+    "/cache/stats",
+    summary="Hit and miss counters of the caches used by the service",
+)
+def cache_stats(_: str = Security(query_scheme)) -> dict[str, dict]:
+    return all_cache_stats()
+
+
+@app.get(
+    "/taxonomies",
+    summary="List the cached theme trees",
+)
+def list_taxonomies(
+    storage_manager: StorageManager = Depends(get_storage_manager),
+    _: str = Security(query_scheme),
+) -> list[CachedThemeTaxonomy]:
+    """Theme trees are generated once per theme, focus and LLM model, and reused by the following
+    workflows screening for the same theme. Most recently used first."""
+    return storage_manager.list_taxonomies()
+
+
+@app.delete(
+    "/taxonomies/{taxonomy_id}",
+    summary="Evict a cached theme tree",
+    status_code=204,
+)
+def evict_taxonomy(
+    taxonomy_id: str,
+    storage_manager: StorageManager = Depends(get_storage_manager),
+    _: str = Security(query_scheme),
+) -> Response:
+    """The next workflow screening for its theme, focus and LLM model generates a new tree."""
+    if not storage_manager.evict_taxonomy(taxonomy_id):
+        raise HTTPException(status_code=404, detail="Taxonomy not found")
+    return Response(status_code=204)
+
+
+@app.delete(
+    "/taxonomies",
+    summary="Evict the cached theme trees",
+)
+def evict_taxonomies(
+    theme: str | None = Query(
+        default=None, description="Only evict the theme trees of this theme."
+    ),
+    storage_manager: StorageManager = Depends(get_storage_manager),
+    _: str = Security(query_scheme),
+) -> dict[str, int]:
+    return {"evicted": storage_manager.evict_taxonomies(theme)}
+
+
 @app.get(
     "/",
     summary="Example frontend for testing the thematic screener.",
@@ -100,62 +250,692 @@ async def sample_frontend(_: str = Security(query_scheme)) -> HTMLResponse:
     )
 
 
+def raise_queue_full():
+    raise HTTPException(
+        status_code=429,
+        detail="Too many workflows are waiting to run, please try again later.",
+        headers={"Retry-After": str(settings.QUEUE_RETRY_AFTER_SECONDS)},
+    )
+
+
+def start_workflow(
+    request: ThematicScreenRequest,
+    cache: CacheMode,
+    storage_manager: StorageManager,
+    extends_id: UUID | None = None,
+) -> JSONResponse:
+    """Reuse the report of an identical recent request, follow an identical running
+    workflow, or queue a new workflow for the request."""
+    if cache == CacheMode.USE and settings.REPORT_CACHE_TTL_SECONDS > 0:
+        cached_request_id = storage_manager.find_cached_report(
+            request.canonical_hash(),
+            max_age=timedelta(seconds=settings.REPORT_CACHE_TTL_SECONDS),
+        )
+        if cached_request_id is not None:
+            report_cache_stats.record_hit()
+            return JSONResponse(
+                status_code=200,
+                content=ThematicScreenerAcceptedResponse(
+                    request_id=str(cached_request_id),
+                    status=WorkflowStatus.COMPLETED,
+                    cached=True,
+                ).model_dump(),
+            )
+        report_cache_stats.record_miss()
+
+    request_id = uuid4()
+    request_hash = request.canonical_hash()
+    with coalescing_lock:
+        leader_id = storage_manager.find_running_workflow(request_hash)
+        if leader_id is not None:
+            status = storage_manager.attach_to_workflow(request_id, request, leader_id)
+            return JSONResponse(
+                status_code=202,
+                content=ThematicScreenerAcceptedResponse(
+                    request_id=str(request_id), status=status
+                ).model_dump(),
+            )
+
+        if WORKER is None:
+            # Queued for the workers sharing the database
+            if (
+                storage_manager.count_queued_workflows()
+                >= settings.MAX_QUEUED_WORKFLOWS
+            ):
+                raise_queue_full()
+        elif scheduler.is_full():
+            raise_queue_full()
+
+        storage_manager.create_workflow(
+            request_id,
+            request,
+            lease_owner=WORKER.worker_id if WORKER is not None else None,
+            lease_seconds=settings.WORKFLOW_LEASE_SECONDS,
+            extends_id=extends_id,
+        )
+
+    if WORKER is None:
+        return JSONResponse(
+            status_code=202,
+            content=ThematicScreenerAcceptedResponse(
+                request_id=str(request_id), status=WorkflowStatus.QUEUED
+            ).model_dump(),
+        )
+
+    try:
+        WORKER.submit(request, request_id)
+    except QueueFullError:
+        storage_manager.log_message(
+            request_id, "Workflow rejected, too many workflows are waiting to run."
+        )
+        storage_manager.update_status(request_id, WorkflowStatus.FAILED)
+        raise_queue_full()
+
+    return JSONResponse(
+        status_code=202,
+        content=ThematicScreenerAcceptedResponse(
+            request_id=str(request_id), status=WorkflowStatus.QUEUED
+        ).model_dump(),
+    )
+
+
 @app.post(
     "/thematic-screener",
     summary="Generate a thematic screener report on your universe",
     response_model=ThematicScreenerAcceptedResponse,
+    status_code=202,
+    responses={
+        200: {
+            "model": ThematicScreenerAcceptedResponse,
+            "description": "An identical request was completed recently, its report is reused",
+        },
+        429: {"description": "Too many workflows are waiting to run"},
+    },
 )
 def screen_companies(
     request: Annotated[ThematicScreenRequest, Body()],
-    background_tasks: BackgroundTasks,
+    cache: CacheMode = Query(
+        default=CacheMode.USE,
+        description="Use `bypass` to run the workflow even if an identical request was completed recently.",
+    ),
     storage_manager: StorageManager = Depends(get_storage_manager),
     _: str = Security(query_scheme),
 ) -> JSONResponse:
-    """This endpoints starts the generation of the thematic screener workflow on the background
+    """This endpoints queues the generation of the thematic screener workflow on the background
     and will return a request_id that can be used to check the status of the request in the
     `/status/{request_id}` endpoint.
 
+    If an identical request was completed recently, the request_id of its report is returned
+    right away with a `completed` status, unless `cache=bypass` is used. If an identical request
+    is still running, the new request follows it: it shares its logs and status, and gets a copy
+    of its report.
+
+    If too many workflows are already waiting to run, the request is rejected with a 429 status
+    code and a `Retry-After` header.
+
     Note: for now, it only supports transcripts as document type.
     """
     # While we improve the UX of working with several document types with different sets of parameters
     # we will limit the document type to transcripts
     DOCUMENT_TYPE = DocumentType.TRANSCRIPTS
     request.document_type = DOCUMENT_TYPE
-    request_id = uuid4()
 
-    storage_manager.update_status(request_id, WorkflowStatus.QUEUED)
+    return start_workflow(request, cache, storage_manager)
+
+
+@app.post(
+    "/thematic-screener/batch",
+    summary="Generate thematic screener reports on your universe for several themes",
+    response_model=ThematicScreenBatchResponse,
+    status_code=202,
+    responses={429: {"description": "Too many workflows are waiting to run"}},
+)
+def screen_companies_batch(
+    batch_request: Annotated[ThematicScreenBatchRequest, Body()],
+    storage_manager: StorageManager = Depends(get_storage_manager),
+    _: str = Security(query_scheme),
+) -> JSONResponse:
+    """This endpoint queues the screening of the same companies and window for several themes,
+    and returns a batch_id together with the request_id of the report of each theme.
 
-    background_tasks.add_task(
-        partial(
-            process_request,
+    The themes run together: the companies are resolved once and the chunks are searched once
+    with the queries of every theme, then each theme labels them, scores and motivates the
+    companies on its own. Each report can be retrieved from the `/status/{request_id}` endpoint
+    as any other report, and the status of the whole batch from `/thematic-screener/batch/{batch_id}`.
+
+    Reports of identical recent requests are not reused for batches.
+
+    Note: for now, it only supports transcripts as document type.
+    """
+    batch_request.document_type = DocumentType.TRANSCRIPTS
+    requests = batch_request.theme_requests()
+
+    batch_id = uuid4()
+    request_ids = [uuid4() for _ in requests]
+    # A batch takes a single slot of the local queue, but counts as one workflow per
+    # theme in the queue shared by the workers
+    if WORKER is None:
+        if (
+            storage_manager.count_queued_workflows() + len(requests)
+            > settings.MAX_QUEUED_WORKFLOWS
+        ):
+            raise_queue_full()
+    elif scheduler.is_full():
+        raise_queue_full()
+
+    for request_id, request in zip(request_ids, requests):
+        storage_manager.create_workflow(
+            request_id,
             request,
-            bigdata=BIGDATA,
-            request_id=request_id,
-            storage_manager=storage_manager,
+            lease_owner=WORKER.worker_id if WORKER is not None else None,
+            lease_seconds=settings.WORKFLOW_LEASE_SECONDS,
+            batch_id=batch_id,
         )
-    )
+
+    if WORKER is not None:
+        try:
+            WORKER.submit_batch(batch_id)
+        except QueueFullError:
+            for request_id in request_ids:
+                storage_manager.log_message(
+                    request_id,
+                    "Workflow rejected, too many workflows are waiting to run.",
+                )
+                storage_manager.update_status(request_id, WorkflowStatus.FAILED)
+            raise_queue_full()
 
     return JSONResponse(
         status_code=202,
-        content=ThematicScreenerAcceptedResponse(
-            request_id=str(request_id), status=WorkflowStatus.QUEUED
-        ).model_dump(),
+        content=ThematicScreenBatchResponse(
+            batch_id=str(batch_id),
+            status=WorkflowStatus.QUEUED,
+            reports=[
+                BatchReport(
+                    request_id=str(request_id),
+                    theme=request.theme,
+                    focus=request.focus,
+                    status=WorkflowStatus.QUEUED,
+                )
+                for request_id, request in zip(request_ids, requests)
+            ],
+        ).model_dump(mode="json"),
     )
 
 
+@app.get(
+    "/thematic-screener/batch/{batch_id}",
+    summary="Get the status of a batch of thematic screener reports",
+    responses={404: {"description": "Batch ID not found"}},
+)
+def get_batch_status(
+    batch_id: UUID,
+    storage_manager: StorageManager = Depends(get_storage_manager),
+    _: str = Security(query_scheme),
+) -> ThematicScreenBatchResponse:
+    """Get the status of each report of a batch, and of the batch as a whole: completed once
+    every report is completed, failed once every report is finished and one of them failed."""
+    batch = storage_manager.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch ID not found")
+    return batch
+
+
+@app.post(
+    "/thematic-screener/{request_id}/extend",
+    summary="Extend a thematic screener report to a later end date",
+    response_model=ThematicScreenerAcceptedResponse,
+    status_code=202,
+    responses={
+        200: {
+            "model": ThematicScreenerAcceptedResponse,
+            "description": "An identical request was completed recently, its report is reused",
+        },
+        404: {"description": "Request ID not found"},
+        409: {"description": "The report to extend is not completed"},
+        422: {
+            "description": "The end date is not later than the end date of the report"
+        },
+        429: {"description": "Too many workflows are waiting to run"},
+    },
+)
+def extend_report(
+    request_id: UUID,
+    extension: Annotated[ThematicScreenExtendRequest, Body()],
+    cache: CacheMode = Query(
+        default=CacheMode.USE,
+        description="Use `bypass` to run the workflow even if an identical request was completed recently.",
+    ),
+    storage_manager: StorageManager = Depends(get_storage_manager),
+    _: str = Security(query_scheme),
+) -> JSONResponse:
+    """Queue a workflow producing the report of the same request with its end date moved to
+    `end_date`. Only the periods after the end date of the report are searched and labeled;
+    the companies are then scored on the labeled content of the report together with the new
+    chunks, and motivations are only generated again for companies with new content.
+
+    The new report gets its own request_id, to be followed in the `/status/{request_id}`
+    endpoint as any other report.
+    """
+    previous_request = storage_manager.get_request(request_id)
+    if previous_request is None:
+        raise HTTPException(status_code=404, detail="Request ID not found")
+    if storage_manager.get_status(request_id) != WorkflowStatus.COMPLETED:
+        raise HTTPException(
+            status_code=409, detail="Only completed reports can be extended"
+        )
+    if extension.end_date[:10] <= previous_request.end_date[:10]:
+        raise HTTPException(
+            status_code=422,
+            detail=f"end_date must be later than the end date of the report ({previous_request.end_date[:10]})",
+        )
+
+    # Validated again, the new window must pass the same checks as any other request
+    try:
+        request = ThematicScreenRequest.model_validate(
+            {**previous_request.model_dump(mode="json"), "end_date": extension.end_date}
+        )
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors()]
+        )
+    return start_workflow(request, cache, storage_manager, extends_id=request_id)
+
+
 @app.get(
     "/status/{request_id}",
     summary="Get the status of a thematic screener report",
+    responses={304: {"description": "The status has not changed since the given ETag"}},
 )
 def get_status(
     request_id: UUID,
+    response: Response,
+    logs_since: int = Query(
+        default=0,
+        ge=0,
+        description="Only return log lines after this sequence number. Use `last_log_seq` from a previous response.",
+    ),
+    include_report: bool = Query(
+        default=True,
+        description="Whether to include the complete report once the workflow is completed.",
+    ),
+    if_none_match: str | None = Header(default=None),
+    accept_encoding: str | None = Header(default=None),
     storage_manager: StorageManager = Depends(get_storage_manager),
     _: str = Security(query_scheme),
 ) -> ThematicScreenerStatusResponse:
     """Get the status of a thematic screener report by its request_id. If the report is still running,
     you will get the current status and logs. If the report is completed, you will also get the
-    complete report"""
-    report = storage_manager.get_report(request_id)
+    complete report.
+
+    Responses carry an `ETag` header. Send it back in `If-None-Match` to get an empty `304` response
+    while nothing has changed."""
+    last_updated = storage_manager.get_last_updated(request_id)
+    if last_updated is None:
+        raise HTTPException(status_code=404, detail="Request ID not found")
+
+    execution_id = storage_manager.get_execution_id(request_id) or request_id
+    if WORKER is None:
+        queue_position = storage_manager.get_queue_position(execution_id)
+    else:
+        # Workflows of a batch are queued together, under the batch ID
+        queue_position = scheduler.queue_position(
+            storage_manager.get_batch_id(execution_id) or execution_id
+        )
+    # The queue fields are only set while the workflow waits to run
+    queue_depth = None
+    if queue_position is not None:
+        queue_depth = (
+            storage_manager.count_queued_workflows()
+            if WORKER is None
+            else scheduler.queue_depth()
+        )
+    # Each encoding of the body is a different representation, with its own ETag
+    encoding = negotiate_encoding(accept_encoding)
+    etag = compute_etag(
+        request_id,
+        last_updated.isoformat(),
+        logs_since,
+        include_report,
+        queue_position,
+        queue_depth,
+        encoding,
+    )
+    if etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers={"ETag": etag})  # ty: ignore[invalid-return-type]
+
+    # Only the bodies of completed reports are cached. They have no queue fields, so they
+    # only change with the ETag.
+    encoded_body_cache = get_encoded_body_cache()
+    body = encoded_body_cache.get(f"status:{etag}", encoding)
+    if body is not None:
+        encoded_body_stats.record_hit()
+        return encoded_response(  # ty: ignore[invalid-return-type]
+            body, encoding, "application/json", headers={"ETag": etag}
+        )
+
+    # Reports are sent as stored, without validating and serializing them again, unless
+    # they were stored before reports were tagged with their format
+    report_json = (
+        storage_manager.get_report_json(request_id) if include_report else None
+    )
+    report = storage_manager.get_report(
+        request_id,
+        since_seq=logs_since,
+        include_report=include_report and report_json is None,
+    )
     if report is None:
         raise HTTPException(status_code=404, detail="Request ID not found")
+    report.queue_position = queue_position
+    report.queue_depth = queue_depth
+    etag = compute_etag(
+        request_id,
+        report.last_updated.isoformat(),
+        logs_since,
+        include_report,
+        queue_position,
+        queue_depth,
+        encoding,
+    )
+    if report_json is not None:
+        encoded_body_stats.record_miss()
+        body = encode_body(
+            dumps_with_raw_json(report.model_dump(mode="json"), "report", report_json),
+            encoding,
+        )
+        encoded_body_cache.set(f"status:{etag}", encoding, body)
+        return encoded_response(  # ty: ignore[invalid-return-type]
+            body, encoding, "application/json", headers={"ETag": etag}
+        )
+    response.headers["ETag"] = etag
     return report
+
+
+@app.post(
+    "/status/{request_id}/retry",
+    summary="Retry a failed thematic screener report",
+    response_model=ThematicScreenerAcceptedResponse,
+    status_code=202,
+    responses={
+        404: {"description": "Request ID not found"},
+        409: {"description": "The workflow is not failed"},
+        429: {"description": "Too many workflows are waiting to run"},
+    },
+)
+def retry_workflow(
+    request_id: UUID,
+    storage_manager: StorageManager = Depends(get_storage_manager),
+    _: str = Security(query_scheme),
+) -> JSONResponse:
+    """Queue a failed workflow again under the same request_id. The workflow resumes from its
+    last completed stage: the companies, theme tree, chunks and labeled chunks computed by the
+    failed attempt are reused instead of being computed again.
+
+    Requests following a failed workflow are retried with it.
+    """
+    execution_id = storage_manager.get_execution_id(request_id)
+    request = (
+        storage_manager.get_request(execution_id) if execution_id is not None else None
+    )
+    if execution_id is None or request is None:
+        raise HTTPException(status_code=404, detail="Request ID not found")
+    if storage_manager.get_status(execution_id) != WorkflowStatus.FAILED:
+        raise HTTPException(
+            status_code=409, detail="Only failed workflows can be retried"
+        )
+
+    if WORKER is None:
+        if storage_manager.count_queued_workflows() >= settings.MAX_QUEUED_WORKFLOWS:
+            raise_queue_full()
+    elif scheduler.is_full():
+        raise_queue_full()
+
+    if not storage_manager.requeue_workflow(
+        execution_id,
+        lease_owner=WORKER.worker_id if WORKER is not None else None,
+        lease_seconds=settings.WORKFLOW_LEASE_SECONDS,
+    ):
+        raise HTTPException(
+            status_code=409, detail="Only failed workflows can be retried"
+        )
+
+    checkpoints = get_workflow_checkpoints(execution_id)
+    stages = checkpoints.completed_stages() if checkpoints is not None else []
+    storage_manager.log_message(
+        execution_id,
+        f"Retrying workflow, resuming after stages: {', '.join(stages)}"
+        if stages
+        else "Retrying workflow from the start",
+    )
+
+    if WORKER is not None:
+        batch_id = storage_manager.get_batch_id(execution_id)
+        try:
+            if batch_id is None:
+                WORKER.submit(request, execution_id)
+            else:
+                # The batch job claims the queued workflows of the batch
+                WORKER.submit_batch(batch_id)
+        except QueueFullError:
+            storage_manager.log_message(
+                execution_id,
+                "Workflow rejected, too many workflows are waiting to run.",
+            )
+            storage_manager.update_status(execution_id, WorkflowStatus.FAILED)
+            raise_queue_full()
+
+    return JSONResponse(
+        status_code=202,
+        content=ThematicScreenerAcceptedResponse(
+            request_id=str(request_id), status=WorkflowStatus.QUEUED
+        ).model_dump(),
+    )
+
+
+def labeled_content_filters(
+    company: list[str] | None = Query(
+        default=None, description="Only return the chunks of these companies."
+    ),
+    theme: list[str] | None = Query(
+        default=None, description="Only return the chunks labeled with these themes."
+    ),
+    sector: list[str] | None = Query(
+        default=None,
+        description="Only return the chunks of companies in these sectors.",
+    ),
+    period: list[str] | None = Query(
+        default=None,
+        description="Only return the chunks of these time periods, such as `Jan 2025`.",
+    ),
+    date_from: date | None = Query(
+        default=None, description="Only return the chunks dated on or after this day."
+    ),
+    date_to: date | None = Query(
+        default=None, description="Only return the chunks dated on or before this day."
+    ),
+) -> dict:
+    """Filters on the labeled content of a report, as arguments of the storage manager."""
+    return {
+        "company": company,
+        "theme": theme,
+        "sector": sector,
+        "time_period": period,
+        "date_from": date_from,
+        "date_to": date_to,
+    }
+
+
+@app.get(
+    "/reports/{request_id}/content",
+    summary="Page through the labeled content of a thematic screener report",
+    responses={404: {"description": "Report not found"}},
+)
+def get_report_content(
+    request_id: UUID,
+    filters: dict = Depends(labeled_content_filters),
+    cursor: str | None = Query(
+        default=None,
+        description="Use `next_cursor` from a previous response to get the next page.",
+    ),
+    limit: int = Query(
+        default=100, ge=1, le=1000, description="Maximum number of chunks per page."
+    ),
+    storage_manager: StorageManager = Depends(get_storage_manager),
+    _: str = Security(query_scheme),
+) -> LabeledContentPage:
+    """Get the labeled chunks of a completed report, in the order of the report, without
+    loading the whole report. Filters on the same field match any of their values, and filters
+    on different fields must all match. Pages are chained with `next_cursor`, which stays valid
+    whatever the filters, as long as they do not change between pages."""
+    try:
+        after_seq = int(cursor) if cursor is not None else 0
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid cursor")
+    page = storage_manager.get_labeled_content(
+        request_id, **filters, cursor=after_seq, limit=limit
+    )
+    if page is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return page
+
+
+def stream_labeled_content(content_id: UUID, filters: dict) -> Iterator[bytes]:
+    """Stream the labeled chunks stored under `content_id` as NDJSON, one batch of lines
+    at a time. Runs in the threadpool after the request session is closed, so it reads
+    with its own session."""
+    with Session(engine) as session:
+        storage_manager = StorageManager(session)
+        for batch in storage_manager.iter_labeled_chunks(content_id, **filters):
+            yield b"".join(dumps_json(chunk) + b"\n" for chunk in batch)
+
+
+@app.get(
+    "/reports/{request_id}/content.ndjson",
+    summary="Export the labeled content of a thematic screener report as NDJSON",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"application/x-ndjson": {}}},
+        404: {"description": "Report not found"},
+    },
+)
+def get_report_content_ndjson(
+    request_id: UUID,
+    filters: dict = Depends(labeled_content_filters),
+    storage_manager: StorageManager = Depends(get_storage_manager),
+    _: str = Security(query_scheme),
+) -> StreamingResponse:
+    """Export the labeled chunks of a completed report matching the filters, in the order of
+    the report, as newline-delimited JSON with one chunk per line. Chunks are streamed from
+    the storage as they are read, so clients can process them before the export completes,
+    and large reports are exported without being loaded in memory."""
+    content_id = storage_manager.get_labeled_content_id(request_id)
+    if content_id is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return StreamingResponse(
+        stream_labeled_content(content_id, filters),
+        media_type="application/x-ndjson",
+    )
+
+
+async def stream_workflow_events(
+    request_id: UUID, execution_id: UUID, since_seq: int, request: Request
+) -> AsyncIterator[str]:
+    """Stream the logs and status changes of a workflow as Server-Sent Events.
+
+    Events published by workflows running in this process are forwarded as they happen.
+    When the workflow is not running in this process, the storage is tailed instead.
+    `execution_id` is the workflow publishing the events, which differs from `request_id`
+    when the request follows an identical running workflow.
+    """
+    subscription = event_broker.subscribe(execution_id)
+    try:
+        with Session(engine) as session:
+            storage_manager = StorageManager(session)
+            last_seq = since_seq
+            last_status = None
+            tail_storage = True
+            while True:
+                if tail_storage:
+                    entries = await run_in_threadpool(
+                        storage_manager.get_log_entries, request_id, last_seq
+                    )
+                    status = await run_in_threadpool(
+                        storage_manager.get_status, request_id
+                    )
+                    for seq, message in entries or []:
+                        yield WorkflowEvent(
+                            event=WorkflowEventType.LOG, data=message, seq=seq
+                        ).to_sse()
+                        last_seq = seq
+                    events = [] if status is None else [status]
+                else:
+                    event = await subscription.get(
+                        timeout=settings.EVENTS_POLL_INTERVAL_SECONDS
+                    )
+                    if event is None:
+                        if await request.is_disconnected():
+                            return
+                        yield ": keep-alive\n\n"
+                        tail_storage = not event_broker.is_active(execution_id)
+                        continue
+                    if event.event == WorkflowEventType.LOG:
+                        if event.seq is None or event.seq <= last_seq:
+                            continue
+                        if event.seq > last_seq + 1:
+                            # Missed some lines, catch up from the storage
+                            tail_storage = True
+                            continue
+                        yield event.to_sse()
+                        last_seq = event.seq
+                        continue
+                    events = [WorkflowStatus(event.data)]
+
+                for status in events:
+                    if status != last_status:
+                        yield WorkflowEvent(
+                            event=WorkflowEventType.STATUS, data=status.value
+                        ).to_sse()
+                        last_status = status
+                    if status in TERMINAL_STATUSES:
+                        yield WorkflowEvent(
+                            event=WorkflowEventType(status.value), data=str(request_id)
+                        ).to_sse()
+                        return
+                tail_storage = False
+    finally:
+        event_broker.unsubscribe(subscription)
+
+
+@app.get(
+    "/status/{request_id}/events",
+    summary="Stream the progress of a thematic screener report",
+    response_class=StreamingResponse,
+)
+def get_status_events(
+    request_id: UUID,
+    request: Request,
+    logs_since: int = Query(
+        default=0,
+        ge=0,
+        description="Only stream log lines after this sequence number.",
+    ),
+    last_event_id: int | None = Header(default=None),
+    storage_manager: StorageManager = Depends(get_storage_manager),
+    _: str = Security(query_scheme),
+) -> StreamingResponse:
+    """Stream the progress of a thematic screener report as Server-Sent Events.
+
+    - `log` events carry a new log line, with its sequence number as event id.
+    - `status` events carry the new status of the workflow.
+    - A final `completed` or `failed` event is sent before closing the stream. The report can then
+    be retrieved from `/status/{request_id}`.
+    """
+    execution_id = storage_manager.get_execution_id(request_id)
+    if execution_id is None:
+        raise HTTPException(status_code=404, detail="Request ID not found")
+
+    since_seq = max(logs_since, last_event_id or 0)
+    return StreamingResponse(
+        stream_workflow_events(request_id, execution_id, since_seq, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
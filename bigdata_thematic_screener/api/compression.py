@@ -0,0 +1,268 @@
+import gzip
+import hashlib
+import os
+from collections import OrderedDict
+from functools import cache
+from importlib.util import find_spec
+from mimetypes import guess_type
+from pathlib import Path
+from threading import Lock
+
+from fastapi import Response
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder, IdentityResponder
+from starlette.responses import FileResponse
+from starlette.staticfiles import PathLike, StaticFiles
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from bigdata_thematic_screener.api.utils import etag_matches
+from bigdata_thematic_screener.cache import DiskCache, get_cache_stats
+from bigdata_thematic_screener.settings import settings
+
+encoded_body_stats = get_cache_stats("encoded_bodies")
+
+IDENTITY = "identity"
+GZIP = "gzip"
+BROTLI = "br"
+
+# Fast levels, as responses are mostly compressed on the fly
+GZIP_COMPRESSION_LEVEL = 1
+BROTLI_QUALITY = 5
+
+# brotli is optional, installed with the `brotli` extra. Responses are compressed with
+# gzip without it.
+BROTLI_AVAILABLE = find_spec("brotli") is not None
+
+# Media types worth compressing, the other static files (images, fonts) already are
+COMPRESSIBLE_MEDIA_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "image/svg+xml",
+)
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str:
+    """Encoding of a response given the `Accept-Encoding` header of the request: the one
+    with the highest quality among brotli and gzip, brotli on a tie, or identity if the
+    client accepts neither."""
+    qualities = {}
+    for item in (accept_encoding or "").split(","):
+        name, *parameters = item.split(";")
+        quality = 1.0
+        for parameter in parameters:
+            key, _, value = parameter.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+
+    def quality(encoding: str) -> float:
+        return qualities.get(encoding, qualities.get("*", 0.0))
+
+    # On a tie, `max` keeps the first encoding
+    encoding = max([BROTLI, GZIP] if BROTLI_AVAILABLE else [GZIP], key=quality)
+    return encoding if quality(encoding) > 0 else IDENTITY
+
+
+def encode_body(body: bytes, encoding: str) -> bytes:
+    if encoding == GZIP:
+        return gzip.compress(body, compresslevel=GZIP_COMPRESSION_LEVEL)
+    if encoding == BROTLI:
+        import brotli
+
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return body
+
+
+def encoded_response(
+    body: bytes,
+    encoding: str,
+    media_type: str,
+    status_code: int = 200,
+    headers: dict[str, str] | None = None,
+) -> Response:
+    """Response with a body already encoded with `encoding`, which the compression
+    middleware sends as is."""
+    headers = {**(headers or {}), "Vary": "Accept-Encoding"}
+    if encoding != IDENTITY:
+        headers["Content-Encoding"] = encoding
+    return Response(
+        content=body, status_code=status_code, media_type=media_type, headers=headers
+    )
+
+
+class EncodedBodyCache:
+    """Encoded bodies of responses that never change, such as completed reports and static
+    files, keyed by a key identifying the content and by encoding. Bodies are kept in memory
+    up to `max_bytes`, the least recently used first out, and, if `path` is set, on disk up
+    to `disk_max_bytes`, so they are not encoded again after a restart."""
+
+    def __init__(
+        self, max_bytes: int, path: str | None = None, disk_max_bytes: int | None = None
+    ):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._lock = Lock()
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self.store = DiskCache(path, max_bytes=disk_max_bytes) if path else None
+
+    def get(self, key: str, encoding: str) -> bytes | None:
+        entry_key = f"{encoding}:{key}"
+        with self._lock:
+            body = self._entries.get(entry_key)
+            if body is not None:
+                self._entries.move_to_end(entry_key)
+                return body
+        if self.store is None:
+            return None
+        body = self.store.get(entry_key)
+        if body is not None:
+            self._remember(entry_key, body)
+        return body
+
+    def set(self, key: str, encoding: str, body: bytes):
+        entry_key = f"{encoding}:{key}"
+        self._remember(entry_key, body)
+        if self.store is not None:
+            self.store.set(entry_key, body)
+
+    def get_or_encode(self, key: str, encoding: str, build_body) -> bytes:
+        """Encoded body of `key`, encoding the body returned by `build_body` on a miss."""
+        body = self.get(key, encoding)
+        if body is not None:
+            encoded_body_stats.record_hit()
+            return body
+        encoded_body_stats.record_miss()
+        body = encode_body(build_body(), encoding)
+        self.set(key, encoding, body)
+        return body
+
+    def _remember(self, entry_key: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(entry_key, None)
+            if previous is not None:
+                self.size_bytes -= len(previous)
+            self._entries[entry_key] = body
+            self.size_bytes += len(body)
+            while self.size_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size_bytes -= len(evicted)
+
+
+@cache
+def get_encoded_body_cache() -> EncodedBodyCache:
+    """Encoded body cache configured in the settings, created on first use."""
+    return EncodedBodyCache(
+        settings.ENCODED_BODY_CACHE_MAX_BYTES,
+        path=settings.ENCODED_BODY_CACHE_PATH or None,
+        disk_max_bytes=settings.ENCODED_BODY_CACHE_DISK_MAX_BYTES,
+    )
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = BROTLI
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int):
+        super().__init__(app, minimum_size)
+        import brotli
+
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if more_body:
+            return self.compressor.process(body) + self.compressor.flush()
+        return self.compressor.process(body) + self.compressor.finish()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Compress the responses larger than `minimum_size` with the encoding negotiated with
+    the client, see `negotiate_encoding`. Responses that already set `Content-Encoding`,
+    event streams and responses of paths starting with `excluded_paths`, such as static
+    files served by `CachedStaticFiles`, are sent as is."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 500,
+        compresslevel: int = GZIP_COMPRESSION_LEVEL,
+        excluded_paths: tuple[str, ...] = (),
+    ):
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.excluded_paths = excluded_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(self.excluded_paths):
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("Accept-Encoding"))
+        responder: ASGIApp
+        if encoding == BROTLI:
+            responder = BrotliResponder(self.app, self.minimum_size, BROTLI_QUALITY)
+        elif encoding == GZIP:
+            responder = GZipResponder(
+                self.app, self.minimum_size, compresslevel=self.compresslevel
+            )
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)
+        await responder(scope, receive, send)
+
+
+@cache
+def _content_etag(path: str, mtime_ns: int, size: int) -> str:
+    # Keyed by modification time and size, so a file is only hashed again when it changes
+    digest = hashlib.sha256(Path(path).read_bytes()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+class CachedStaticFiles(StaticFiles):
+    """Static files with an ETag hashing their content and naming their encoding, cacheable
+    by clients for STATIC_CACHE_MAX_AGE_SECONDS. Compressible files are sent from the
+    encoded body cache."""
+
+    def file_response(
+        self,
+        full_path: PathLike,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        media_type = guess_type(str(full_path))[0] or "text/plain"
+        encoding = negotiate_encoding(request_headers.get("accept-encoding"))
+        if (
+            stat_result.st_size < settings.RESPONSE_COMPRESSION_MIN_BYTES
+            or not media_type.startswith(COMPRESSIBLE_MEDIA_TYPES)
+        ):
+            encoding = IDENTITY
+        content_etag = _content_etag(
+            str(full_path), stat_result.st_mtime_ns, stat_result.st_size
+        )
+        # Each encoding of the file is a different representation, with its own ETag
+        etag = (
+            content_etag if encoding == IDENTITY else f'{content_etag[:-1]}-{encoding}"'
+        )
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={settings.STATIC_CACHE_MAX_AGE_SECONDS}",
+            "Vary": "Accept-Encoding",
+        }
+        if etag_matches(etag, request_headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+
+        if encoding == IDENTITY:
+            return FileResponse(
+                full_path,
+                status_code=status_code,
+                stat_result=stat_result,
+                headers=headers,
+            )
+        body = get_encoded_body_cache().get_or_encode(
+            f"static:{content_etag}", encoding, lambda: Path(full_path).read_bytes()
+        )
+        return encoded_response(body, encoding, media_type, status_code, headers)
@@ -0,0 +1,124 @@
+import asyncio
+from collections import defaultdict
+from contextlib import contextmanager
+from enum import StrEnum
+from threading import Lock
+from uuid import UUID
+
+from pydantic import BaseModel
+
+from bigdata_thematic_screener.api.models import WorkflowStatus
+
+TERMINAL_STATUSES = (WorkflowStatus.COMPLETED, WorkflowStatus.FAILED)
+
+
+class WorkflowEventType(StrEnum):
+    LOG = "log"
+    STATUS = "status"
+    # Final events, sent once the workflow reaches a terminal status
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class WorkflowEvent(BaseModel):
+    event: WorkflowEventType
+    data: str
+    seq: int | None = None
+
+    def to_sse(self) -> str:
+        """Encode the event following the Server-Sent Events format. Log events carry their
+        sequence number as the event id, so reconnecting clients can resume with `Last-Event-ID`."""
+        lines = []
+        if self.seq is not None:
+            lines.append(f"id: {self.seq}")
+        lines.append(f"event: {self.event.value}")
+        lines.extend(f"data: {line}" for line in self.data.splitlines() or [""])
+        return "\n".join(lines) + "\n\n"
+
+
+class Subscription:
+    """Receives the events of a single workflow on the event loop that created it."""
+
+    def __init__(self, request_id: UUID):
+        self.request_id = request_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue[WorkflowEvent] = asyncio.Queue()
+
+    def put(self, event: WorkflowEvent):
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+        except RuntimeError:
+            # The event loop is closed, the client is gone
+            pass
+
+    async def get(self, timeout: float) -> WorkflowEvent | None:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroker:
+    """In-process publish/subscribe of workflow events.
+
+    Events are published from the threads running the workflows and delivered to the
+    subscribers' event loops. Workflows running in other processes do not publish here,
+    `is_active` tells whether this process is currently running a given workflow. Only the
+    process running a workflow marks it as active, with `running`: statuses published by
+    API nodes queuing workflows for other processes do not.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._subscriptions: dict[UUID, set[Subscription]] = defaultdict(set)
+        self._active: set[UUID] = set()
+
+    def subscribe(self, request_id: UUID) -> Subscription:
+        subscription = Subscription(request_id)
+        with self._lock:
+            self._subscriptions[request_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.request_id)
+            if subscriptions is None:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.request_id]
+
+    def is_active(self, request_id: UUID) -> bool:
+        with self._lock:
+            return request_id in self._active
+
+    @contextmanager
+    def running(self, request_ids: list[UUID]):
+        """Mark the workflows as active while they run in this process."""
+        with self._lock:
+            self._active.update(request_ids)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active.difference_update(request_ids)
+
+    def publish_log(self, request_id: UUID, seq: int, message: str):
+        self._publish(
+            request_id,
+            WorkflowEvent(event=WorkflowEventType.LOG, data=message, seq=seq),
+        )
+
+    def publish_status(self, request_id: UUID, status: WorkflowStatus):
+        self._publish(
+            request_id, WorkflowEvent(event=WorkflowEventType.STATUS, data=status.value)
+        )
+
+    def _publish(self, request_id: UUID, event: WorkflowEvent):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(request_id, ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+
+event_broker = EventBroker()
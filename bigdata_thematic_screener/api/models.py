@@ -1,3 +1,5 @@
+import hashlib
+import json
 from datetime import date, datetime, timedelta
 from enum import Enum, StrEnum
 from typing import Literal, Optional
@@ -6,7 +8,11 @@ from bigdata_client.models.search import DocumentType
 from pydantic import BaseModel, Field, model_validator
 from pydantic_core import ValidationError
 
-from bigdata_thematic_screener.models import ThematicScreenerResponse
+from bigdata_thematic_screener.models import (
+    LabeledChunk,
+    ThematicScreenerResponse,
+    ThemeTaxonomy,
+)
 
 
 def one_year_ago() -> date:
@@ -32,6 +38,11 @@ class FrequencyEnum(StrEnum):
     yearly = "Y"
 
 
+class CacheMode(StrEnum):
+    USE = "use"
+    BYPASS = "bypass"
+
+
 class WorkflowStatus(StrEnum):
     QUEUED = "queued"
     IN_PROGRESS = "in_progress"
@@ -77,17 +88,10 @@ class ExampleWatchlists(Enum):
         yield self.value.model_dump()
 
 
-class ThematicScreenRequest(BaseModel):
-    theme: str = Field(
-        ...,
-        example="Supply Chain Reshaping",
-        description="The central concept to explore.",
-    )
-    focus: str | None = Field(
-        default=None,
-        description="Specific focus area within the theme.",
-        example="Logistics automation, nearshoring strategies, and supply chain digitalization",
-    )
+class ThematicScreenParameters(BaseModel):
+    """Parameters shared by the request of a screen and the request of a batch of screens
+    of the same companies and window for several themes."""
+
     companies: list[str] | str = Field(
         ...,
         description="List of RavenPack entity IDs  or a watchlist ID representing the companies to screen.",
@@ -127,15 +131,15 @@ class ThematicScreenRequest(BaseModel):
         example=FrequencyEnum.yearly,
         description="Search frequency interval. Supported values: D (daily), W (weekly), M (monthly), 3M (quarterly), Y (yearly).",
     )
-    document_limit: int = Field(
+    document_limit: int | Literal["auto"] = Field(
         default=100,
         example=100,
-        description="Maximum number of documents to retrieve per query to Bigdata API.",
+        description="Maximum number of documents to retrieve per query to Bigdata API. Use `auto` to scale it with the number of entities of each query.",
     )
-    batch_size: int = Field(
+    batch_size: int | Literal["auto"] = Field(
         default=10,
         example=10,
-        description="Number of entities to include in each batch for parallel querying.",
+        description="Number of entities to include in each batch for parallel querying. Use `auto` to tune it at runtime from the latency and failures of the queries.",
     )
 
     @model_validator(mode="before")
@@ -175,7 +179,9 @@ class ThematicScreenRequest(BaseModel):
 
     @model_validator(mode="before")
     def check_fiscal_year_when_transcript_or_filing(cls, values):
-        doc_type = values.get("document_type", None)
+        doc_type = values.get(
+            "document_type", cls.model_fields["document_type"].default
+        )
         if doc_type is None:
             raise ValidationError.from_exception_data(
                 title=cls.__name__,
@@ -287,9 +293,97 @@ class ThematicScreenRequest(BaseModel):
         return values
 
 
+class BatchTheme(BaseModel):
+    """Theme of a screen, with an optional focus."""
+
+    theme: str = Field(
+        ...,
+        example="Supply Chain Reshaping",
+        description="The central concept to explore.",
+    )
+    focus: str | None = Field(
+        default=None,
+        description="Specific focus area within the theme.",
+        example="Logistics automation, nearshoring strategies, and supply chain digitalization",
+    )
+
+
+class ThematicScreenRequest(ThematicScreenParameters, BatchTheme):
+    """Screen of the companies for a single theme."""
+
+    def canonical_hash(self) -> str:
+        """Hash of the parameters that define the result of the workflow. Requests that only
+        differ in the order of the companies or fiscal years, or in a missing focus, have the
+        same hash."""
+        if isinstance(self.companies, list):
+            companies = sorted(set(self.companies))
+        else:
+            companies = self.companies
+        if self.fiscal_year is None:
+            fiscal_year = None
+        elif isinstance(self.fiscal_year, list):
+            fiscal_year = sorted(set(self.fiscal_year))
+        else:
+            fiscal_year = [self.fiscal_year]
+        canonical_request = {
+            "theme": self.theme.strip(),
+            "focus": (self.focus or "").strip(),
+            "companies": companies,
+            "start_date": date.fromisoformat(self.start_date[:10]).isoformat(),
+            "end_date": date.fromisoformat(self.end_date[:10]).isoformat(),
+            "llm_model": self.llm_model,
+            "fiscal_year": fiscal_year,
+            "document_type": DocumentType(self.document_type).value,
+            "rerank_threshold": self.rerank_threshold,
+            "frequency": FrequencyEnum(self.frequency).value,
+            "document_limit": self.document_limit,
+            "batch_size": self.batch_size,
+        }
+        return hashlib.sha256(
+            json.dumps(canonical_request, sort_keys=True).encode()
+        ).hexdigest()
+
+
+class ThematicScreenBatchRequest(ThematicScreenParameters):
+    """Screens of the same companies and window for several themes. Parameters other than
+    `themes` are the same as in `ThematicScreenRequest`."""
+
+    themes: list[BatchTheme] = Field(
+        ...,
+        min_length=1,
+        max_length=20,
+        description="Themes to screen the companies for, each one with an optional focus.",
+    )
+
+    def theme_requests(self) -> list[ThematicScreenRequest]:
+        """Request of the screen of each theme."""
+        parameters = self.model_dump(exclude={"themes"})
+        return [
+            ThematicScreenRequest(theme=theme.theme, focus=theme.focus, **parameters)
+            for theme in self.themes
+        ]
+
+
+class ThematicScreenExtendRequest(BaseModel):
+    end_date: str = Field(
+        ...,
+        description="New end date of the analysis window (format: YYYY-MM-DD), later than the end date of the extended report.",
+        example=yesterday().isoformat(),
+    )
+
+    @model_validator(mode="after")
+    def check_end_date(self):
+        date.fromisoformat(self.end_date)
+        return self
+
+
 class ThematicScreenerAcceptedResponse(BaseModel):
     request_id: str
     status: WorkflowStatus
+    cached: bool = Field(
+        default=False,
+        description="Whether the request_id points to the report of an identical previous request.",
+    )
 
 
 class ThematicScreenerStatusResponse(BaseModel):
@@ -297,4 +391,54 @@ class ThematicScreenerStatusResponse(BaseModel):
     last_updated: datetime
     status: WorkflowStatus
     logs: list[str] = Field(default_factory=list)
+    last_log_seq: int = Field(
+        default=0,
+        description="Sequence number of the last log line returned. Send it back as `logs_since` to only receive new lines.",
+    )
+    queue_position: int | None = Field(
+        default=None,
+        description="Position of the workflow in the queue while it waits to run, 1 being the next one.",
+    )
+    queue_depth: int | None = Field(
+        default=None,
+        description="Number of workflows waiting to run.",
+    )
     report: ThematicScreenerResponse | None = None
+
+
+class LabeledContentPage(BaseModel):
+    request_id: str
+    content: list[LabeledChunk] = Field(default_factory=list)
+    next_cursor: str | None = Field(
+        default=None,
+        description="Send it back as `cursor` to get the next page. None on the last page.",
+    )
+
+
+class BatchReport(BaseModel):
+    request_id: str
+    theme: str
+    focus: str | None = None
+    status: WorkflowStatus
+
+
+class ThematicScreenBatchResponse(BaseModel):
+    batch_id: str
+    status: WorkflowStatus = Field(
+        description="Completed once every report is completed, failed once every report is finished and one of them failed."
+    )
+    reports: list[BatchReport] = Field(
+        description="Report of each theme, to be retrieved from `/status/{request_id}`."
+    )
+
+
+class CachedThemeTaxonomy(BaseModel):
+    id: str
+    theme: str
+    focus: str
+    llm_model: str
+    version: str
+    created_at: datetime
+    last_used_at: datetime
+    hits: int = Field(description="Number of workflows that reused this theme tree.")
+    taxonomy: ThemeTaxonomy
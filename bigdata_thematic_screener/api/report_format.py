@@ -0,0 +1,75 @@
+import gzip
+from functools import cache
+from importlib.util import find_spec
+
+from bigdata_thematic_screener import logger
+from bigdata_thematic_screener.models import ThematicScreenerResponse
+from bigdata_thematic_screener.settings import settings
+
+# Formats of the stored reports. Compressed formats are tagged with a version, so that their
+# encoding can change without breaking the reports already stored.
+JSON_REPORT_FORMAT = "json"
+GZIP_REPORT_FORMAT = "gzip-json/1"
+ZSTD_REPORT_FORMAT = "zstd-json/1"
+
+REPORT_FORMATS = {
+    "none": JSON_REPORT_FORMAT,
+    "gzip": GZIP_REPORT_FORMAT,
+    "zstd": ZSTD_REPORT_FORMAT,
+}
+
+GZIP_COMPRESSION_LEVEL = 6
+ZSTD_COMPRESSION_LEVEL = 3
+
+# zstd needs the zstandard package, which is optional, installed with the `zstd` extra
+ZSTD_AVAILABLE = find_spec("zstandard") is not None
+
+
+@cache
+def _warn_zstd_unavailable():
+    logger.warning(
+        "zstandard is not installed, reports are compressed with gzip instead of zstd"
+    )
+
+
+def get_report_format(compression: str | None = None) -> str:
+    """Format of the reports stored with `compression`, by default REPORT_COMPRESSION."""
+    report_format = REPORT_FORMATS[compression or settings.REPORT_COMPRESSION]
+    if report_format == ZSTD_REPORT_FORMAT and not ZSTD_AVAILABLE:
+        _warn_zstd_unavailable()
+        return GZIP_REPORT_FORMAT
+    return report_format
+
+
+def encode_report(response: ThematicScreenerResponse, report_format: str) -> bytes:
+    """Compressed JSON of a report, in one of the compressed formats."""
+    data = response.model_dump_json().encode()
+    if report_format == GZIP_REPORT_FORMAT:
+        return gzip.compress(data, compresslevel=GZIP_COMPRESSION_LEVEL)
+    if report_format == ZSTD_REPORT_FORMAT:
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=ZSTD_COMPRESSION_LEVEL).compress(data)
+    raise ValueError(f"Unknown compressed report format: {report_format}")
+
+
+def decompress_report(data: bytes, report_format: str) -> bytes:
+    """JSON of a report encoded with `encode_report`, without validating it."""
+    if report_format == GZIP_REPORT_FORMAT:
+        return gzip.decompress(data)
+    if report_format == ZSTD_REPORT_FORMAT:
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError(
+                "Report is compressed with zstd, install zstandard to read it"
+            )
+        import zstandard
+
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown compressed report format: {report_format}")
+
+
+def decode_report(data: bytes, report_format: str) -> ThematicScreenerResponse:
+    """Report encoded with `encode_report`."""
+    return ThematicScreenerResponse.model_validate_json(
+        decompress_report(data, report_format)
+    )
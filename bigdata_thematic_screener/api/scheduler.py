@@ -0,0 +1,156 @@
+import os
+import socket
+from collections import deque
+from collections.abc import Callable
+from threading import Condition, Event, Thread
+from uuid import UUID, uuid4
+
+from bigdata_thematic_screener import logger
+
+# Identifies this process as the owner of the workflow leases it holds
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted and the queue of pending jobs is full."""
+
+
+class JobScheduler:
+    """Runs workflows on a fixed set of worker threads, in FIFO order.
+
+    At most `max_concurrent_jobs` jobs run at the same time, and at most `max_queued_jobs`
+    jobs wait for a free worker. Workers are dedicated threads, so long-running workflows
+    do not take threads from the pool that serves the API requests.
+    """
+
+    def __init__(self, max_concurrent_jobs: int, max_queued_jobs: int):
+        if max_concurrent_jobs < 1:
+            raise ValueError("max_concurrent_jobs must be at least 1")
+        if max_queued_jobs < 0:
+            raise ValueError("max_queued_jobs cannot be negative")
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.max_queued_jobs = max_queued_jobs
+        self._condition = Condition()
+        self._queue: deque[tuple[UUID, Callable[[], object]]] = deque()
+        self._running: set[UUID] = set()
+        self._workers: list[Thread] = []
+        self._stopped = False
+
+    def is_full(self) -> bool:
+        with self._condition:
+            return len(self._queue) >= self.max_queued_jobs
+
+    def submit(self, request_id: UUID, job: Callable[[], object]) -> int:
+        """Queue a job and return its position in the queue (1 is the next job to run).
+
+        Raises:
+            QueueFullError: If there are already `max_queued_jobs` jobs waiting.
+        """
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("The scheduler has been shut down.")
+            if len(self._queue) >= self.max_queued_jobs:
+                raise QueueFullError(
+                    f"There are already {len(self._queue)} jobs waiting to run."
+                )
+            self._ensure_workers()
+            self._queue.append((request_id, job))
+            self._condition.notify()
+            return len(self._queue)
+
+    def queue_position(self, request_id: UUID) -> int | None:
+        """Position of a job in the queue, or None if it is not waiting to run."""
+        with self._condition:
+            for position, (queued_id, _) in enumerate(self._queue, start=1):
+                if queued_id == request_id:
+                    return position
+            return None
+
+    def queue_depth(self) -> int:
+        with self._condition:
+            return len(self._queue)
+
+    def job_ids(self) -> list[UUID]:
+        """Ids of the jobs queued or running."""
+        with self._condition:
+            return [request_id for request_id, _ in self._queue] + list(self._running)
+
+    def running_jobs(self) -> int:
+        with self._condition:
+            return len(self._running)
+
+    def start(self):
+        """Accept jobs again after a shutdown. Workers are started on the first submitted job."""
+        with self._condition:
+            self._stopped = False
+
+    def shutdown(self, wait: bool = True) -> list[UUID]:
+        """Stop accepting jobs. Running jobs are allowed to finish, queued jobs are dropped.
+        Returns the ids of the dropped jobs."""
+        with self._condition:
+            self._stopped = True
+            dropped = [request_id for request_id, _ in self._queue]
+            self._queue.clear()
+            self._condition.notify_all()
+            workers = list(self._workers)
+        if wait:
+            for worker in workers:
+                worker.join()
+        return dropped
+
+    def _ensure_workers(self):
+        # Called with the condition held
+        self._workers = [worker for worker in self._workers if worker.is_alive()]
+        while len(self._workers) < self.max_concurrent_jobs:
+            worker = Thread(
+                target=self._work,
+                name=f"workflow-worker-{len(self._workers)}",
+                daemon=True,
+            )
+            self._workers.append(worker)
+            worker.start()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                request_id, job = self._queue.popleft()
+                self._running.add(request_id)
+            try:
+                job()
+            except Exception as e:
+                logger.error(
+                    "Workflow failed", request_id=str(request_id), error=str(e)
+                )
+            finally:
+                with self._condition:
+                    self._running.discard(request_id)
+
+
+class RepeatingTask:
+    """Calls a function every `interval` seconds on a background thread until stopped."""
+
+    def __init__(self, name: str, interval: float, function: Callable[[], object]):
+        self.name = name
+        self.interval = interval
+        self.function = function
+        self._stop = Event()
+        self._thread: Thread | None = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.function()
+            except Exception as e:
+                logger.error("Periodic task failed", task=self.name, error=str(e))
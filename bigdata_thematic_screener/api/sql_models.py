@@ -1,20 +1,65 @@
+import hashlib
+import json
 from datetime import datetime
 from uuid import UUID
 
-from sqlalchemy.ext.mutable import MutableList
-from sqlmodel import JSON, Column, Field, SQLModel
+from sqlalchemy import Engine, Index, LargeBinary, column, inspect, table, text
+from sqlmodel import (
+    JSON,
+    Column,
+    Field,
+    Session,
+    SQLModel,
+    create_engine,
+    func,
+    select,
+    update,
+)
 
+from bigdata_thematic_screener import LOG_LEVEL, logger
 from bigdata_thematic_screener.api.models import ThematicScreenRequest
+from bigdata_thematic_screener.api.report_format import (
+    JSON_REPORT_FORMAT,
+    decode_report,
+    encode_report,
+    get_report_format,
+)
 from bigdata_thematic_screener.models import ThematicScreenerResponse
+from bigdata_thematic_screener.settings import settings
 
 
 class SQLWorkflowStatus(SQLModel, table=True):
     id: UUID = Field(primary_key=True)
     last_updated: datetime
     status: str
-    logs: list[str] = Field(
-        default_factory=list, sa_column=Column(MutableList.as_mutable(JSON))
+    # Request that started the workflow, so it can be resumed after a restart
+    request: dict | None = Field(
+        default=None, sa_column=Column(JSON(none_as_null=True))
     )
+    # Lease held by the process running (or holding in its queue) the workflow. An expired
+    # lease on a queued or in progress workflow means the process is gone.
+    lease_owner: str | None = None
+    lease_expires_at: datetime | None = Field(default=None, index=True)
+    heartbeat_at: datetime | None = None
+    attempts: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    # Canonical hash of the request, see `ThematicScreenRequest.canonical_hash`
+    request_hash: str | None = Field(default=None, index=True)
+    # Identical requests received while a workflow is running do not run on their own,
+    # they follow the running workflow (their leader) and get a copy of its report
+    leader_id: UUID | None = Field(default=None, index=True)
+    # Completed workflow whose report is extended to the later end date of this request
+    extends_id: UUID | None = None
+    # Batch of screens of the same companies and window for several themes, run together
+    batch_id: UUID | None = Field(default=None, index=True)
+
+
+class SQLWorkflowLog(SQLModel, table=True):
+    """Append-only log of workflow messages, one row per message ordered by `seq`."""
+
+    request_id: UUID = Field(primary_key=True)
+    seq: int = Field(primary_key=True)
+    created_at: datetime = Field(default_factory=datetime.now)
+    message: str
 
 
 class SQLThematicScreenerReport(SQLModel, table=True):
@@ -32,15 +77,43 @@ class SQLThematicScreenerReport(SQLModel, table=True):
     frequency: str
     document_limit: int
     batch_size: int
-    screener_report: dict = Field(sa_column=Column(JSON))
+    # Canonical hash of the request, see `ThematicScreenRequest.canonical_hash`
+    request_hash: str | None = Field(default=None, index=True)
+    # The report is stored as JSON in `screener_report`, or compressed in `report_blob`,
+    # depending on `report_format` (reports stored before it was added are JSON). Use
+    # `load_report`, which only decompresses the report when it is read.
+    screener_report: dict | None = Field(default=None, sa_column=Column(JSON))
+    report_format: str | None = None
+    report_blob: bytes | None = Field(default=None, sa_column=Column(LargeBinary))
+
+    def load_report(self) -> ThematicScreenerResponse:
+        if self.report_blob is not None and self.report_format is not None:
+            return decode_report(self.report_blob, self.report_format)
+        return ThematicScreenerResponse(**self.screener_report)  # ty: ignore[missing-argument, invalid-argument-type]
+
+    def store_report(self, response: ThematicScreenerResponse, report_format: str):
+        if report_format == JSON_REPORT_FORMAT:
+            self.screener_report = response.model_dump()
+            self.report_blob = None
+        else:
+            self.screener_report = None
+            self.report_blob = encode_report(response, report_format)
+        self.report_format = report_format
 
     @staticmethod
     def from_thematic_screener_response(
         request_id: UUID,
         request: ThematicScreenRequest,
         response: ThematicScreenerResponse,
+        report_format: str | None = None,
+        stored_report: "SQLThematicScreenerReport | None" = None,
     ) -> "SQLThematicScreenerReport":
-        return SQLThematicScreenerReport(
+        """Report row of `response` for `request`. Pass the row of another request storing
+        the same response as `stored_report` to reuse its stored report instead of encoding
+        the response again."""
+        # Values chosen at runtime when the request leaves them to `auto`
+        search_parameters = response.search_parameters
+        sql_report = SQLThematicScreenerReport(
             id=request_id,
             companies=request.companies,
             llm_model=request.llm_model,
@@ -54,7 +127,205 @@ class SQLThematicScreenerReport(SQLModel, table=True):
             else [request.fiscal_year],
             rerank_threshold=request.rerank_threshold,
             frequency=request.frequency.value,
-            document_limit=request.document_limit,
-            batch_size=request.batch_size,
-            screener_report=response.model_dump(),
+            document_limit=search_parameters.document_limit
+            if search_parameters is not None
+            else request.document_limit,
+            batch_size=search_parameters.batch_size
+            if search_parameters is not None
+            else request.batch_size,
+            request_hash=request.canonical_hash(),
         )
+        if stored_report is not None:
+            sql_report.screener_report = stored_report.screener_report
+            sql_report.report_blob = stored_report.report_blob
+            sql_report.report_format = stored_report.report_format
+        else:
+            sql_report.store_report(response, report_format or get_report_format())
+        return sql_report
+
+
+class SQLLabeledChunk(SQLModel, table=True):
+    """Labeled chunk of a completed report, one row per chunk ordered by `seq` as in the
+    report, to filter and page through the content without loading the whole report."""
+
+    __table_args__ = (
+        Index("ix_sqllabeledchunk_company", "request_id", "company"),
+        Index("ix_sqllabeledchunk_theme", "request_id", "theme"),
+        Index("ix_sqllabeledchunk_time_period", "request_id", "time_period"),
+        Index("ix_sqllabeledchunk_date", "request_id", "date"),
+    )
+
+    request_id: UUID = Field(primary_key=True)
+    seq: int = Field(primary_key=True)
+    time_period: str
+    date: str
+    company: str
+    sector: str
+    industry: str
+    country: str
+    ticker: str | None = None
+    document_id: str
+    headline: str
+    quote: str
+    motivation: str
+    theme: str
+
+
+class SQLThemeTaxonomy(SQLModel, table=True):
+    """Theme tree generated for a theme, focus and LLM model, reused by later workflows
+    screening for the same theme. Only trees of the current version are reused."""
+
+    id: str = Field(primary_key=True)
+    theme: str
+    focus: str
+    llm_model: str
+    version: str
+    created_at: datetime = Field(default_factory=datetime.now)
+    last_used_at: datetime = Field(default_factory=datetime.now)
+    hits: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    tree: dict = Field(sa_column=Column(JSON))
+
+    @staticmethod
+    def compute_id(theme: str, focus: str | None, llm_model: str, version: str) -> str:
+        key = [theme.strip(), (focus or "").strip(), llm_model, version]
+        return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+
+class SQLRateLimitBucket(SQLModel, table=True):
+    """Token bucket of a rate limit shared by the processes using the database. Updates
+    are conditional on `version`, so concurrent reservations are applied one at a time."""
+
+    name: str = Field(primary_key=True)
+    tokens: float
+    # Unix time of the last refill, as processes do not share a monotonic clock
+    updated_at: float
+    version: int = 0
+
+
+def add_missing_columns(engine: Engine):
+    """`create_all` does not alter existing tables, add the columns and indexes introduced
+    after a table was created. New columns must be nullable or have a server default."""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing_columns = {
+                column["name"] for column in inspector.get_columns(table.name)
+            }
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                default = (
+                    f" DEFAULT {column.server_default.arg}"  # ty: ignore[unresolved-attribute]
+                    if column.server_default is not None
+                    else ""
+                )
+                connection.execute(
+                    text(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{default}"
+                    )
+                )
+            existing_indexes = {
+                index["name"] for index in inspector.get_indexes(table.name)
+            }
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(connection)
+
+
+def migrate_workflow_logs(engine: Engine) -> int:
+    """Move the logs stored in the `logs` column of the workflow status table, before they
+    had their own table, to `SQLWorkflowLog`, and return the number of messages moved. The
+    column is cleared once its logs are moved, so they are only moved once."""
+    status_table = SQLWorkflowStatus.__table__  # ty: ignore[unresolved-attribute]
+    columns = {
+        column["name"] for column in inspect(engine).get_columns(status_table.name)
+    }
+    if "logs" not in columns:
+        return 0
+    legacy_table = table(
+        status_table.name,
+        column("id", status_table.c.id.type),
+        column("last_updated", status_table.c.last_updated.type),
+        column("logs", JSON()),
+    )
+    moved = 0
+    with Session(engine) as session:
+        rows = session.exec(
+            select(
+                legacy_table.c.id, legacy_table.c.last_updated, legacy_table.c.logs
+            ).where(legacy_table.c.logs.is_not(None))
+        ).all()
+        for request_id, last_updated, logs in rows:
+            # Appended after the messages logged since, if any
+            last_seq = session.exec(
+                select(func.max(SQLWorkflowLog.seq)).where(
+                    SQLWorkflowLog.request_id == request_id
+                )
+            ).one()
+            for seq, message in enumerate(logs or [], start=(last_seq or 0) + 1):
+                session.add(
+                    SQLWorkflowLog(
+                        request_id=request_id,
+                        seq=seq,
+                        created_at=last_updated,
+                        message=message,
+                    )
+                )
+            moved += len(logs or [])
+        session.exec(
+            update(legacy_table)
+            .where(legacy_table.c.logs.is_not(None))
+            .values(logs=None)
+        )
+        session.commit()
+    if moved:
+        logger.info("Workflow logs moved to their own table", messages=moved)
+    return moved
+
+
+def migrate_reports(engine: Engine, report_format: str, batch_size: int = 100) -> int:
+    """Convert the stored reports to `report_format`, `batch_size` reports per transaction,
+    and return the number of reports converted."""
+    converted = 0
+    with Session(engine) as session:
+        while True:
+            sql_reports = session.exec(
+                select(SQLThematicScreenerReport)
+                .where(
+                    func.coalesce(
+                        SQLThematicScreenerReport.report_format, JSON_REPORT_FORMAT
+                    )
+                    != report_format
+                )
+                .limit(batch_size)
+            ).all()
+            if not sql_reports:
+                return converted
+            for sql_report in sql_reports:
+                sql_report.store_report(sql_report.load_report(), report_format)
+                session.add(sql_report)
+            session.commit()
+            session.expunge_all()
+            converted += len(sql_reports)
+
+
+def run_report_migration():
+    """Entry point of `python -m bigdata_thematic_screener migrate-reports`: convert the
+    stored reports to the format set by REPORT_COMPRESSION."""
+    engine = create_engine(settings.DB_STRING, echo=LOG_LEVEL == "DEBUG")
+    SQLModel.metadata.create_all(engine)
+    add_missing_columns(engine)
+    migrate_workflow_logs(engine)
+    report_format = get_report_format()
+    logger.info("Converting reports", report_format=report_format)
+    converted = migrate_reports(engine, report_format)
+    logger.info("Reports converted", report_format=report_format, converted=converted)
+    if converted and engine.dialect.name == "sqlite":
+        # SQLite only returns the space freed by the conversion to the file system on VACUUM
+        with engine.connect().execution_options(
+            isolation_level="AUTOCOMMIT"
+        ) as connection:
+            connection.execute(text("VACUUM"))
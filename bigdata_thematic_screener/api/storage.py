@@ -1,24 +1,57 @@
-from datetime import datetime
+from collections.abc import Iterator
+from datetime import date, datetime, timedelta
 from threading import Lock
 from uuid import UUID
 
-from sqlmodel import Session, select
+from sqlalchemy import ColumnElement, String, type_coerce
+from sqlalchemy.orm import defer
+from sqlmodel import Session, and_, col, delete, func, insert, or_, select, update
 
+from bigdata_thematic_screener.api.events import TERMINAL_STATUSES, EventBroker
 from bigdata_thematic_screener.api.models import (
+    BatchReport,
+    CachedThemeTaxonomy,
+    LabeledContentPage,
+    ThematicScreenBatchResponse,
     ThematicScreenerStatusResponse,
     ThematicScreenRequest,
     WorkflowStatus,
 )
+from bigdata_thematic_screener.api.report_format import (
+    JSON_REPORT_FORMAT,
+    decompress_report,
+)
 from bigdata_thematic_screener.api.sql_models import (
+    SQLLabeledChunk,
     SQLThematicScreenerReport,
+    SQLThemeTaxonomy,
+    SQLWorkflowLog,
     SQLWorkflowStatus,
 )
-from bigdata_thematic_screener.models import ThematicScreenerResponse
+from bigdata_thematic_screener.api.utils import dumps_json
+from bigdata_thematic_screener.models import (
+    LabeledChunk,
+    ThematicScreenerResponse,
+    ThemeTaxonomy,
+)
+
+
+def aggregate_status(statuses: list[WorkflowStatus]) -> WorkflowStatus:
+    """Status of a group of workflows: completed or failed once all of them are finished,
+    queued while none of them started."""
+    if all(status == WorkflowStatus.COMPLETED for status in statuses):
+        return WorkflowStatus.COMPLETED
+    if all(status in TERMINAL_STATUSES for status in statuses):
+        return WorkflowStatus.FAILED
+    if all(status == WorkflowStatus.QUEUED for status in statuses):
+        return WorkflowStatus.QUEUED
+    return WorkflowStatus.IN_PROGRESS
 
 
 class StorageManager:
-    def __init__(self, db_session: Session):
+    def __init__(self, db_session: Session, event_broker: EventBroker | None = None):
         self.db_session = db_session
+        self.event_broker = event_broker
         self.lock = Lock()
 
     def _get_workflow_status(self, request_id: UUID) -> SQLWorkflowStatus | None:
@@ -29,9 +62,13 @@ class StorageManager:
     def _get_workflow_report(
         self, request_id: UUID
     ) -> SQLThematicScreenerReport | None:
+        # The report itself is only loaded, and decompressed, by `load_report`
         return self.db_session.exec(
-            select(SQLThematicScreenerReport).where(
-                SQLThematicScreenerReport.id == request_id
+            select(SQLThematicScreenerReport)
+            .where(SQLThematicScreenerReport.id == request_id)
+            .options(
+                defer(SQLThematicScreenerReport.screener_report),  # ty: ignore[invalid-argument-type]
+                defer(SQLThematicScreenerReport.report_blob),  # ty: ignore[invalid-argument-type]
             )
         ).first()
 
@@ -53,35 +90,488 @@ class StorageManager:
                 workflow_status.last_updated = datetime.now()
 
             self.db_session.add(workflow_status)
+            # Workflows following this one share its status
+            self.db_session.exec(
+                update(SQLWorkflowStatus)
+                .where(
+                    SQLWorkflowStatus.leader_id == request_id,
+                    col(SQLWorkflowStatus.status).not_in(TERMINAL_STATUSES),
+                )
+                .values(status=status, last_updated=workflow_status.last_updated)
+            )
             self.db_session.commit()
             self.db_session.refresh(workflow_status)
 
-    def get_status(self, request_id: UUID) -> WorkflowStatus | None:
+        if self.event_broker is not None:
+            self.event_broker.publish_status(request_id, status)
+
+    def create_workflow(
+        self,
+        request_id: UUID,
+        request: ThematicScreenRequest,
+        lease_owner: str | None,
+        lease_seconds: float,
+        extends_id: UUID | None = None,
+        batch_id: UUID | None = None,
+    ):
+        """Register a new workflow as queued, storing its request and leasing it to the
+        process that will run it. Workflows without `lease_owner` are left for a worker to
+        claim. `extends_id` is the completed workflow whose report the new workflow extends,
+        and `batch_id` the batch it belongs to, if any."""
+        now = datetime.now()
+        with self.lock:
+            self.db_session.add(
+                SQLWorkflowStatus(
+                    id=request_id,
+                    status=WorkflowStatus.QUEUED,
+                    last_updated=now,
+                    request=request.model_dump(mode="json"),
+                    request_hash=request.canonical_hash(),
+                    lease_owner=lease_owner,
+                    lease_expires_at=now + timedelta(seconds=lease_seconds)
+                    if lease_owner is not None
+                    else None,
+                    heartbeat_at=now if lease_owner is not None else None,
+                    extends_id=extends_id,
+                    batch_id=batch_id,
+                )
+            )
+            self.db_session.commit()
+
+        if self.event_broker is not None:
+            self.event_broker.publish_status(request_id, WorkflowStatus.QUEUED)
+
+    def get_request(self, request_id: UUID) -> ThematicScreenRequest | None:
+        """Request that started the workflow, if it was stored."""
+        with self.lock:
+            workflow_status = self._get_workflow_status(request_id)
+            if workflow_status is None or workflow_status.request is None:
+                return None
+            return ThematicScreenRequest.model_validate(workflow_status.request)
+
+    def get_extends_id(self, request_id: UUID) -> UUID | None:
         with self.lock:
             workflow_status = self._get_workflow_status(request_id)
             if workflow_status is None:
                 return None
-            return WorkflowStatus(workflow_status.status)
+            return workflow_status.extends_id
 
-    def log_message(self, request_id: UUID, message: str):
+    def get_completed_report(self, request_id: UUID) -> ThematicScreenerResponse | None:
+        """Report of a workflow, if it completed."""
+        with self.lock:
+            sql_report = self._get_workflow_report(request_id)
+            if sql_report is None:
+                return None
+            return sql_report.load_report()
+
+    def find_running_workflow(self, request_hash: str) -> UUID | None:
+        """Find a queued or in progress workflow, not following another one, running a
+        request with the same canonical hash."""
+        with self.lock:
+            return self.db_session.exec(
+                select(SQLWorkflowStatus.id)
+                .where(
+                    SQLWorkflowStatus.request_hash == request_hash,
+                    col(SQLWorkflowStatus.status).in_(
+                        [WorkflowStatus.QUEUED, WorkflowStatus.IN_PROGRESS]
+                    ),
+                    col(SQLWorkflowStatus.leader_id).is_(None),
+                )
+                .order_by(col(SQLWorkflowStatus.last_updated))
+            ).first()
+
+    def attach_to_workflow(
+        self, request_id: UUID, request: ThematicScreenRequest, leader_id: UUID
+    ) -> WorkflowStatus:
+        """Register a new workflow that follows the running workflow `leader_id` instead of
+        running on its own. It shares the logs and status of its leader, and gets a copy of
+        its report when it completes."""
+        with self.lock:
+            leader_status = self._get_workflow_status(leader_id)
+            if leader_status is None:
+                raise ValueError(f"Request ID {leader_id} not found in status storage.")
+            status = WorkflowStatus(leader_status.status)
+            self.db_session.add(
+                SQLWorkflowStatus(
+                    id=request_id,
+                    status=status,
+                    last_updated=datetime.now(),
+                    request=request.model_dump(mode="json"),
+                    request_hash=request.canonical_hash(),
+                    leader_id=leader_id,
+                )
+            )
+            self.db_session.commit()
+        return status
+
+    def get_execution_id(self, request_id: UUID) -> UUID | None:
+        """Id of the workflow that actually runs a request: its leader when it follows
+        another workflow, the request itself otherwise."""
+        with self.lock:
+            workflow_status = self._get_workflow_status(request_id)
+            if workflow_status is None:
+                return None
+            return workflow_status.leader_id or request_id
+
+    def renew_leases(
+        self, request_ids: list[UUID], lease_owner: str, lease_seconds: float
+    ):
+        """Extend the leases held by `lease_owner` on the given workflows, or on the
+        workflows of the given batches."""
+        if not request_ids:
+            return
+        now = datetime.now()
+        with self.lock:
+            self.db_session.exec(
+                update(SQLWorkflowStatus)
+                .where(
+                    or_(
+                        col(SQLWorkflowStatus.id).in_(request_ids),
+                        col(SQLWorkflowStatus.batch_id).in_(request_ids),
+                    ),
+                    SQLWorkflowStatus.lease_owner == lease_owner,
+                )
+                .values(
+                    heartbeat_at=now,
+                    lease_expires_at=now + timedelta(seconds=lease_seconds),
+                )
+            )
+            self.db_session.commit()
+
+    def release_lease(self, request_id: UUID):
+        """Release the lease on a workflow, or on the workflows of a batch."""
+        with self.lock:
+            self.db_session.exec(
+                update(SQLWorkflowStatus)
+                .where(
+                    or_(
+                        SQLWorkflowStatus.id == request_id,
+                        SQLWorkflowStatus.batch_id == request_id,
+                    )
+                )
+                .values(lease_owner=None, lease_expires_at=None)
+            )
+            self.db_session.commit()
+
+    def requeue_workflow(
+        self, request_id: UUID, lease_owner: str | None, lease_seconds: float
+    ) -> bool:
+        """Queue a failed workflow again, with a fresh count of attempts, leasing it to the
+        process that will run it. Its followers are queued again with it. Returns False if
+        the workflow is not failed, such as when it was already retried."""
+        now = datetime.now()
+        with self.lock:
+            result = self.db_session.exec(
+                update(SQLWorkflowStatus)
+                .where(
+                    SQLWorkflowStatus.id == request_id,
+                    SQLWorkflowStatus.status == WorkflowStatus.FAILED,
+                )
+                .values(
+                    status=WorkflowStatus.QUEUED,
+                    last_updated=now,
+                    attempts=0,
+                    lease_owner=lease_owner,
+                    lease_expires_at=now + timedelta(seconds=lease_seconds)
+                    if lease_owner is not None
+                    else None,
+                    heartbeat_at=now if lease_owner is not None else None,
+                )
+            )
+            if result.rowcount != 1:
+                self.db_session.rollback()
+                return False
+            self.db_session.exec(
+                update(SQLWorkflowStatus)
+                .where(
+                    SQLWorkflowStatus.leader_id == request_id,
+                    SQLWorkflowStatus.status == WorkflowStatus.FAILED,
+                )
+                .values(status=WorkflowStatus.QUEUED, last_updated=now)
+            )
+            self.db_session.commit()
+
+        if self.event_broker is not None:
+            self.event_broker.publish_status(request_id, WorkflowStatus.QUEUED)
+        return True
+
+    def start_attempt(self, request_id: UUID) -> int:
+        """Count a new attempt to run the workflow and return the number of attempts so far."""
         with self.lock:
             workflow_status = self._get_workflow_status(request_id)
             if workflow_status is None:
                 raise ValueError(
                     f"Request ID {request_id} not found in status storage."
                 )
-            workflow_status.logs.append(message)
-            workflow_status.last_updated = datetime.now()
+            workflow_status.attempts += 1
             self.db_session.add(workflow_status)
             self.db_session.commit()
-            self.db_session.refresh(workflow_status)
+            return workflow_status.attempts
+
+    def claim_orphaned_workflows(
+        self, lease_owner: str, lease_seconds: float, limit: int | None = None
+    ) -> list[tuple[UUID, ThematicScreenRequest]]:
+        """Take over the queued or in progress workflows whose lease expired, which means
+        the process running them is gone. Claimed workflows are queued again.
+
+        Each workflow is claimed with a conditional update, so when several processes
+        try to claim the same workflow only one of them gets it.
+        """
+        now = datetime.now()
+        return self._claim_workflows(
+            and_(
+                col(SQLWorkflowStatus.lease_owner).is_not(None),
+                col(SQLWorkflowStatus.lease_expires_at) < now,
+            ),
+            lease_owner,
+            lease_seconds,
+            limit,
+        )
+
+    def claim_queued_workflows(
+        self, lease_owner: str, lease_seconds: float, limit: int | None = None
+    ) -> list[tuple[UUID, ThematicScreenRequest]]:
+        """Take the oldest queued workflows not leased to any process, such as the ones
+        queued by API nodes that do not run workflows. Claimed the same way as
+        `claim_orphaned_workflows`."""
+        return self._claim_workflows(
+            col(SQLWorkflowStatus.lease_owner).is_(None),
+            lease_owner,
+            lease_seconds,
+            limit,
+        )
+
+    def _claim_workflows(
+        self,
+        claimable: ColumnElement[bool],
+        lease_owner: str,
+        lease_seconds: float,
+        limit: int | None,
+    ) -> list[tuple[UUID, ThematicScreenRequest]]:
+        if limit is not None and limit <= 0:
+            return []
+        now = datetime.now()
+        claimed = []
+        with self.lock:
+            candidates = self.db_session.exec(
+                select(SQLWorkflowStatus.id, SQLWorkflowStatus.request)
+                .where(
+                    col(SQLWorkflowStatus.status).in_(
+                        [WorkflowStatus.QUEUED, WorkflowStatus.IN_PROGRESS]
+                    ),
+                    col(SQLWorkflowStatus.request).is_not(None),
+                    col(SQLWorkflowStatus.leader_id).is_(None),
+                    claimable,
+                )
+                .order_by(col(SQLWorkflowStatus.last_updated))
+            ).all()
+            for request_id, request in candidates:
+                if limit is not None and len(claimed) >= limit:
+                    break
+                result = self.db_session.exec(
+                    update(SQLWorkflowStatus)
+                    .where(SQLWorkflowStatus.id == request_id, claimable)
+                    .values(
+                        status=WorkflowStatus.QUEUED,
+                        last_updated=now,
+                        lease_owner=lease_owner,
+                        lease_expires_at=now + timedelta(seconds=lease_seconds),
+                        heartbeat_at=now,
+                    )
+                )
+                self.db_session.commit()
+                if result.rowcount == 1:
+                    claimed.append(
+                        (request_id, ThematicScreenRequest.model_validate(request))
+                    )
+
+        if self.event_broker is not None:
+            for request_id, _ in claimed:
+                self.event_broker.publish_status(request_id, WorkflowStatus.QUEUED)
+        return claimed
+
+    def claim_batch_workflows(
+        self, batch_id: UUID, lease_owner: str, lease_seconds: float
+    ) -> list[tuple[UUID, ThematicScreenRequest]]:
+        """Take the queued workflows of a batch not leased to another process, including
+        the ones already leased to `lease_owner`."""
+        now = datetime.now()
+        return self._claim_workflows(
+            and_(
+                SQLWorkflowStatus.batch_id == batch_id,
+                SQLWorkflowStatus.status == WorkflowStatus.QUEUED,
+                or_(
+                    col(SQLWorkflowStatus.lease_owner).is_(None),
+                    SQLWorkflowStatus.lease_owner == lease_owner,
+                    col(SQLWorkflowStatus.lease_expires_at) < now,
+                ),
+            ),
+            lease_owner,
+            lease_seconds,
+            limit=None,
+        )
+
+    def get_batch_id(self, request_id: UUID) -> UUID | None:
+        with self.lock:
+            workflow_status = self._get_workflow_status(request_id)
+            if workflow_status is None:
+                return None
+            return workflow_status.batch_id
+
+    def get_batch(self, batch_id: UUID) -> ThematicScreenBatchResponse | None:
+        """Status of each workflow of a batch, and of the batch as a whole."""
+        with self.lock:
+            workflows = self.db_session.exec(
+                select(SQLWorkflowStatus).where(SQLWorkflowStatus.batch_id == batch_id)
+            ).all()
+            if not workflows:
+                return None
+            reports = [
+                BatchReport(
+                    request_id=str(workflow.id),
+                    theme=(workflow.request or {}).get("theme", ""),
+                    focus=(workflow.request or {}).get("focus"),
+                    status=WorkflowStatus(workflow.status),
+                )
+                for workflow in workflows
+            ]
+        reports.sort(key=lambda report: (report.theme, report.focus or ""))
+        return ThematicScreenBatchResponse(
+            batch_id=str(batch_id),
+            status=aggregate_status([report.status for report in reports]),
+            reports=reports,
+        )
+
+    def count_queued_workflows(self) -> int:
+        """Number of workflows waiting to run, not following another one."""
+        with self.lock:
+            return self.db_session.exec(
+                select(func.count()).where(
+                    SQLWorkflowStatus.status == WorkflowStatus.QUEUED,
+                    col(SQLWorkflowStatus.leader_id).is_(None),
+                )
+            ).one()
+
+    def get_queue_position(self, request_id: UUID) -> int | None:
+        """Position of a queued workflow among the queued workflows, oldest first, or None
+        if it is not waiting to run."""
+        with self.lock:
+            workflow_status = self._get_workflow_status(request_id)
+            if (
+                workflow_status is None
+                or workflow_status.status != WorkflowStatus.QUEUED
+            ):
+                return None
+            ahead = self.db_session.exec(
+                select(func.count()).where(
+                    SQLWorkflowStatus.status == WorkflowStatus.QUEUED,
+                    col(SQLWorkflowStatus.leader_id).is_(None),
+                    SQLWorkflowStatus.last_updated < workflow_status.last_updated,
+                )
+            ).one()
+            return ahead + 1
+
+    def get_status(self, request_id: UUID) -> WorkflowStatus | None:
+        with self.lock:
+            workflow_status = self._get_workflow_status(request_id)
+            if workflow_status is None:
+                return None
+            return WorkflowStatus(workflow_status.status)
+
+    def _get_workflow_logs(
+        self, request_id: UUID, since_seq: int = 0
+    ) -> list[tuple[int, str]]:
+        return list(
+            self.db_session.exec(
+                select(SQLWorkflowLog.seq, SQLWorkflowLog.message)
+                .where(
+                    SQLWorkflowLog.request_id == request_id,
+                    SQLWorkflowLog.seq > since_seq,
+                )
+                .order_by(SQLWorkflowLog.seq)
+            ).all()
+        )
+
+    def log_message(self, request_id: UUID, message: str):
+        """Append a message to the workflow logs as a single row, without touching
+        previously stored messages."""
+        with self.lock:
+            now = datetime.now()
+            result = self.db_session.exec(
+                update(SQLWorkflowStatus)
+                .where(SQLWorkflowStatus.id == request_id)
+                .values(last_updated=now)
+            )
+            if result.rowcount == 0:
+                self.db_session.rollback()
+                raise ValueError(
+                    f"Request ID {request_id} not found in status storage."
+                )
+            last_seq = self.db_session.exec(
+                select(func.max(SQLWorkflowLog.seq)).where(
+                    SQLWorkflowLog.request_id == request_id
+                )
+            ).one()
+            seq = (last_seq or 0) + 1
+            self.db_session.add(
+                SQLWorkflowLog(
+                    request_id=request_id,
+                    seq=seq,
+                    created_at=now,
+                    message=message,
+                )
+            )
+            self.db_session.commit()
+
+        if self.event_broker is not None:
+            self.event_broker.publish_log(request_id, seq, message)
+
+    def get_logs(self, request_id: UUID, since_seq: int = 0) -> list[str] | None:
+        """Get the workflow logs with a sequence number greater than `since_seq`.
+        Sequence numbers start at 1, so the default returns every message."""
+        with self.lock:
+            workflow_status = self._get_workflow_status(request_id)
+            if workflow_status is None:
+                return None
+            return [
+                message
+                for _, message in self._get_workflow_logs(
+                    workflow_status.leader_id or request_id, since_seq
+                )
+            ]
+
+    def get_log_entries(
+        self, request_id: UUID, since_seq: int = 0
+    ) -> list[tuple[int, str]] | None:
+        """Same as `get_logs`, but each message comes with its sequence number."""
+        with self.lock:
+            workflow_status = self._get_workflow_status(request_id)
+            if workflow_status is None:
+                return None
+            return self._get_workflow_logs(
+                workflow_status.leader_id or request_id, since_seq
+            )
 
-    def get_logs(self, request_id: UUID) -> list[str] | None:
+    def get_last_updated(self, request_id: UUID) -> datetime | None:
+        """Last time the workflow, or the workflow it follows, was updated."""
         with self.lock:
             workflow_status = self._get_workflow_status(request_id)
             if workflow_status is None:
                 return None
-            return workflow_status.logs
+            return self._get_last_updated(workflow_status)
+
+    def _get_last_updated(self, workflow_status: SQLWorkflowStatus) -> datetime:
+        if workflow_status.leader_id is None:
+            return workflow_status.last_updated
+        leader_last_updated = self.db_session.exec(
+            select(SQLWorkflowStatus.last_updated).where(
+                SQLWorkflowStatus.id == workflow_status.leader_id
+            )
+        ).first()
+        return max(
+            workflow_status.last_updated,
+            leader_last_updated or workflow_status.last_updated,
+        )
 
     def mark_workflow_as_completed(
         self,
@@ -89,6 +579,26 @@ class StorageManager:
         request: ThematicScreenRequest,
         report: ThematicScreenerResponse,
     ):
+        # Compressing a large report takes a while, do it before taking the lock. Each
+        # workflow following this one gets its own copy of the stored report.
+        sql_report = SQLThematicScreenerReport.from_thematic_screener_response(
+            request_id, request, report
+        )
+        with self.lock:
+            followers = self._get_running_followers(request_id)
+            follower_requests = {
+                follower.id: follower.request for follower in followers
+            }
+        follower_reports = {
+            follower_id: SQLThematicScreenerReport.from_thematic_screener_response(
+                follower_id,
+                ThematicScreenRequest.model_validate(follower_request),
+                report,
+                stored_report=sql_report,
+            )
+            for follower_id, follower_request in follower_requests.items()
+        }
+
         with self.lock:
             workflow_status = self._get_workflow_status(request_id)
             if workflow_status is None:
@@ -96,35 +606,369 @@ class StorageManager:
                     f"Request ID {request_id} not found in status storage."
                 )
             workflow_status.status = WorkflowStatus.COMPLETED
-            sql_report = SQLThematicScreenerReport.from_thematic_screener_response(
-                request_id, request, report
-            )
+            workflow_status.last_updated = datetime.now()
 
             self.db_session.add(workflow_status)
             self.db_session.add(sql_report)
+            # Followers share the labeled chunks of their leader, see `get_labeled_content`
+            self._index_labeled_chunks(
+                request_id, report.content.model_dump() if report.content else []
+            )
+
+            followers = self._get_running_followers(request_id)
+            follower_ids = [follower.id for follower in followers]
+            for follower in followers:
+                follower.status = WorkflowStatus.COMPLETED
+                follower.last_updated = workflow_status.last_updated
+                self.db_session.add(follower)
+                follower_report = follower_reports.get(follower.id)
+                if follower_report is None:
+                    # Attached since the report copies were built
+                    follower_report = (
+                        SQLThematicScreenerReport.from_thematic_screener_response(
+                            follower.id,
+                            ThematicScreenRequest.model_validate(follower.request),
+                            report,
+                            stored_report=sql_report,
+                        )
+                    )
+                self.db_session.add(follower_report)
+
             self.db_session.commit()
             self.db_session.refresh(workflow_status)
             self.db_session.refresh(sql_report)
 
-    def get_report(self, request_id: UUID) -> ThematicScreenerStatusResponse | None:
+        if self.event_broker is not None:
+            self.event_broker.publish_status(request_id, WorkflowStatus.COMPLETED)
+            for follower_id in follower_ids:
+                self.event_broker.publish_status(follower_id, WorkflowStatus.COMPLETED)
+
+    def _get_running_followers(self, request_id: UUID) -> list[SQLWorkflowStatus]:
+        return list(
+            self.db_session.exec(
+                select(SQLWorkflowStatus).where(
+                    SQLWorkflowStatus.leader_id == request_id,
+                    col(SQLWorkflowStatus.status).not_in(TERMINAL_STATUSES),
+                )
+            ).all()
+        )
+
+    def _index_labeled_chunks(self, request_id: UUID, content: list[dict]):
+        """Store the labeled chunks of a report in their own table, in the order of the
+        report. Runs in the transaction of the caller."""
+        self.db_session.exec(
+            delete(SQLLabeledChunk).where(SQLLabeledChunk.request_id == request_id)
+        )
+        if content:
+            # Bulk insert, without creating a model per chunk
+            self.db_session.connection().execute(
+                insert(SQLLabeledChunk),
+                [
+                    {"request_id": request_id, "seq": seq, **chunk}
+                    for seq, chunk in enumerate(content, start=1)
+                ],
+            )
+
+    def _get_labeled_content_id(self, request_id: UUID) -> UUID | None:
+        """ID under which the labeled chunks of a completed report are stored, indexing
+        them if the report was completed before the chunks had their own table. Followers
+        share the chunks of their leader. Called with the lock held."""
+        workflow_status = self._get_workflow_status(request_id)
+        if workflow_status is None:
+            return None
+        sql_report = self._get_workflow_report(request_id)
+        if sql_report is None:
+            return None
+        content_id = workflow_status.leader_id or request_id
+        indexed = self.db_session.exec(
+            select(SQLLabeledChunk.seq)
+            .where(SQLLabeledChunk.request_id == content_id)
+            .limit(1)
+        ).first()
+        if indexed is None:
+            content = sql_report.load_report().content
+            if content:
+                self._index_labeled_chunks(content_id, content.model_dump())
+                self.db_session.commit()
+        return content_id
+
+    def get_labeled_content_id(self, request_id: UUID) -> UUID | None:
+        """ID to read the labeled chunks of a completed report with `iter_labeled_chunks`.
+        Returns None if the report is not found."""
+        with self.lock:
+            return self._get_labeled_content_id(request_id)
+
+    @staticmethod
+    def _select_labeled_chunks(
+        query,
+        content_id: UUID,
+        company: list[str] | None,
+        theme: list[str] | None,
+        sector: list[str] | None,
+        time_period: list[str] | None,
+        date_from: date | None,
+        date_to: date | None,
+        cursor: int,
+        limit: int,
+    ):
+        query = query.where(
+            SQLLabeledChunk.request_id == content_id,
+            SQLLabeledChunk.seq > cursor,
+        )
+        if company:
+            query = query.where(col(SQLLabeledChunk.company).in_(company))
+        if theme:
+            query = query.where(col(SQLLabeledChunk.theme).in_(theme))
+        if sector:
+            query = query.where(col(SQLLabeledChunk.sector).in_(sector))
+        if time_period:
+            query = query.where(col(SQLLabeledChunk.time_period).in_(time_period))
+        if date_from is not None:
+            query = query.where(SQLLabeledChunk.date >= date_from.isoformat())
+        if date_to is not None:
+            # Dates may include a time
+            query = query.where(
+                SQLLabeledChunk.date < (date_to + timedelta(days=1)).isoformat()
+            )
+        return query.order_by(col(SQLLabeledChunk.seq)).limit(limit)
+
+    def get_labeled_content(
+        self,
+        request_id: UUID,
+        company: list[str] | None = None,
+        theme: list[str] | None = None,
+        sector: list[str] | None = None,
+        time_period: list[str] | None = None,
+        date_from: date | None = None,
+        date_to: date | None = None,
+        cursor: int = 0,
+        limit: int = 100,
+    ) -> LabeledContentPage | None:
+        """Page of the labeled chunks of a completed report matching the filters, in the
+        order of the report. Chunks are paged with a keyset cursor: the sequence number of
+        the last chunk of the previous page. Returns None if the report is not found.
+
+        Reports completed before the chunks were stored in their own table are indexed on
+        first access.
+        """
+        with self.lock:
+            content_id = self._get_labeled_content_id(request_id)
+            if content_id is None:
+                return None
+            chunks = self.db_session.exec(
+                self._select_labeled_chunks(
+                    select(SQLLabeledChunk),
+                    content_id,
+                    company,
+                    theme,
+                    sector,
+                    time_period,
+                    date_from,
+                    date_to,
+                    cursor,
+                    limit + 1,
+                )
+            ).all()
+
+            has_next_page = len(chunks) > limit
+            chunks = chunks[:limit]
+            return LabeledContentPage(
+                request_id=str(request_id),
+                content=[
+                    LabeledChunk.model_validate(chunk, from_attributes=True)
+                    for chunk in chunks
+                ],
+                next_cursor=str(chunks[-1].seq) if has_next_page else None,
+            )
+
+    def iter_labeled_chunks(
+        self,
+        content_id: UUID,
+        company: list[str] | None = None,
+        theme: list[str] | None = None,
+        sector: list[str] | None = None,
+        time_period: list[str] | None = None,
+        date_from: date | None = None,
+        date_to: date | None = None,
+        batch_size: int = 1000,
+    ) -> Iterator[list[dict]]:
+        """Labeled chunks stored under `content_id` (see `get_labeled_content_id`) matching
+        the filters, in the order of the report, in batches of `batch_size` dicts of the
+        fields of `LabeledChunk`. Batches are read one at a time, so the memory used does not
+        grow with the report, and the lock is only held while a batch is read."""
+        fields = list(LabeledChunk.model_fields)
+        columns = [getattr(SQLLabeledChunk, field) for field in fields]
+        cursor = 0
+        while True:
+            with self.lock:
+                rows = self.db_session.exec(
+                    self._select_labeled_chunks(
+                        select(SQLLabeledChunk.seq, *columns),
+                        content_id,
+                        company,
+                        theme,
+                        sector,
+                        time_period,
+                        date_from,
+                        date_to,
+                        cursor,
+                        batch_size,
+                    )
+                ).all()
+            if not rows:
+                return
+            yield [dict(zip(fields, row[1:])) for row in rows]
+            cursor = rows[-1][0]
+
+    def get_report_json(self, request_id: UUID) -> bytes | None:
+        """JSON of the report of a workflow as stored, without loading the report itself.
+        Returns None if the workflow has no report, or if it was stored before reports were
+        tagged with their format, in which case it is only served validated by `get_report`.
+        """
+        with self.lock:
+            row = self.db_session.exec(
+                select(
+                    SQLThematicScreenerReport.report_format,
+                    SQLThematicScreenerReport.report_blob,
+                    # Text of the JSON column, as stored
+                    type_coerce(SQLThematicScreenerReport.screener_report, String),
+                ).where(SQLThematicScreenerReport.id == request_id)
+            ).first()
+        if row is None or row[0] is None:
+            return None
+        report_format, report_blob, screener_report = row
+        if report_format == JSON_REPORT_FORMAT:
+            # Some drivers decode JSON columns whatever their type
+            if isinstance(screener_report, str):
+                return screener_report.encode()
+            return dumps_json(screener_report)
+        return decompress_report(report_blob, report_format)  # ty: ignore[invalid-argument-type]
+
+    def find_cached_report(self, request_hash: str, max_age: timedelta) -> UUID | None:
+        """Find the most recent completed report of a request with the same canonical hash,
+        created less than `max_age` ago."""
+        with self.lock:
+            return self.db_session.exec(
+                select(SQLThematicScreenerReport.id)
+                .join(
+                    SQLWorkflowStatus,
+                    col(SQLWorkflowStatus.id) == col(SQLThematicScreenerReport.id),
+                )
+                .where(
+                    SQLThematicScreenerReport.request_hash == request_hash,
+                    SQLThematicScreenerReport.created_at >= datetime.now() - max_age,
+                    SQLWorkflowStatus.status == WorkflowStatus.COMPLETED,
+                )
+                .order_by(col(SQLThematicScreenerReport.created_at).desc())
+            ).first()
+
+    def get_report(
+        self, request_id: UUID, since_seq: int = 0, include_report: bool = True
+    ) -> ThematicScreenerStatusResponse | None:
+        """Get the status of a workflow, the logs after `since_seq` and, if requested
+        and available, the complete report. Followers report the logs and the last update
+        of the workflow they follow."""
         with self.lock:
             workflow_status = self._get_workflow_status(request_id)
             if workflow_status is None:
                 return None
-            sql_report = self._get_workflow_report(request_id)
-            if sql_report is None:
-                return ThematicScreenerStatusResponse(
-                    request_id=str(request_id),
-                    last_updated=workflow_status.last_updated,
-                    status=WorkflowStatus(workflow_status.status),
-                    logs=workflow_status.logs,
-                    report=None,
-                )
+            logs = self._get_workflow_logs(
+                workflow_status.leader_id or request_id, since_seq
+            )
+            last_log_seq = logs[-1][0] if logs else since_seq
+            report = None
+            if include_report:
+                sql_report = self._get_workflow_report(request_id)
+                if sql_report is not None:
+                    report = sql_report.load_report()
 
             return ThematicScreenerStatusResponse(
                 request_id=str(request_id),
-                last_updated=workflow_status.last_updated,
+                last_updated=self._get_last_updated(workflow_status),
                 status=WorkflowStatus(workflow_status.status),
-                logs=workflow_status.logs,
-                report=ThematicScreenerResponse(**sql_report.screener_report),  # ty: ignore[missing-argument]
+                logs=[message for _, message in logs],
+                last_log_seq=last_log_seq,
+                report=report,
             )
+
+    def get_cached_taxonomy(
+        self, theme: str, focus: str | None, llm_model: str, version: str
+    ) -> dict | None:
+        """Get the theme tree generated for a theme, focus and LLM model, counting the hit."""
+        taxonomy_id = SQLThemeTaxonomy.compute_id(theme, focus, llm_model, version)
+        with self.lock:
+            taxonomy = self.db_session.get(SQLThemeTaxonomy, taxonomy_id)
+            if taxonomy is None:
+                return None
+            taxonomy.hits += 1
+            taxonomy.last_used_at = datetime.now()
+            self.db_session.add(taxonomy)
+            self.db_session.commit()
+            self.db_session.refresh(taxonomy)
+            return taxonomy.tree
+
+    def save_taxonomy(
+        self, theme: str, focus: str | None, llm_model: str, version: str, tree: dict
+    ):
+        taxonomy_id = SQLThemeTaxonomy.compute_id(theme, focus, llm_model, version)
+        with self.lock:
+            taxonomy = self.db_session.get(SQLThemeTaxonomy, taxonomy_id)
+            if taxonomy is None:
+                taxonomy = SQLThemeTaxonomy(
+                    id=taxonomy_id,
+                    theme=theme.strip(),
+                    focus=(focus or "").strip(),
+                    llm_model=llm_model,
+                    version=version,
+                    tree=tree,
+                )
+            else:
+                taxonomy.tree = tree
+                taxonomy.created_at = datetime.now()
+            self.db_session.add(taxonomy)
+            self.db_session.commit()
+
+    def list_taxonomies(self) -> list[CachedThemeTaxonomy]:
+        with self.lock:
+            taxonomies = self.db_session.exec(
+                select(SQLThemeTaxonomy).order_by(
+                    col(SQLThemeTaxonomy.last_used_at).desc()
+                )
+            ).all()
+            return [
+                CachedThemeTaxonomy(
+                    id=taxonomy.id,
+                    theme=taxonomy.theme,
+                    focus=taxonomy.focus,
+                    llm_model=taxonomy.llm_model,
+                    version=taxonomy.version,
+                    created_at=taxonomy.created_at,
+                    last_used_at=taxonomy.last_used_at,
+                    hits=taxonomy.hits,
+                    taxonomy=ThemeTaxonomy(**taxonomy.tree),  # ty: ignore[missing-argument]
+                )
+                for taxonomy in taxonomies
+            ]
+
+    def evict_taxonomy(self, taxonomy_id: str) -> bool:
+        """Delete a cached theme tree. Returns whether it existed."""
+        with self.lock:
+            taxonomy = self.db_session.get(SQLThemeTaxonomy, taxonomy_id)
+            if taxonomy is None:
+                return False
+            self.db_session.delete(taxonomy)
+            self.db_session.commit()
+            return True
+
+    def evict_taxonomies(self, theme: str | None = None) -> int:
+        """Delete all the cached theme trees, or only those of a theme. Returns how many
+        were deleted."""
+        with self.lock:
+            query = select(SQLThemeTaxonomy)
+            if theme is not None:
+                query = query.where(SQLThemeTaxonomy.theme == theme.strip())
+            taxonomies = self.db_session.exec(query).all()
+            for taxonomy in taxonomies:
+                self.db_session.delete(taxonomy)
+            self.db_session.commit()
+            return len(taxonomies)
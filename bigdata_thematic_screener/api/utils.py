@@ -1,7 +1,14 @@
+import hashlib
+import json
+from importlib.util import find_spec
 from typing import Type
 
 from pydantic import BaseModel
 
+# orjson is optional, installed with the `orjson` extra. It encodes JSON faster than the
+# standard library.
+ORJSON_AVAILABLE = find_spec("orjson") is not None
+
 
 def get_example_values_from_schema(schema_model: Type[BaseModel]) -> dict:
     """
@@ -23,3 +30,42 @@ def get_example_values_from_schema(schema_model: Type[BaseModel]) -> dict:
         else:
             example_values[field_name] = field.default
     return example_values
+
+
+def compute_etag(*parts: object) -> str:
+    """
+    Build a strong ETag from the given parts. The same parts always produce the same ETag.
+    """
+    digest = hashlib.sha256(":".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(etag: str, if_none_match: str | None) -> bool:
+    """
+    Check whether an `If-None-Match` header value matches the given ETag.
+    """
+    if if_none_match is None:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def dumps_json(obj: object) -> bytes:
+    """
+    Encode JSON-compatible data, with orjson if it is installed.
+    """
+    if ORJSON_AVAILABLE:
+        import orjson
+
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def dumps_with_raw_json(obj: dict, key: str, raw_json: bytes) -> bytes:
+    """
+    Encode a dict with `raw_json`, already encoded JSON, as the value of `key`. `raw_json`
+    is copied as is, it is neither parsed nor validated.
+    """
+    encoded = dumps_json({k: v for k, v in obj.items() if k != key})
+    separator = b"," if encoded != b"{}" else b""
+    return b"".join((encoded[:-1], separator, dumps_json(key), b":", raw_json, b"}"))
@@ -0,0 +1,115 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Literal
+
+from bigdata_thematic_screener.settings import settings
+
+# Value of `batch_size` and `document_limit` tuned at runtime
+AUTO: Literal["auto"] = "auto"
+
+
+class SearchStats:
+    """Latency and failures of the queries sent to the search API within `track_searches`."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.latencies: list[float] = []
+        self.failures = 0
+
+    def record(self, latency: float, failed: bool):
+        with self._lock:
+            self.latencies.append(latency)
+            if failed:
+                self.failures += 1
+
+    @property
+    def queries(self) -> int:
+        with self._lock:
+            return len(self.latencies)
+
+    @property
+    def mean_latency(self) -> float:
+        with self._lock:
+            return sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
+
+
+# Queries of the search round running in the current context, see `track_searches`
+current_search_stats: ContextVar[SearchStats | None] = ContextVar(
+    "current_search_stats", default=None
+)
+
+
+@contextmanager
+def track_searches() -> Iterator[SearchStats]:
+    """Measure the queries sent by the search managers created within the block."""
+    stats = SearchStats()
+    token = current_search_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_search_stats.reset(token)
+
+
+class BatchSizeTuner:
+    """Additive-increase, multiplicative-decrease tuning of the number of entities per query.
+
+    After each round of queries, the batch size grows by `increase` entities while the
+    queries answer within `target_latency` seconds on average without failures. It is
+    multiplied by `decrease` as soon as they get slower or some of them fail, which is how
+    the search API reports throttling, so it settles right below the size the API sustains.
+
+    Args:
+        initial: Batch size of the first round.
+        minimum: Smallest batch size.
+        maximum: Largest batch size.
+        target_latency: Average seconds per query above which the batch size decreases.
+        increase: Entities added to the batch size after a round within the target.
+        decrease: Factor applied to the batch size after a slow or failing round.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        target_latency: float,
+        increase: int = 2,
+        decrease: float = 0.5,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.increase = increase
+        self.decrease = decrease
+        self.batch_size = min(max(initial, minimum), maximum)
+        self.history: list[int] = []
+
+    def update(self, stats: SearchStats) -> int:
+        """Adjust the batch size after a round of queries measured by `stats`, and return it."""
+        self.history.append(self.batch_size)
+        if stats.queries == 0:
+            return self.batch_size
+        if stats.failures > 0 or stats.mean_latency > self.target_latency:
+            self.batch_size = max(int(self.batch_size * self.decrease), self.minimum)
+        else:
+            self.batch_size = min(self.batch_size + self.increase, self.maximum)
+        return self.batch_size
+
+
+def create_batch_size_tuner() -> BatchSizeTuner:
+    """Tuner configured in the settings."""
+    return BatchSizeTuner(
+        initial=settings.AUTOTUNE_INITIAL_BATCH_SIZE,
+        minimum=settings.AUTOTUNE_MIN_BATCH_SIZE,
+        maximum=settings.AUTOTUNE_MAX_BATCH_SIZE,
+        target_latency=settings.AUTOTUNE_TARGET_LATENCY_SECONDS,
+        increase=settings.AUTOTUNE_BATCH_SIZE_INCREASE,
+    )
+
+
+def auto_document_limit(batch_size: int) -> int:
+    """Document limit of a query on `batch_size` entities, keeping the same number of
+    documents per entity whatever the batch size."""
+    return batch_size * settings.AUTOTUNE_DOCUMENTS_PER_ENTITY
@@ -0,0 +1,183 @@
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import Any
+
+
+class CacheStats:
+    """Thread-safe hit and miss counters of a cache."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record_hit(self, count: int = 1):
+        with self._lock:
+            self.hits += count
+
+    def record_miss(self, count: int = 1):
+        with self._lock:
+            self.misses += count
+
+    @property
+    def hit_ratio(self) -> float:
+        with self._lock:
+            total = self.hits + self.misses
+            return self.hits / total if total else 0.0
+
+    def to_dict(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hit_ratio}
+
+
+_cache_stats: dict[str, CacheStats] = {}
+_cache_stats_lock = Lock()
+
+
+def get_cache_stats(name: str) -> CacheStats:
+    """Get the counters of the cache `name`, registering them on first use."""
+    with _cache_stats_lock:
+        if name not in _cache_stats:
+            _cache_stats[name] = CacheStats()
+        return _cache_stats[name]
+
+
+def all_cache_stats() -> dict[str, dict]:
+    with _cache_stats_lock:
+        return {name: stats.to_dict() for name, stats in _cache_stats.items()}
+
+
+class TTLCache:
+    """In-memory cache holding at most `max_entries` values, each one for at most `ttl_seconds`.
+    When full, the least recently used value is evicted."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = Lock()
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class DiskCache:
+    """Key-value cache persisted in a SQLite file, so it survives restarts.
+
+    Values expire after `ttl_seconds` (never if None). When the stored values exceed
+    `max_bytes`, the least recently used ones are evicted.
+    """
+
+    def __init__(
+        self, path: str, ttl_seconds: float | None = None, max_bytes: int | None = None
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                "expires_at REAL, accessed_at REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_cache_accessed_at ON cache (accessed_at)"
+            )
+
+    def get(self, key: str) -> bytes | None:
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at < now:
+                self._connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            self._connection.execute(
+                "UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            return value
+
+    def set(self, key: str, value: bytes):
+        now = time.time()
+        expires_at = now + self.ttl_seconds if self.ttl_seconds is not None else None
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), expires_at, now),
+            )
+            if self.max_bytes is not None:
+                self._evict()
+
+    def delete(self, key: str):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            (size,) = self._connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM cache"
+            ).fetchone()
+            return size
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._connection.execute("SELECT COUNT(*) FROM cache").fetchone()
+            return count
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _evict(self):
+        # Called with the lock held, inside a transaction
+        self._connection.execute(
+            "DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?",
+            (time.time(),),
+        )
+        (total,) = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM cache"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self._connection.execute(
+            "SELECT key, size FROM cache ORDER BY accessed_at"
+        ).fetchall():
+            if total - evicted <= self.max_bytes:
+                break
+            self._connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+            evicted += size
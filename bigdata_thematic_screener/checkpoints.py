@@ -0,0 +1,136 @@
+import json
+import os
+import pickle
+import shutil
+import time
+import zlib
+from importlib.util import find_spec
+from pathlib import Path
+from uuid import UUID
+
+import pandas as pd
+from bigdata_client.models.entities import Company
+
+from bigdata_thematic_screener import logger
+from bigdata_thematic_screener.settings import settings
+
+# Stages of a workflow whose outputs are checkpointed, in the order they complete
+COMPANIES_STAGE = "companies"
+TAXONOMY_STAGE = "taxonomy"
+CHUNKS_STAGE = "chunks"
+LABELED_STAGE = "labeled"
+STAGES = (COMPANIES_STAGE, TAXONOMY_STAGE, CHUNKS_STAGE, LABELED_STAGE)
+
+# Parquet needs pyarrow, installed with the `parquet` extra. Frames are pickled when it is
+# missing, or when their columns cannot be converted to Arrow.
+PARQUET_AVAILABLE = find_spec("pyarrow") is not None
+
+
+class WorkflowCheckpoints:
+    """Outputs of the completed stages of a workflow, stored in `directory/<request_id>`
+    so that a failed workflow can resume from its last completed stage instead of starting
+    over. Frames are stored as Parquet files, or compressed pickles, and the other outputs
+    as JSON files. Files are written atomically, so a checkpoint is either complete or
+    missing."""
+
+    def __init__(self, directory: str, request_id: UUID):
+        self.path = Path(directory) / str(request_id)
+
+    def _write(self, name: str, data: bytes):
+        self.path.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.path / f".{name}.tmp"
+        temporary_path.write_bytes(data)
+        os.replace(temporary_path, self.path / name)
+
+    def save_frame(self, stage: str, df: pd.DataFrame):
+        if PARQUET_AVAILABLE:
+            try:
+                self._write(f"{stage}.parquet", df.to_parquet(index=False))
+                return
+            except Exception as e:
+                logger.warning(
+                    "Checkpoint cannot be stored as Parquet", stage=stage, error=str(e)
+                )
+        self._write(
+            f"{stage}.pkl.zlib",
+            zlib.compress(pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)),
+        )
+
+    def load_frame(self, stage: str) -> pd.DataFrame | None:
+        parquet_path = self.path / f"{stage}.parquet"
+        if parquet_path.exists():
+            return pd.read_parquet(parquet_path)
+        pickle_path = self.path / f"{stage}.pkl.zlib"
+        if pickle_path.exists():
+            return pickle.loads(zlib.decompress(pickle_path.read_bytes()))
+        return None
+
+    def save_json(self, stage: str, data):
+        self._write(f"{stage}.json", json.dumps(data).encode())
+
+    def load_json(self, stage: str):
+        path = self.path / f"{stage}.json"
+        if not path.exists():
+            return None
+        return json.loads(path.read_bytes())
+
+    def save_companies(self, companies: list[Company]):
+        self.save_json(
+            COMPANIES_STAGE, [company.model_dump(mode="json") for company in companies]
+        )
+
+    def load_companies(self) -> list[Company] | None:
+        companies = self.load_json(COMPANIES_STAGE)
+        if companies is None:
+            return None
+        return [Company(**company) for company in companies]
+
+    def completed_stages(self) -> list[str]:
+        """Stages with a checkpoint, in the order they complete. Chunks of sharded screens
+        are stored per shard, as `chunks_<shard>`."""
+        if not self.path.exists():
+            return []
+        names = {path.name.split(".")[0] for path in self.path.iterdir()}
+        return [
+            stage
+            for stage in STAGES
+            if stage in names or any(name.startswith(f"{stage}_") for name in names)
+        ]
+
+    def updated_at(self) -> float | None:
+        """Time the last checkpoint was saved, or None when there is none."""
+        try:
+            return self.path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def get_workflow_checkpoints(request_id: UUID) -> WorkflowCheckpoints | None:
+    """Checkpoints of a workflow, if `CHECKPOINT_DIR` is set."""
+    if not settings.CHECKPOINT_DIR:
+        return None
+    return WorkflowCheckpoints(settings.CHECKPOINT_DIR, request_id)
+
+
+def get_expired_checkpoints(
+    ttl_seconds: float,
+) -> list[tuple[UUID, WorkflowCheckpoints]]:
+    """Checkpoints of the workflows whose last checkpoint was saved more than `ttl_seconds`
+    ago, if `CHECKPOINT_DIR` is set."""
+    if not settings.CHECKPOINT_DIR or not os.path.isdir(settings.CHECKPOINT_DIR):
+        return []
+    expired = []
+    now = time.time()
+    for path in Path(settings.CHECKPOINT_DIR).iterdir():
+        try:
+            request_id = UUID(path.name)
+        except ValueError:
+            continue
+        workflow_checkpoints = WorkflowCheckpoints(settings.CHECKPOINT_DIR, request_id)
+        updated_at = workflow_checkpoints.updated_at()
+        if updated_at is not None and now - updated_at > ttl_seconds:
+            expired.append((request_id, workflow_checkpoints))
+    return expired
@@ -0,0 +1,134 @@
+import hashlib
+import importlib
+import json
+
+from bigdata_research_tools.llm.base import AsyncLLMEngine, LLMEngine
+
+from bigdata_thematic_screener.cache import DiskCache, get_cache_stats
+from bigdata_thematic_screener.rate_limit import (
+    AsyncRateLimitedResponses,
+    RateLimitedResponses,
+)
+from bigdata_thematic_screener.settings import settings
+
+# Modules of research tools creating the LLM engines used to label chunks and to
+# generate motivations
+ENGINE_MODULES = (
+    "bigdata_research_tools.labeler.labeler",
+    "bigdata_research_tools.portfolio.motivation",
+)
+
+llm_cache_stats = get_cache_stats("llm_responses")
+
+
+class LLMResponseCache:
+    """Responses of the LLM, addressed by the hash of the model, the prompt and the parameters
+    of the call. Identical calls made by later workflows get the stored response instead of
+    calling the LLM again. When the stored responses exceed `max_bytes`, the least recently
+    used ones are evicted."""
+
+    def __init__(self, path: str, max_bytes: int | None = None):
+        self.store = DiskCache(path, max_bytes=max_bytes)
+
+    @staticmethod
+    def compute_key(
+        model: str, chat_history: list[dict[str, str]], params: dict
+    ) -> str:
+        content = json.dumps(
+            {"model": model, "messages": chat_history, "params": params},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def get(
+        self, model: str, chat_history: list[dict[str, str]], params: dict
+    ) -> str | None:
+        response = self.store.get(self.compute_key(model, chat_history, params))
+        if response is None:
+            llm_cache_stats.record_miss()
+            return None
+        llm_cache_stats.record_hit()
+        return response.decode()
+
+    def set(
+        self,
+        model: str,
+        chat_history: list[dict[str, str]],
+        params: dict,
+        response: str,
+    ):
+        key = self.compute_key(model, chat_history, params)
+        self.store.set(key, response.encode())
+
+
+# Installed with `install_llm_response_cache`
+response_cache: LLMResponseCache | None = None
+
+
+class CachedResponses:
+    """Mixin answering `get_response` from the installed response cache."""
+
+    def get_response(self, chat_history: list[dict[str, str]], **kwargs) -> str:
+        cache = response_cache
+        if cache is None:
+            return super().get_response(chat_history, **kwargs)  # ty: ignore[unresolved-attribute]
+        model = str(getattr(self, "model", ""))
+        response = cache.get(model, chat_history, kwargs)
+        if response is None:
+            response = super().get_response(chat_history, **kwargs)  # ty: ignore[unresolved-attribute]
+            if isinstance(response, str) and response:
+                cache.set(model, chat_history, kwargs, response)
+        return response
+
+
+class AsyncCachedResponses:
+    """Mixin answering the async `get_response` from the installed response cache."""
+
+    async def get_response(self, chat_history: list[dict[str, str]], **kwargs) -> str:
+        cache = response_cache
+        if cache is None:
+            return await super().get_response(chat_history, **kwargs)  # ty: ignore[unresolved-attribute]
+        model = str(getattr(self, "model", ""))
+        response = cache.get(model, chat_history, kwargs)
+        if response is None:
+            response = await super().get_response(chat_history, **kwargs)  # ty: ignore[unresolved-attribute]
+            if isinstance(response, str) and response:
+                cache.set(model, chat_history, kwargs, response)
+        return response
+
+
+# Only the calls missing the cache wait for the rate limits of the provider
+class CachedLLMEngine(CachedResponses, RateLimitedResponses, LLMEngine):
+    pass
+
+
+class CachedAsyncLLMEngine(
+    AsyncCachedResponses, AsyncRateLimitedResponses, AsyncLLMEngine
+):
+    pass
+
+
+def install_llm_response_cache(cache: LLMResponseCache | None):
+    """Make the labeler and the motivation generator of research tools use LLM engines
+    answering from `cache`. Passing None disables the cache."""
+    global response_cache
+    response_cache = cache
+    for module_name in ENGINE_MODULES:
+        module = importlib.import_module(module_name)
+        if hasattr(module, "LLMEngine"):
+            module.LLMEngine = CachedLLMEngine  # ty: ignore[invalid-assignment]
+        if hasattr(module, "AsyncLLMEngine"):
+            module.AsyncLLMEngine = CachedAsyncLLMEngine  # ty: ignore[invalid-assignment]
+
+
+def install_configured_llm_response_cache():
+    """Install the LLM engines with the response cache configured in the settings, if any.
+    The engines are installed without a cache too, as they apply the rate limits."""
+    install_llm_response_cache(
+        LLMResponseCache(
+            settings.LLM_CACHE_PATH, max_bytes=settings.LLM_CACHE_MAX_BYTES
+        )
+        if settings.LLM_CACHE_PATH
+        else None
+    )
@@ -44,7 +44,19 @@ class ThemeScoring(RootModel):
     root: dict[str, CompanyScoring]
 
 
+class SearchParameters(BaseModel):
+    """Entity batch size and document limit the chunks were searched with. When they are
+    tuned at runtime, the values of the last round of queries, and the batch size of every
+    round in `batch_sizes`."""
+
+    batch_size: int
+    document_limit: int
+    tuned: bool = False
+    batch_sizes: list[int] = []
+
+
 class ThematicScreenerResponse(BaseModel):
     theme_scoring: ThemeScoring
     theme_taxonomy: ThemeTaxonomy
     content: LabeledContent | None = None
+    search_parameters: SearchParameters | None = None
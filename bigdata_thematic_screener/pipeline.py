@@ -0,0 +1,781 @@
+import math
+import threading
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import copy_context
+from datetime import datetime
+from functools import partial
+from typing import Literal
+
+from bigdata_client import Bigdata
+from bigdata_research_tools.labeler.screener_labeler import ScreenerLabeler
+from bigdata_research_tools.portfolio.motivation import Motivation
+from bigdata_research_tools.search.screener_search import search_by_companies
+from bigdata_research_tools.tracing import WorkflowStatus, WorkflowTraceEvent
+from bigdata_research_tools.tree import SemanticTree, generate_theme_tree
+from bigdata_research_tools.workflows.thematic_screener import ThematicScreener
+from bigdata_research_tools.workflows.utils import get_scored_df
+from pandas import DataFrame, concat, merge
+
+from bigdata_thematic_screener.autotune import (
+    AUTO,
+    auto_document_limit,
+    create_batch_size_tuner,
+    track_searches,
+)
+from bigdata_thematic_screener.checkpoints import (
+    CHUNKS_STAGE,
+    LABELED_STAGE,
+    TAXONOMY_STAGE,
+    WorkflowCheckpoints,
+)
+from bigdata_thematic_screener.models import SearchParameters
+from bigdata_thematic_screener.retrieval import (
+    RetrievalCache,
+    compute_query_hash,
+    retrieval_cache_stats,
+)
+from bigdata_thematic_screener.settings import settings
+from bigdata_thematic_screener.traces import send_workflow_trace
+
+
+class ThematicScreenerPipeline(ThematicScreener):
+    """`ThematicScreener` running each stage of the screening as a separate step, so the
+    service can feed in the output of a stage computed by a previous workflow instead of
+    computing it again.
+
+    Args:
+        bigdata: Client used for the searches, instead of a new client per workflow.
+        theme_tree: Theme tree to screen for. If not provided, it is generated from the
+            main theme and focus.
+        retrieval_cache: Cache of the search results of each company.
+        shards: Number of shards of companies searched and labeled in parallel. Companies
+            are scored and motivated once the labeled chunks of every shard are merged, so
+            the scores are the same as with a single shard.
+        shard_retries: Number of times a failed shard is retried on its own.
+        checkpoints: Checkpoints of the workflow. The taxonomy, the chunks and the labeled
+            chunks of each shard are saved once computed, and loaded instead of being
+            computed again when the workflow is retried.
+        **kwargs: Arguments of `ThematicScreener`.
+    """
+
+    def __init__(
+        self,
+        bigdata: Bigdata,
+        theme_tree: SemanticTree | None = None,
+        retrieval_cache: RetrievalCache | None = None,
+        shards: int = 1,
+        shard_retries: int = 0,
+        checkpoints: WorkflowCheckpoints | None = None,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.bigdata = bigdata
+        self.theme_tree = theme_tree
+        self.retrieval_cache = retrieval_cache
+        self.shards = shards
+        self.shard_retries = shard_retries
+        self.checkpoints = checkpoints
+        # Shard run by each thread, to tell apart the progress messages of each shard
+        self._shard_context = threading.local()
+        # Batch size and document limit of each round of queries, in order
+        self._search_rounds: list[tuple[int, int]] = []
+        self._search_rounds_lock = threading.Lock()
+
+    def notify_observers(self, message):
+        prefix = getattr(self._shard_context, "prefix", None)
+        super().notify_observers(f"{prefix} {message}" if prefix else message)
+
+    def screen_companies(
+        self,
+        document_limit: int | Literal["auto"] = 10,
+        batch_size: int | Literal["auto"] = 10,
+        frequency: str = "3M",
+        word_range: tuple[int, int] = (50, 100),
+    ) -> dict:
+        """Screen the companies, returning the same results as `ThematicScreener.screen_companies`."""
+        with self.traced():
+            theme_tree = self.build_theme_tree()
+            df_labeled = self.search_and_label(
+                theme_tree, document_limit, batch_size, frequency
+            )
+            return self.score_and_motivate(theme_tree, df_labeled, word_range)
+
+    @contextmanager
+    def traced(self, start: datetime | None = None) -> Iterator[None]:
+        """Send the trace of the workflow sent by `ThematicScreener.screen_companies`, with
+        the outcome of the block, for the stages run by the pipeline instead."""
+        start = start or datetime.now()
+        status = WorkflowStatus.UNKNOWN
+        try:
+            yield
+            status = WorkflowStatus.SUCCESS
+        except BaseException:
+            status = WorkflowStatus.FAILED
+            raise
+        finally:
+            send_workflow_trace(
+                self.bigdata,
+                WorkflowTraceEvent(
+                    name=ThematicScreener.name,
+                    start_date=start,
+                    end_date=datetime.now(),
+                    llm_model=str(self.llm_model),
+                    status=status,
+                ),
+            )
+
+    def score_and_motivate(
+        self,
+        theme_tree: SemanticTree,
+        df_labeled: DataFrame,
+        word_range: tuple[int, int] = (50, 100),
+    ) -> dict:
+        """Score and motivate the companies on their labeled chunks, returning the same
+        results as `screen_companies`."""
+        if df_labeled.empty:
+            self.notify_observers("No relevant content found for the companies")
+            return {
+                "df_labeled": df_labeled,
+                "df_company": DataFrame(),
+                "df_industry": DataFrame(),
+                "df_motivation": DataFrame(),
+                "theme_tree": theme_tree,
+            }
+        df_company, df_industry = self.score(df_labeled)
+        df_motivation = self.motivate(df_labeled, df_company, word_range)
+        return {
+            "df_labeled": df_labeled,
+            "df_company": df_company,
+            "df_industry": df_industry,
+            "df_motivation": df_motivation,
+            "theme_tree": theme_tree,
+        }
+
+    def extend(
+        self,
+        df_labeled_previous: DataFrame,
+        df_motivation_previous: DataFrame,
+        document_limit: int | Literal["auto"] = 10,
+        batch_size: int | Literal["auto"] = 10,
+        frequency: str = "3M",
+        word_range: tuple[int, int] = (50, 100),
+    ) -> dict:
+        """Screen the companies over the window of the pipeline only, and score them on the
+        chunks labeled by a previous screening together with the new ones. Motivations are
+        only generated again for the companies with new chunks.
+
+        Args:
+            df_labeled_previous: Labeled chunks of the previous screening.
+            df_motivation_previous: Motivations of the previous screening, with the columns
+                `Company` and `Motivation`.
+        """
+        with self.traced():
+            theme_tree = self.build_theme_tree()
+            df_new = self.search_and_label(
+                theme_tree, document_limit, batch_size, frequency
+            )
+            self.notify_observers(
+                f"{len(df_new)} new chunks labeled, merging them with the "
+                f"{len(df_labeled_previous)} chunks of the previous report"
+            )
+            frames = [df for df in (df_labeled_previous, df_new) if not df.empty]
+            if not frames:
+                self.notify_observers("No relevant content found for the companies")
+                return {
+                    "df_labeled": DataFrame(),
+                    "df_company": DataFrame(),
+                    "df_industry": DataFrame(),
+                    "df_motivation": DataFrame(),
+                    "theme_tree": theme_tree,
+                }
+            df_labeled = (
+                concat(frames, ignore_index=True)
+                .drop_duplicates(subset=["Document ID", "Company", "Theme", "Quote"])
+                .sort_values(by=["Company", "Date", "Theme"], kind="stable")
+                .reset_index(drop=True)
+            )
+            df_company, df_industry = self.score(df_labeled)
+
+            updated_companies = set() if df_new.empty else set(df_new["Company"])
+            previous_motivations = (
+                df_motivation_previous[
+                    ~df_motivation_previous["Company"].isin(updated_companies)
+                ]
+                if not df_motivation_previous.empty
+                else DataFrame(columns=["Company", "Motivation"])
+            )
+            missing_companies = updated_companies | (
+                set(df_company["Company"]) - set(previous_motivations["Company"])
+            )
+            if missing_companies:
+                df_motivation = self.motivate(
+                    df_labeled[df_labeled["Company"].isin(missing_companies)],
+                    df_company[df_company["Company"].isin(missing_companies)],
+                    word_range,
+                )
+                if not previous_motivations.empty:
+                    df_motivation = concat(
+                        [previous_motivations, df_motivation], ignore_index=True
+                    )
+            else:
+                self.notify_observers("Reusing the motivations of the previous report")
+                df_motivation = previous_motivations
+            return {
+                "df_labeled": df_labeled,
+                "df_company": df_company,
+                "df_industry": df_industry,
+                "df_motivation": df_motivation,
+                "theme_tree": theme_tree,
+            }
+
+    def build_theme_tree(self) -> SemanticTree:
+        if self.theme_tree is not None:
+            theme_tree = self.theme_tree
+            self.notify_observers("Reusing the thematic tree generated for this theme")
+        else:
+            self.notify_observers("Generating thematic tree")
+            theme_tree = generate_theme_tree(
+                main_theme=self.main_theme,
+                focus=self.focus,
+                llm_model_config=self.llm_model,
+            )
+        self.notify_observers(
+            f"Thematic tree generated with {len(theme_tree.get_terminal_labels())} leafs"
+        )
+        self.notify_observers(theme_tree.as_string())
+        if self.checkpoints is not None:
+            self.checkpoints.save_json(TAXONOMY_STAGE, theme_tree._to_dict())
+        return theme_tree
+
+    def _checkpointed(self, stage: str, compute: Callable[[], DataFrame]) -> DataFrame:
+        """Output of a stage, loaded from its checkpoint when a previous attempt of the
+        workflow completed it, and computed and saved otherwise."""
+        if self.checkpoints is None:
+            return compute()
+        df = self.checkpoints.load_frame(stage)
+        if df is not None:
+            self.notify_observers(
+                f"Resuming from checkpoint `{stage}` of a previous attempt ({len(df)} rows)"
+            )
+            return df
+        df = compute()
+        self.checkpoints.save_frame(stage, df)
+        return df
+
+    def search_and_label(
+        self,
+        theme_tree: SemanticTree,
+        document_limit: int | Literal["auto"],
+        batch_size: int | Literal["auto"],
+        frequency: str,
+    ) -> DataFrame:
+        """Search and label the chunks of the companies. With several shards, the shards are
+        searched and labeled in parallel and their labeled chunks merged."""
+        shards = partition(self.companies, self.shards)
+        if len(shards) <= 1:
+            return self._search_and_label_companies(
+                theme_tree, document_limit, batch_size, frequency
+            )
+
+        self.notify_observers(
+            f"Screening {len(self.companies)} companies in {len(shards)} shards"
+        )
+
+        screen_shard = partial(
+            self._screen_shard,
+            shards=shards,
+            theme_tree=theme_tree,
+            document_limit=document_limit,
+            batch_size=batch_size,
+            frequency=frequency,
+        )
+        with ThreadPoolExecutor(
+            max_workers=len(shards), thread_name_prefix="screener-shard"
+        ) as executor:
+            # Each shard runs in a copy of the context of the workflow, which tracks the
+            # waits for the rate limits
+            futures = [
+                executor.submit(copy_context().run, screen_shard, index)
+                for index in range(len(shards))
+            ]
+            results = [future.result() for future in futures]
+
+        frames = [df for df in results if not df.empty]
+        if not frames:
+            return DataFrame()
+        # Each company belongs to a single shard, sorting by company keeps the order of the
+        # chunks of each company and gives the same order as a single shard
+        return (
+            concat(frames, ignore_index=True)
+            .sort_values(by="Company", kind="stable")
+            .reset_index(drop=True)
+        )
+
+    def _screen_shard(
+        self,
+        index: int,
+        shards: list[list],
+        theme_tree: SemanticTree,
+        document_limit: int | Literal["auto"],
+        batch_size: int | Literal["auto"],
+        frequency: str,
+    ) -> DataFrame:
+        companies = shards[index]
+        self._shard_context.prefix = f"[Shard {index + 1}/{len(shards)}]"
+        try:
+            attempt = 0
+            while True:
+                try:
+                    df_labeled = self._search_and_label_companies(
+                        theme_tree,
+                        document_limit,
+                        batch_size,
+                        frequency,
+                        companies,
+                        shard=index,
+                    )
+                    self.notify_observers(
+                        f"Completed with {len(df_labeled)} labeled chunks"
+                    )
+                    return df_labeled
+                except Exception as e:
+                    if attempt == self.shard_retries:
+                        self.notify_observers(f"Failed with error: {e}")
+                        raise
+                    attempt += 1
+                    self.notify_observers(
+                        f"Failed with error: {e}. Retrying the shard "
+                        f"({attempt}/{self.shard_retries})"
+                    )
+        finally:
+            self._shard_context.prefix = None
+
+    def _search_and_label_companies(
+        self,
+        theme_tree: SemanticTree,
+        document_limit: int | Literal["auto"],
+        batch_size: int | Literal["auto"],
+        frequency: str,
+        companies: list | None = None,
+        shard: int | None = None,
+    ) -> DataFrame:
+        """Search and label the chunks of the companies, resuming from the checkpoints of
+        the chunks and labeled chunks of the shard, if any."""
+        suffix = f"_{shard}" if shard is not None else ""
+
+        def search() -> DataFrame:
+            return self.search(
+                theme_tree, document_limit, batch_size, frequency, companies
+            )
+
+        def label() -> DataFrame:
+            return self.label(
+                theme_tree, self._checkpointed(f"{CHUNKS_STAGE}{suffix}", search)
+            )
+
+        return self._checkpointed(f"{LABELED_STAGE}{suffix}", label)
+
+    def search(
+        self,
+        theme_tree: SemanticTree,
+        document_limit: int | Literal["auto"],
+        batch_size: int | Literal["auto"],
+        frequency: str,
+        companies: list | None = None,
+    ) -> DataFrame:
+        return self.search_sentences(
+            theme_tree.get_terminal_summaries(),
+            document_limit,
+            batch_size,
+            frequency,
+            companies,
+        )
+
+    def search_sentences(
+        self,
+        sentences: list[str],
+        document_limit: int | Literal["auto"],
+        batch_size: int | Literal["auto"],
+        frequency: str,
+        companies: list | None = None,
+    ) -> DataFrame:
+        """Search the chunks of the companies matching the sentences."""
+        if companies is None:
+            companies = self.companies
+        self.notify_observers("Searching companies for thematic exposure")
+        if self.retrieval_cache is None:
+            df_sentences = self._search_companies(
+                companies, sentences, document_limit, batch_size, frequency
+            )
+        else:
+            df_sentences = self._search_companies_with_cache(
+                self.retrieval_cache,
+                companies,
+                sentences,
+                document_limit,
+                batch_size,
+                frequency,
+            )
+        self.notify_observers(
+            f"Search completed. {len(df_sentences)} chunks found for {len(companies)} companies."
+        )
+        return df_sentences
+
+    def _search_companies(
+        self,
+        companies: list,
+        sentences: list[str],
+        document_limit: int | Literal["auto"],
+        batch_size: int | Literal["auto"],
+        frequency: str,
+    ) -> DataFrame:
+        if batch_size == AUTO:
+            return self._search_companies_tuned(
+                companies, sentences, document_limit, frequency
+            )
+        if document_limit == AUTO:
+            document_limit = auto_document_limit(batch_size)
+        self._record_search_round(batch_size, document_limit)
+        return self._run_search(
+            companies, sentences, document_limit, batch_size, frequency
+        )
+
+    def _search_companies_tuned(
+        self,
+        companies: list,
+        sentences: list[str],
+        document_limit: int | Literal["auto"],
+        frequency: str,
+    ) -> DataFrame:
+        """Search the companies in rounds of `AUTOTUNE_ROUND_BATCHES` batches of entities,
+        tuning the batch size after each round from the latency and failures of its queries."""
+        tuner = create_batch_size_tuner()
+        frames = []
+        start = 0
+        while start < len(companies):
+            batch_size = tuner.batch_size
+            round_document_limit = (
+                auto_document_limit(batch_size)
+                if document_limit == AUTO
+                else document_limit
+            )
+            round_companies = companies[
+                start : start + batch_size * settings.AUTOTUNE_ROUND_BATCHES
+            ]
+            start += len(round_companies)
+            with track_searches() as stats:
+                frames.append(
+                    self._run_search(
+                        round_companies,
+                        sentences,
+                        round_document_limit,
+                        batch_size,
+                        frequency,
+                    )
+                )
+            self._record_search_round(batch_size, round_document_limit)
+            if tuner.update(stats) != batch_size and start < len(companies):
+                self.notify_observers(
+                    f"Batch size tuned from {batch_size} to {tuner.batch_size} entities "
+                    f"per query ({stats.mean_latency:.1f}s average latency, "
+                    f"{stats.failures} failed of {stats.queries} queries)"
+                )
+
+        frames = [df for df in frames if df is not None and not df.empty]
+        if not frames:
+            return DataFrame()
+        return concat(frames, ignore_index=True)
+
+    def _record_search_round(self, batch_size: int, document_limit: int):
+        with self._search_rounds_lock:
+            self._search_rounds.append((batch_size, document_limit))
+
+    def get_search_parameters(
+        self,
+        batch_size: int | Literal["auto"],
+        document_limit: int | Literal["auto"],
+    ) -> SearchParameters:
+        """Batch size and document limit the chunks were searched with, given the requested
+        ones. Values left to `auto` are the ones of the last round of queries, or the
+        initial ones when nothing was searched."""
+        with self._search_rounds_lock:
+            rounds = list(self._search_rounds)
+        if rounds:
+            last_batch_size, last_document_limit = rounds[-1]
+        else:
+            last_batch_size = (
+                settings.AUTOTUNE_INITIAL_BATCH_SIZE
+                if batch_size == AUTO
+                else batch_size
+            )
+            last_document_limit = (
+                auto_document_limit(last_batch_size)
+                if document_limit == AUTO
+                else document_limit
+            )
+        return SearchParameters(
+            batch_size=last_batch_size,
+            document_limit=last_document_limit,
+            tuned=batch_size == AUTO,
+            batch_sizes=[size for size, _ in rounds] if batch_size == AUTO else [],
+        )
+
+    def _run_search(
+        self,
+        companies: list,
+        sentences: list[str],
+        document_limit: int,
+        batch_size: int,
+        frequency: str,
+    ) -> DataFrame:
+        return search_by_companies(
+            companies=companies,
+            sentences=sentences,
+            start_date=self.start_date,
+            end_date=self.end_date,
+            scope=self.document_type,
+            fiscal_year=self.fiscal_year,
+            rerank_threshold=self.rerank_threshold,
+            frequency=frequency,
+            document_limit=document_limit,
+            batch_size=batch_size,
+            workflow_name=ThematicScreener.name,
+            bigdata_client=self.bigdata,
+        )
+
+    def search_themes(
+        self,
+        theme_sentences: list[list[str]],
+        document_limit: int | Literal["auto"],
+        batch_size: int | Literal["auto"],
+        frequency: str,
+    ) -> list[DataFrame]:
+        """Search the chunks of the companies for the sentences of several themes. Sentences
+        shared by several themes are searched once, and each theme gets the chunks found by
+        its own sentences, the same as searching them on their own."""
+        sentences = list(dict.fromkeys(s for group in theme_sentences for s in group))
+        self.notify_observers(
+            f"Searching companies for thematic exposure with the {len(sentences)} "
+            f"sentences of {len(theme_sentences)} themes"
+        )
+        results = self._search_company_sentences(
+            self.retrieval_cache,
+            self.companies,
+            sentences,
+            document_limit,
+            batch_size,
+            frequency,
+        )
+        frames = [
+            combine_company_results(self.companies, group, results)
+            for group in theme_sentences
+        ]
+        self.notify_observers(
+            f"Search completed. {', '.join(str(len(df)) for df in frames)} chunks found "
+            f"for each theme of {len(self.companies)} companies."
+        )
+        return frames
+
+    def _search_companies_with_cache(
+        self,
+        cache: RetrievalCache,
+        companies: list,
+        sentences: list[str],
+        document_limit: int | Literal["auto"],
+        batch_size: int | Literal["auto"],
+        frequency: str,
+    ) -> DataFrame:
+        """Search only the sentences and companies without cached results for the same
+        document type, fiscal year, period window and search parameters, and cache the
+        results of each company and sentence."""
+        results = self._search_company_sentences(
+            cache, companies, sentences, document_limit, batch_size, frequency
+        )
+        return combine_company_results(companies, sentences, results)
+
+    def _search_company_sentences(
+        self,
+        cache: RetrievalCache | None,
+        companies: list,
+        sentences: list[str],
+        document_limit: int | Literal["auto"],
+        batch_size: int | Literal["auto"],
+        frequency: str,
+    ) -> dict[tuple[str, str], DataFrame | None]:
+        """Chunks of each company found by each sentence searched on its own, keyed by the
+        company ID and the sentence. With a cache, only the companies and sentences without
+        cached results are searched, and the results are cached."""
+        keys = {}
+        if cache is not None:
+            keys = {
+                (company.id, sentence): cache.compute_key(
+                    entity_id=company.id,
+                    document_type=str(self.document_type),
+                    fiscal_year=self.fiscal_year,
+                    period_window=(self.start_date, self.end_date, frequency),
+                    query_hash=compute_query_hash(
+                        sentence, document_limit, batch_size, self.rerank_threshold
+                    ),
+                )
+                for company in companies
+                for sentence in sentences
+            }
+        results = {
+            (company.id, sentence): cache.get(keys[company.id, sentence])
+            if cache is not None
+            else None
+            for company in companies
+            for sentence in sentences
+        }
+        # Companies to search for each sentence
+        missing = {}
+        for sentence in sentences:
+            missing_companies = [
+                company
+                for company in companies
+                if results[company.id, sentence] is None
+            ]
+            if missing_companies:
+                missing[sentence] = missing_companies
+        if cache is not None:
+            misses = sum(
+                len(missing_companies) for missing_companies in missing.values()
+            )
+            hits = len(results) - misses
+            retrieval_cache_stats.record_hit(hits)
+            retrieval_cache_stats.record_miss(misses)
+            self.notify_observers(
+                f"Retrieval cache: {hits} of {len(results)} company queries served from "
+                f"the cache ({hits / max(len(results), 1):.0%} hit ratio), searching "
+                f"{len({company.id for group in missing.values() for company in group})} "
+                f"companies for {len(missing)} of {len(sentences)} sentences."
+            )
+
+        if missing:
+            # Sentences are searched on their own to keep their results apart, in parallel
+            # as the search of several sentences runs a query per sentence
+            prefix = getattr(self._shard_context, "prefix", None)
+
+            def search_sentence(sentence: str) -> DataFrame:
+                self._shard_context.prefix = prefix
+                return self._search_companies(
+                    missing[sentence], [sentence], document_limit, batch_size, frequency
+                )
+
+            with ThreadPoolExecutor(
+                max_workers=min(settings.RETRIEVAL_MAX_WORKERS, len(missing)),
+                thread_name_prefix="retrieval",
+            ) as executor:
+                # Each search runs in a copy of the context of the workflow, which tracks
+                # the waits for the rate limits
+                futures = {
+                    sentence: executor.submit(
+                        copy_context().run, search_sentence, sentence
+                    )
+                    for sentence in missing
+                }
+                found = {
+                    sentence: future.result() for sentence, future in futures.items()
+                }
+            for sentence, df_sentence in found.items():
+                for company in missing[sentence]:
+                    if "entity_id" in df_sentence.columns:
+                        df_company = df_sentence[df_sentence["entity_id"] == company.id]
+                    else:
+                        df_company = df_sentence.iloc[0:0]
+                    results[company.id, sentence] = df_company
+                    if cache is not None:
+                        cache.set(keys[company.id, sentence], df_company)
+        return results
+
+    def label(self, theme_tree: SemanticTree, df_sentences: DataFrame) -> DataFrame:
+        if df_sentences.empty:
+            return DataFrame()
+        terminal_labels = theme_tree.get_terminal_labels()
+        labeler = ScreenerLabeler(self.llm_model)
+        self.notify_observers(
+            f"Labelling {len(df_sentences)} chunks with {len(terminal_labels)} themes"
+        )
+        df_labels = labeler.get_labels(
+            main_theme=self.main_theme,
+            labels=terminal_labels,
+            texts=df_sentences["masked_text"].tolist(),
+        )
+        self.notify_observers("Labelling completed")
+        self.notify_observers("Post-processing results")
+        df = merge(df_sentences, df_labels, left_index=True, right_index=True)
+        return labeler.post_process_dataframe(df)
+
+    def score(self, df_labeled: DataFrame) -> tuple[DataFrame, DataFrame]:
+        self.notify_observers(
+            f"Scoring thematic exposure for {df_labeled['Company'].nunique()} companies"
+        )
+        df_company = get_scored_df(
+            df_labeled,
+            index_columns=["Company", "Ticker", "Industry"],
+            pivot_column="Theme",
+        )
+        df_industry = get_scored_df(
+            df_labeled, index_columns=["Industry"], pivot_column="Theme"
+        )
+        self.notify_observers("Thematic exposure scored")
+        return df_company, df_industry
+
+    def motivate(
+        self,
+        df_labeled: DataFrame,
+        df_company: DataFrame,
+        word_range: tuple[int, int],
+    ) -> DataFrame:
+        self.notify_observers(f"Generating motivations for {len(df_company)} companies")
+        motivation_generator = Motivation(self.llm_model)
+        df_motivation = motivation_generator.generate_company_motivations(
+            df=df_labeled, theme_name=self.main_theme, word_range=word_range
+        )
+        self.notify_observers("Motivations generated")
+        return df_motivation
+
+
+# Columns identifying a chunk of a company in the search results
+CHUNK_COLUMNS = ("document_id", "sentence_id", "text")
+
+
+def drop_duplicate_chunks(df: DataFrame) -> DataFrame:
+    """Keep the first of the chunks of a company found by several sentences searched on
+    their own, which a search of all the sentences together returns once."""
+    subset = [column for column in CHUNK_COLUMNS if column in df.columns]
+    if not subset:
+        return df
+    return df.drop_duplicates(subset=["entity_id", *subset], ignore_index=True)
+
+
+def combine_company_results(
+    companies: list,
+    sentences: list[str],
+    results: dict[tuple[str, str], DataFrame | None],
+) -> DataFrame:
+    """Chunks found by the sentences for each company, from the results of each company and
+    sentence, in the order of the companies and then of the sentences."""
+    frames = []
+    for company in companies:
+        company_frames = [results[company.id, sentence] for sentence in sentences]
+        company_frames = [
+            df for df in company_frames if df is not None and not df.empty
+        ]
+        if company_frames:
+            frames.append(
+                drop_duplicate_chunks(concat(company_frames, ignore_index=True))
+            )
+    if not frames:
+        return DataFrame()
+    return concat(frames, ignore_index=True)
+
+
+def partition(companies: list, shards: int) -> list[list]:
+    """Split the companies in up to `shards` consecutive shards of balanced sizes."""
+    if not companies:
+        return []
+    size = math.ceil(len(companies) / max(shards, 1))
+    return [companies[i : i + size] for i in range(0, len(companies), size)]
@@ -0,0 +1,369 @@
+import asyncio
+import importlib
+import time
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+
+from bigdata_research_tools.llm.base import LLMEngine
+from bigdata_research_tools.search.search import SearchManager
+from sqlalchemy import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, update
+
+from bigdata_thematic_screener.api.sql_models import SQLRateLimitBucket
+from bigdata_thematic_screener.autotune import current_search_stats
+from bigdata_thematic_screener.settings import settings
+
+# Provider of the calls to the Bigdata API. LLM providers are named after the provider of
+# the model, e.g. `openai` for `openai::gpt-4o-mini`.
+BIGDATA_PROVIDER = "bigdata"
+
+# Module of research tools creating the search managers used to search the chunks
+SEARCH_MODULE = "bigdata_research_tools.search.search"
+
+# Module of research tools creating the LLM engine used to generate the theme trees. Its
+# responses are not cached, so that bypassing the report cache generates a new tree.
+TREE_MODULE = "bigdata_research_tools.tree"
+
+
+class TokenBucket:
+    """Budget of `per_minute` units per minute, refilled continuously up to `capacity`.
+
+    Calls reserve their units right away, running the bucket into debt if needed, and wait
+    until the debt is paid back by the refill. Concurrent calls are thus served in order at
+    the rate of the budget, instead of all polling for the next units and bursting over the
+    budget once they are available.
+    """
+
+    def __init__(self, per_minute: float, capacity: float | None = None):
+        self.rate = per_minute / 60
+        self.capacity = capacity if capacity is not None else per_minute
+        self._lock = Lock()
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` units from the bucket and return the seconds to wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+            self._tokens -= amount
+            return max(-self._tokens / self.rate, 0.0)
+
+
+class SharedTokenBucket(TokenBucket):
+    """Token bucket stored in the database, shared by the processes using it."""
+
+    def __init__(
+        self,
+        engine: Engine,
+        name: str,
+        per_minute: float,
+        capacity: float | None = None,
+    ):
+        super().__init__(per_minute, capacity)
+        self.engine = engine
+        self.name = name
+
+    def reserve(self, amount: float) -> float:
+        with Session(self.engine) as session:
+            while True:
+                now = time.time()
+                bucket = session.get(SQLRateLimitBucket, self.name)
+                if bucket is None:
+                    try:
+                        session.add(
+                            SQLRateLimitBucket(
+                                name=self.name,
+                                tokens=self.capacity - amount,
+                                updated_at=now,
+                            )
+                        )
+                        session.commit()
+                        return max((amount - self.capacity) / self.rate, 0.0)
+                    except IntegrityError:
+                        # Created by another process in the meantime
+                        session.rollback()
+                        continue
+
+                tokens = (
+                    min(
+                        self.capacity,
+                        bucket.tokens + max(now - bucket.updated_at, 0) * self.rate,
+                    )
+                    - amount
+                )
+                result = session.exec(
+                    update(SQLRateLimitBucket)
+                    .where(
+                        SQLRateLimitBucket.name == self.name,
+                        SQLRateLimitBucket.version == bucket.version,
+                    )
+                    .values(
+                        tokens=tokens,
+                        updated_at=max(now, bucket.updated_at),
+                        version=bucket.version + 1,
+                    )
+                )
+                session.commit()
+                if result.rowcount == 1:
+                    return max(-tokens / self.rate, 0.0)
+                # Updated by another process in the meantime
+                session.expire_all()
+
+
+class ProviderRateLimit:
+    """Requests per minute and tokens per minute budgets of a provider. Either one is not
+    enforced when None."""
+
+    def __init__(
+        self, requests: TokenBucket | None = None, tokens: TokenBucket | None = None
+    ):
+        self.requests = requests
+        self.tokens = tokens
+
+    def reserve(self, tokens: int = 0) -> float:
+        """Reserve a request using `tokens` tokens and return the seconds to wait before sending it."""
+        wait = 0.0
+        if self.requests is not None:
+            wait = self.requests.reserve(1)
+        if self.tokens is not None and tokens > 0:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return wait
+
+    def charge(self, tokens: int):
+        """Count tokens used by a request once it is answered, such as the tokens of the response."""
+        if self.tokens is not None and tokens > 0:
+            self.tokens.reserve(tokens)
+
+
+class RateLimits:
+    """Rate limits of each provider, created on first use.
+
+    Args:
+        llm_requests_per_minute: Requests per minute budget of each LLM provider.
+        llm_tokens_per_minute: Tokens per minute budget of each LLM provider.
+        bigdata_requests_per_minute: Requests per minute budget of the Bigdata API.
+        engine: Database storing the buckets, to share them with other processes. The
+            buckets are kept in memory when None.
+
+    Budgets set to 0 are not enforced.
+    """
+
+    def __init__(
+        self,
+        llm_requests_per_minute: int,
+        llm_tokens_per_minute: int,
+        bigdata_requests_per_minute: int,
+        engine: Engine | None = None,
+    ):
+        self.llm_requests_per_minute = llm_requests_per_minute
+        self.llm_tokens_per_minute = llm_tokens_per_minute
+        self.bigdata_requests_per_minute = bigdata_requests_per_minute
+        self.engine = engine
+        self._lock = Lock()
+        self._limits: dict[str, ProviderRateLimit] = {}
+
+    def _bucket(self, name: str, per_minute: int) -> TokenBucket | None:
+        if per_minute <= 0:
+            return None
+        if self.engine is not None:
+            return SharedTokenBucket(self.engine, name, per_minute)
+        return TokenBucket(per_minute)
+
+    def get(self, provider: str) -> ProviderRateLimit:
+        with self._lock:
+            if provider not in self._limits:
+                if provider == BIGDATA_PROVIDER:
+                    self._limits[provider] = ProviderRateLimit(
+                        requests=self._bucket(
+                            f"{provider}:requests", self.bigdata_requests_per_minute
+                        )
+                    )
+                else:
+                    self._limits[provider] = ProviderRateLimit(
+                        requests=self._bucket(
+                            f"{provider}:requests", self.llm_requests_per_minute
+                        ),
+                        tokens=self._bucket(
+                            f"{provider}:tokens", self.llm_tokens_per_minute
+                        ),
+                    )
+            return self._limits[provider]
+
+
+class ThrottleStats:
+    """Time the calls made on behalf of a workflow waited for the rate limits, per provider."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.waits: dict[str, float] = defaultdict(float)
+        self.calls: dict[str, int] = defaultdict(int)
+
+    def record(self, provider: str, seconds: float):
+        with self._lock:
+            self.waits[provider] += seconds
+            self.calls[provider] += 1
+
+    @property
+    def total_seconds(self) -> float:
+        with self._lock:
+            return sum(self.waits.values())
+
+    def format(self) -> str:
+        """Summary of the waits for the workflow logs."""
+        with self._lock:
+            providers = ", ".join(
+                f"{provider}: {seconds:.1f}s over {self.calls[provider]} calls"
+                for provider, seconds in sorted(self.waits.items())
+            )
+            total = sum(self.waits.values())
+        return f"Rate limits delayed the calls of this workflow by {total:.1f}s ({providers})."
+
+
+# Installed with `install_rate_limits`
+rate_limits: RateLimits | None = None
+
+# Waits of the workflow running in the current context, see `track_throttling`
+current_throttle_stats: ContextVar[ThrottleStats | None] = ContextVar(
+    "current_throttle_stats", default=None
+)
+
+
+@contextmanager
+def track_throttling() -> Iterator[ThrottleStats]:
+    """Count the waits of the calls made within the block, and by the LLM engines and
+    search managers created within it."""
+    stats = ThrottleStats()
+    token = current_throttle_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_throttle_stats.reset(token)
+
+
+def estimate_tokens(content: str | list[dict[str, str]]) -> int:
+    """Rough number of tokens of a text or a chat history, at 4 characters per token."""
+    if isinstance(content, list):
+        content = "".join(message.get("content", "") for message in content)
+    return len(content) // 4 + 1
+
+
+def _reserve(provider: str, tokens: int, stats: ThrottleStats | None) -> float:
+    if rate_limits is None:
+        return 0.0
+    wait = rate_limits.get(provider).reserve(tokens)
+    if stats is not None:
+        stats.record(provider, wait)
+    return wait
+
+
+def throttle(provider: str, tokens: int = 0, stats: ThrottleStats | None = None):
+    """Wait until a request to `provider` using `tokens` tokens fits in its rate limits.
+    Waits are counted in `stats`, or in the stats of the current context."""
+    wait = _reserve(provider, tokens, stats or current_throttle_stats.get())
+    if wait > 0:
+        time.sleep(wait)
+
+
+async def athrottle(provider: str, tokens: int = 0, stats: ThrottleStats | None = None):
+    """Same as `throttle`, without blocking the event loop."""
+    wait = _reserve(provider, tokens, stats or current_throttle_stats.get())
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+
+def charge(provider: str, tokens: int):
+    """Count the tokens of a response in the rate limits of `provider`."""
+    if rate_limits is not None:
+        rate_limits.get(provider).charge(tokens)
+
+
+class RateLimitedResponses:
+    """Mixin waiting for the rate limits of the LLM provider before each `get_response` call.
+    Waits are counted in the stats of the context the engine was created in, as the calls
+    can be made from other threads."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.throttle_stats = current_throttle_stats.get()
+
+    def get_response(self, chat_history: list[dict[str, str]], **kwargs) -> str:
+        provider = str(getattr(self, "provider_name", "llm"))
+        throttle(provider, estimate_tokens(chat_history), self.throttle_stats)
+        response = super().get_response(chat_history, **kwargs)  # ty: ignore[unresolved-attribute]
+        if isinstance(response, str):
+            charge(provider, estimate_tokens(response))
+        return response
+
+
+class AsyncRateLimitedResponses:
+    """Mixin waiting for the rate limits of the LLM provider before each async `get_response` call."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.throttle_stats = current_throttle_stats.get()
+
+    async def get_response(self, chat_history: list[dict[str, str]], **kwargs) -> str:
+        provider = str(getattr(self, "provider_name", "llm"))
+        await athrottle(provider, estimate_tokens(chat_history), self.throttle_stats)
+        response = await super().get_response(chat_history, **kwargs)  # ty: ignore[unresolved-attribute]
+        if isinstance(response, str):
+            charge(provider, estimate_tokens(response))
+        return response
+
+
+class RateLimitedLLMEngine(RateLimitedResponses, LLMEngine):
+    pass
+
+
+class RateLimitedSearchManager(SearchManager):
+    """Search manager of research tools waiting for the rate limit of the Bigdata API
+    before each search, on top of its own limit. The latency of each search, and whether it
+    failed, is recorded for the tuning of the batch size."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.throttle_stats = current_throttle_stats.get()
+        self.search_stats = current_search_stats.get()
+
+    def _search(self, *args, **kwargs):
+        throttle(BIGDATA_PROVIDER, stats=self.throttle_stats)
+        start = time.monotonic()
+        results = super()._search(*args, **kwargs)
+        if self.search_stats is not None:
+            # Research tools log search errors and return None
+            self.search_stats.record(time.monotonic() - start, failed=results is None)
+        return results
+
+
+def install_rate_limits(limits: RateLimits | None):
+    """Apply `limits` to the LLM engines installed by `install_llm_response_cache`, to the
+    generation of the theme trees and to the searches of research tools. Passing None
+    disables them."""
+    global rate_limits
+    rate_limits = limits
+    module = importlib.import_module(TREE_MODULE)
+    if hasattr(module, "LLMEngine"):
+        module.LLMEngine = RateLimitedLLMEngine  # ty: ignore[invalid-assignment]
+    module = importlib.import_module(SEARCH_MODULE)
+    module.SearchManager = RateLimitedSearchManager  # ty: ignore[invalid-assignment]
+
+
+def install_configured_rate_limits(engine: Engine | None = None):
+    """Install the rate limits configured in the settings. The buckets are shared through
+    the database of `engine` when `RATE_LIMIT_SHARED` is set."""
+    install_rate_limits(
+        RateLimits(
+            llm_requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+            llm_tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+            bigdata_requests_per_minute=settings.BIGDATA_REQUESTS_PER_MINUTE,
+            engine=engine if settings.RATE_LIMIT_SHARED else None,
+        )
+    )
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+from bigdata_client import Bigdata
+from bigdata_client.models.entities import Company
+from pydantic import BaseModel
+
+from bigdata_thematic_screener import logger
+from bigdata_thematic_screener.cache import DiskCache, TTLCache, get_cache_stats
+from bigdata_thematic_screener.rate_limit import BIGDATA_PROVIDER, throttle
+from bigdata_thematic_screener.settings import settings
+
+
+class ResolutionCache:
+    """Deduplicated companies resolved from watchlists and lists of entity IDs.
+
+    Companies are kept in memory and, when `disk_path` is set, in a SQLite file, so a
+    restarted process does not need to resolve the same watchlists again.
+    """
+
+    def __init__(
+        self, max_entries: int, ttl_seconds: float, disk_path: str | None = None
+    ):
+        self.memory = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.disk = DiskCache(disk_path, ttl_seconds=ttl_seconds) if disk_path else None
+
+    def get(self, key: str) -> list[Company] | None:
+        companies = self.memory.get(key)
+        if companies is None and self.disk is not None:
+            data = self.disk.get(key)
+            if data is not None:
+                companies = [Company(**company) for company in json.loads(data)]
+                self.memory.set(key, companies)
+        return list(companies) if companies is not None else None
+
+    def set(self, key: str, companies: list[Company]):
+        self.memory.set(key, list(companies))
+        if self.disk is not None:
+            data = json.dumps(
+                [company.model_dump(mode="json") for company in companies]
+            )
+            self.disk.set(key, data.encode())
+
+    def clear(self):
+        self.memory.clear()
+
+
+class CompanyResolution(BaseModel):
+    companies: list[Company]
+    cache_hit: bool
+    elapsed_seconds: float
+
+
+resolution_cache_stats = get_cache_stats("entity_resolution")
+
+resolution_cache = ResolutionCache(
+    max_entries=settings.RESOLUTION_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.RESOLUTION_CACHE_TTL_SECONDS,
+    disk_path=settings.RESOLUTION_CACHE_PATH,
+)
+
+
+def resolution_cache_key(companies: list[str] | str) -> str:
+    """Watchlists are cached by ID. Lists of entity IDs are cached by the hash of the
+    sorted unique IDs, so the same universe given in a different order is a hit."""
+    if isinstance(companies, str):
+        return f"watchlist:{companies}"
+    entity_ids = "\n".join(sorted(set(companies)))
+    return f"entities:{hashlib.sha256(entity_ids.encode()).hexdigest()}"
+
+
+def resolve_companies(
+    companies: list[str] | str,
+    bigdata: Bigdata,
+    cache: ResolutionCache | None = resolution_cache,
+) -> CompanyResolution:
+    """Resolve the companies to analyze, from the cache when possible."""
+    start = time.perf_counter()
+    key = None
+    if cache is not None and isinstance(companies, (list, str)):
+        key = resolution_cache_key(companies)
+        cached = cache.get(key)
+        if cached is not None:
+            resolution_cache_stats.record_hit()
+            return CompanyResolution(
+                companies=cached,
+                cache_hit=True,
+                elapsed_seconds=time.perf_counter() - start,
+            )
+        resolution_cache_stats.record_miss()
+
+    resolved = _fetch_companies(companies, bigdata)
+    if cache is not None and key is not None:
+        cache.set(key, resolved)
+    return CompanyResolution(
+        companies=resolved,
+        cache_hit=False,
+        elapsed_seconds=time.perf_counter() - start,
+    )
+
+
+def prepare_companies(
+    companies: list[str] | str,
+    bigdata: Bigdata,
+    cache: ResolutionCache | None = resolution_cache,
+) -> list[Company]:
+    """Prepare the list of companies for analysis. Ensure at least one of the forms of providing
+    the companies is present and ensures all elements are companies."""
+    return resolve_companies(companies, bigdata, cache).companies
+
+
+def format_resolution_stats(resolution: CompanyResolution) -> str:
+    """Summary of a resolution for the workflow logs."""
+    return (
+        f"Resolved {len(resolution.companies)} companies in "
+        f"{resolution.elapsed_seconds * 1000:.0f} ms "
+        f"({'cache hit' if resolution.cache_hit else 'cache miss'}). "
+        f"Resolution cache: {resolution_cache_stats.hits} hits, "
+        f"{resolution_cache_stats.misses} misses "
+        f"({resolution_cache_stats.hit_ratio:.0%} hit ratio)."
+    )
+
+
+def _fetch_companies(companies: list[str] | str, bigdata: Bigdata) -> list[Company]:
+    if isinstance(companies, list):
+        entity_ids = companies
+    elif isinstance(companies, str):
+        throttle(BIGDATA_PROVIDER)
+        entity_ids = bigdata.watchlists.get(companies).items
+    else:
+        raise ValueError(
+            "Companies must be either a list of RP entity IDs or a string representing a watchlist ID."
+        )
+    entities = get_entities_in_chunks(bigdata, entity_ids)
+
+    # Ensure there is entities, there is no duplicates and all entities are companies
+    if len(entities) == 0:
+        raise ValueError("No entities found in the provided universe or watchlist.")
+
+    companies = [
+        Company(**e.model_dump())  # ty: ignore[missing-argument]
+        for e in entities
+        if e is not None and e.entity_type == "COMP"
+    ]
+
+    dedupped_companies = {c.id: c for c in companies}
+
+    return list(dedupped_companies.values())
+
+
+def get_entities_in_chunks(
+    bigdata: Bigdata,
+    entity_ids: list[str],
+    chunk_size: int = settings.RESOLUTION_CHUNK_SIZE,
+    max_workers: int = settings.RESOLUTION_MAX_WORKERS,
+    max_retries: int = settings.RESOLUTION_CHUNK_RETRIES,
+) -> list:
+    """Get the entities of a large list of IDs from the knowledge graph, splitting it in chunks
+    of `chunk_size` IDs requested concurrently. Entities are returned in the order of the IDs,
+    whatever the order the chunks complete in."""
+    # Repeated IDs would only be resolved again
+    entity_ids = list(dict.fromkeys(entity_ids))
+    chunks = [
+        entity_ids[i : i + chunk_size] for i in range(0, len(entity_ids), chunk_size)
+    ]
+    if len(chunks) <= 1:
+        throttle(BIGDATA_PROVIDER)
+        return bigdata.knowledge_graph.get_entities(entity_ids)
+
+    def get_entities(chunk: list[str]) -> list:
+        throttle(BIGDATA_PROVIDER)
+        return bigdata.knowledge_graph.get_entities(chunk)
+
+    def get_chunk(chunk: list[str]) -> list:
+        return _retry(lambda: get_entities(chunk), max_retries=max_retries)
+
+    with ThreadPoolExecutor(
+        max_workers=min(max_workers, len(chunks)),
+        thread_name_prefix="entity-resolution",
+    ) as executor:
+        # Chunks are resolved in copies of the context of the workflow, which tracks the
+        # waits for the rate limits
+        futures = [
+            executor.submit(copy_context().run, get_chunk, chunk) for chunk in chunks
+        ]
+        results = [future.result() for future in futures]
+    return [entity for result in results for entity in result]
+
+
+def _retry(function, max_retries: int, backoff_seconds: float = 0.5):
+    for attempt in range(max_retries + 1):
+        try:
+            return function()
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            logger.warning(
+                "Entity resolution chunk failed, retrying",
+                attempt=attempt + 1,
+                error=str(e),
+            )
+            time.sleep(backoff_seconds * 2**attempt)
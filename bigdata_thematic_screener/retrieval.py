@@ -0,0 +1,70 @@
+import hashlib
+import json
+import pickle
+import zlib
+from functools import cache
+
+import pandas as pd
+
+from bigdata_thematic_screener.cache import DiskCache, get_cache_stats
+from bigdata_thematic_screener.settings import settings
+
+retrieval_cache_stats = get_cache_stats("retrieval")
+
+
+class RetrievalCache:
+    """Search results of a single company for a single query sentence, document type, fiscal
+    year and period window, so workflows screening the same universe and dates only search
+    for the sentences they do not share with previous ones. Results are stored compressed
+    and expire after `ttl_seconds`."""
+
+    def __init__(self, path: str, ttl_seconds: float):
+        self.store = DiskCache(path, ttl_seconds=ttl_seconds)
+
+    @staticmethod
+    def compute_key(
+        entity_id: str,
+        document_type: str,
+        fiscal_year: int | list[int] | None,
+        period_window: tuple[str, str, str],
+        query_hash: str,
+    ) -> str:
+        if isinstance(fiscal_year, list):
+            fiscal_year = sorted(set(fiscal_year))
+        key = [entity_id, document_type, fiscal_year, list(period_window), query_hash]
+        return hashlib.sha256(json.dumps(key, default=str).encode()).hexdigest()
+
+    def get(self, key: str) -> pd.DataFrame | None:
+        data = self.store.get(key)
+        if data is None:
+            return None
+        return pickle.loads(zlib.decompress(data))
+
+    def set(self, key: str, df: pd.DataFrame):
+        self.store.set(
+            key, zlib.compress(pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL))
+        )
+
+
+def compute_query_hash(
+    sentence: str,
+    document_limit: int | str,
+    batch_size: int | str,
+    rerank_threshold: float | None,
+) -> str:
+    """Hash of the query built from a sentence, with the search parameters changing its
+    results: the document limit and rerank threshold, and the batch size, as entities
+    searched together share the documents of a query."""
+    query = [sentence, document_limit, batch_size, rerank_threshold]
+    return hashlib.sha256(json.dumps(query).encode()).hexdigest()
+
+
+@cache
+def get_retrieval_cache() -> RetrievalCache | None:
+    """Retrieval cache configured in the settings, created on first use."""
+    if not settings.RETRIEVAL_CACHE_PATH:
+        return None
+    return RetrievalCache(
+        settings.RETRIEVAL_CACHE_PATH,
+        ttl_seconds=settings.RETRIEVAL_CACHE_TTL_SECONDS,
+    )
@@ -1,28 +1,41 @@
-import math
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from importlib.metadata import version
 from uuid import UUID
 
 import pandas as pd
 from bigdata_client import Bigdata
-from bigdata_client.models.entities import Company
 from bigdata_research_tools.tree import SemanticTree
 from bigdata_research_tools.utils.observer import OberserverNotification, Observer
-from bigdata_research_tools.workflows.thematic_screener import ThematicScreener
 
 from bigdata_thematic_screener.api.models import ThematicScreenRequest, WorkflowStatus
 from bigdata_thematic_screener.api.storage import StorageManager
+from bigdata_thematic_screener.cache import get_cache_stats
+from bigdata_thematic_screener.checkpoints import (
+    TAXONOMY_STAGE,
+    get_workflow_checkpoints,
+)
 from bigdata_thematic_screener.models import (
     CompanyScoring,
     LabeledChunk,
     LabeledContent,
+    SearchParameters,
     ThematicScreenerResponse,
     ThemeScore,
     ThemeScoring,
     ThemeTaxonomy,
 )
+from bigdata_thematic_screener.pipeline import ThematicScreenerPipeline
+from bigdata_thematic_screener.rate_limit import current_throttle_stats
+from bigdata_thematic_screener.resolution import (
+    format_resolution_stats,
+    resolve_companies,
+)
+from bigdata_thematic_screener.retrieval import get_retrieval_cache
+from bigdata_thematic_screener.settings import settings
 from bigdata_thematic_screener.traces import TraceEventName, send_trace
 
+taxonomy_cache_stats = get_cache_stats("taxonomies")
+
 
 class WorkflowObserver(Observer):
     def __init__(self, request_id: UUID, storage_manager: StorageManager):
@@ -36,36 +49,27 @@ class WorkflowObserver(Observer):
         )
 
 
-def prepare_companies(
-    companies: list[str] | str,
-    bigdata: Bigdata,
-) -> list[Company]:
-    """Prepare the list of companies for analysis. Ensure at least one of the forms of providing
-    the companies is present and ensures all elements are companies."""
-    if isinstance(companies, list):
-        entities = bigdata.knowledge_graph.get_entities(companies)
-    elif isinstance(companies, str):
-        entities = bigdata.knowledge_graph.get_entities(
-            bigdata.watchlists.get(companies).items
-        )
-    else:
-        raise ValueError(
-            "Companies must be either a list of RP entity IDs or a string representing a watchlist ID."
-        )
-
-    # Ensure there is entities, there is no duplicates and all entities are companies
-    if len(entities) == 0:
-        raise ValueError("No entities found in the provided universe or watchlist.")
-
-    companies = [
-        Company(**e.model_dump())  # ty: ignore[missing-argument]
-        for e in entities
-        if e is not None and e.entity_type == "COMP"
-    ]
+# Columns of the labeled chunks in the workflow dataframes, by field of `LabeledChunk`
+LABELED_CHUNK_COLUMNS = {
+    "time_period": "Time Period",
+    "date": "Date",
+    "company": "Company",
+    "sector": "Sector",
+    "industry": "Industry",
+    "country": "Country",
+    "ticker": "Ticker",
+    "document_id": "Document ID",
+    "headline": "Headline",
+    "quote": "Quote",
+    "motivation": "Motivation",
+    "theme": "Theme",
+}
 
-    dedupped_companies = {c.id: c for c in companies}
+# Fields of `LabeledChunk` that can be None
+NULLABLE_LABELED_CHUNK_FIELDS = {"ticker"}
 
-    return list(dedupped_companies.values())
+# Columns of the scored companies that are not theme scores
+COMPANY_SCORING_COLUMNS = {"Company", "Ticker", "Industry", "Composite Score"}
 
 
 def build_response(
@@ -73,65 +77,206 @@ def build_response(
     df_motivation: pd.DataFrame,
     df_labeled: pd.DataFrame,
     theme_tree: SemanticTree,
+    search_parameters: SearchParameters | None = None,
 ) -> ThematicScreenerResponse:
     """
     Build the response for the output of the thematic screener workflow.
     """
+    return ThematicScreenerResponse(
+        theme_taxonomy=ThemeTaxonomy(**theme_tree._to_dict()),  # ty: ignore[missing-argument]
+        theme_scoring=theme_scoring_from_df(df_company, df_motivation),
+        search_parameters=search_parameters,
+        content=labeled_content_from_df(df_labeled),
+    )
+
+
+def theme_scoring_from_df(
+    df_company: pd.DataFrame, df_motivation: pd.DataFrame
+) -> ThemeScoring:
+    """Scores of the companies, joined with the first motivation of each company."""
+    if df_company.empty:
+        return ThemeScoring(root={})
+    motivations = df_motivation.drop_duplicates(subset="Company").set_index("Company")[
+        "Motivation"
+    ]
+    company_motivations = df_company["Company"].map(motivations).tolist()
+    columns = {column: df_company[column].tolist() for column in df_company.columns}
+    # Other columns hold the scores of each theme. Columns with missing scores hold
+    # floats, which are not scores.
+    theme_columns = {
+        column: values
+        for column, values in columns.items()
+        if column not in COMPANY_SCORING_COLUMNS
+    }
+
     theme_scoring = {}
-    for record in df_company.to_dict(orient="records"):
-        company = record.pop("Company")
-        ticker = record.pop("Ticker")
-        industry = record.pop("Industry")
-        motivation = df_motivation.loc[df_motivation["Company"] == company][
-            "Motivation"
-        ].values[0]
-        composite_score = record.pop("Composite Score")
+    for index, company in enumerate(columns["Company"]):
+        motivation = company_motivations[index]
         theme_scoring[company] = CompanyScoring(
-            ticker=ticker,
-            industry=industry,
-            motivation=motivation,
-            composite_score=composite_score,
+            ticker=columns["Ticker"][index],
+            industry=columns["Industry"][index],
+            motivation=motivation if isinstance(motivation, str) else None,
+            composite_score=columns["Composite Score"][index],
             themes=ThemeScore(
                 root={
-                    k: v
-                    for k, v in record.items()
-                    if isinstance(v, int) and not math.isnan(v)
+                    theme: values[index]
+                    for theme, values in theme_columns.items()
+                    if isinstance(values[index], int)
                 }
             ),
         )
+    return ThemeScoring(root=theme_scoring)
 
-    # Return results
-    return ThematicScreenerResponse(
-        theme_taxonomy=ThemeTaxonomy(**theme_tree._to_dict()),  # ty: ignore[missing-argument]
-        theme_scoring=ThemeScoring(root=theme_scoring),
-        content=LabeledContent(
-            root=[
-                LabeledChunk(
-                    time_period=record["Time Period"],
-                    date=record["Date"],
-                    company=record["Company"],
-                    sector=record["Sector"],
-                    industry=record["Industry"],
-                    country=record["Country"],
-                    ticker=record["Ticker"],
-                    document_id=record["Document ID"],
-                    headline=record["Headline"],
-                    quote=record["Quote"],
-                    motivation=record["Motivation"],
-                    theme=record["Theme"],
-                )
-                for record in df_labeled.to_dict(orient="records")
-            ]
-        ),
+
+def labeled_content_from_df(df_labeled: pd.DataFrame) -> LabeledContent:
+    """Labeled chunks of the workflow dataframes, as stored in the report.
+
+    The chunks are built column by column. When every column holds the type of its field,
+    which is checked once per column, the chunks are trusted and constructed without
+    validating them one by one. Otherwise they are validated, raising on invalid values.
+    """
+    if df_labeled.empty:
+        return LabeledContent(root=[])
+    fields = list(LABELED_CHUNK_COLUMNS)
+    values = [
+        column_values(
+            df_labeled[column], nullable=field in NULLABLE_LABELED_CHUNK_FIELDS
+        )
+        for field, column in LABELED_CHUNK_COLUMNS.items()
+    ]
+    if not has_labeled_chunk_types(df_labeled):
+        return LabeledContent(
+            root=[LabeledChunk(**dict(zip(fields, chunk))) for chunk in zip(*values)]
+        )
+    fields_set = set(fields)
+    return LabeledContent.model_construct(
+        root=[
+            LabeledChunk.model_construct(
+                _fields_set=fields_set, **dict(zip(fields, chunk))
+            )
+            for chunk in zip(*values)
+        ]
+    )
+
+
+def column_values(series: pd.Series, nullable: bool = False) -> list:
+    """Values of a column as Python objects, with missing values as None if `nullable`."""
+    if nullable and series.hasnans:
+        return series.astype(object).where(series.notna(), None).tolist()
+    return series.tolist()
+
+
+def has_labeled_chunk_types(df_labeled: pd.DataFrame) -> bool:
+    """Whether every column of the labeled chunks holds strings, or None for the nullable
+    fields."""
+    for field, column in LABELED_CHUNK_COLUMNS.items():
+        series = df_labeled[column]
+        if field in NULLABLE_LABELED_CHUNK_FIELDS:
+            series = series[series.notna()]
+        elif series.isna().any():
+            return False
+        if not series.empty and not pd.api.types.is_string_dtype(series):
+            return False
+    return True
+
+
+def labeled_content_to_df(content: LabeledContent | None) -> pd.DataFrame:
+    """Labeled chunks of a stored report, as returned by the labeling stage."""
+    return pd.DataFrame(
+        [chunk.model_dump() for chunk in (content.root if content else [])],
+        columns=list(LABELED_CHUNK_COLUMNS),
+    ).rename(columns=LABELED_CHUNK_COLUMNS)
+
+
+def motivations_to_df(theme_scoring: ThemeScoring) -> pd.DataFrame:
+    """Motivations of the companies of a stored report, as returned by the motivation stage."""
+    return pd.DataFrame(
+        [
+            {"Company": company, "Motivation": scoring.motivation}
+            for company, scoring in theme_scoring.root.items()
+        ],
+        columns=["Company", "Motivation"],
+    )
+
+
+def get_cached_theme_tree(
+    request: ThematicScreenRequest, storage_manager: StorageManager
+) -> SemanticTree | None:
+    """Theme tree generated by a previous workflow for the same theme, focus and LLM model."""
+    if not settings.TAXONOMY_CACHE_ENABLED:
+        return None
+    tree = storage_manager.get_cached_taxonomy(
+        theme=request.theme,
+        focus=request.focus,
+        llm_model=request.llm_model,
+        version=settings.TAXONOMY_CACHE_VERSION,
+    )
+    if tree is None:
+        taxonomy_cache_stats.record_miss()
+        return None
+    taxonomy_cache_stats.record_hit()
+    return SemanticTree.from_dict(tree)
+
+
+def send_report_trace(
+    bigdata: Bigdata, workflow_execution_start: datetime, watchlist_length: int
+):
+    """Send the trace of a generated report."""
+    workflow_execution_end = datetime.now()
+    send_trace(
+        bigdata,
+        event_name=TraceEventName.THEMATIC_SCREENER_REPORT_GENERATED,
+        trace={
+            "bigdataClientVersion": version("bigdata-client"),
+            "workflowStartDate": workflow_execution_start.isoformat(timespec="seconds"),
+            "workflowEndDate": workflow_execution_end.isoformat(timespec="seconds"),
+            "watchlistLength": watchlist_length,
+        },
     )
 
 
+def log_throttling(request_id: UUID, storage_manager: StorageManager):
+    """Log the time the calls of the workflow waited for the rate limits, if any."""
+    throttle_stats = current_throttle_stats.get()
+    if throttle_stats is not None and throttle_stats.total_seconds > 0:
+        storage_manager.log_message(
+            request_id=request_id, message=throttle_stats.format()
+        )
+
+
+def save_generated_theme_tree(
+    request: ThematicScreenRequest,
+    theme_tree: SemanticTree,
+    storage_manager: StorageManager,
+):
+    """Cache a theme tree generated by a workflow for the following ones."""
+    if settings.TAXONOMY_CACHE_ENABLED:
+        storage_manager.save_taxonomy(
+            theme=request.theme,
+            focus=request.focus,
+            llm_model=request.llm_model,
+            version=settings.TAXONOMY_CACHE_VERSION,
+            tree=theme_tree._to_dict(),
+        )
+
+
 def process_request(
     request: ThematicScreenRequest,
     bigdata: Bigdata | None,
     request_id: UUID,
     storage_manager: StorageManager,
+    extends_id: UUID | None = None,
 ):
+    """Run the workflow of a request and store its report.
+
+    When `extends_id` is given, the report of that workflow is extended to the later end
+    date of the request: only the periods after its end date are searched and labeled, and
+    the companies are scored on its labeled chunks together with the new ones.
+
+    The outputs of the completed stages are checkpointed, so a retried workflow resumes
+    from its last completed stage.
+    """
+    checkpoints = get_workflow_checkpoints(request_id)
     try:
         storage_manager.update_status(request_id, WorkflowStatus.IN_PROGRESS)
         if not bigdata:
@@ -143,14 +288,66 @@ def process_request(
 
         workflow_execution_start = datetime.now()
 
-        resolved_companies = prepare_companies(request.companies, bigdata)
+        resolved_companies = (
+            checkpoints.load_companies() if checkpoints is not None else None
+        )
+        if resolved_companies is not None:
+            storage_manager.log_message(
+                request_id=request_id,
+                message=f"Resuming with the {len(resolved_companies)} companies resolved by a previous attempt",
+            )
+        else:
+            resolution = resolve_companies(request.companies, bigdata)
+            storage_manager.log_message(
+                request_id=request_id, message=format_resolution_stats(resolution)
+            )
+            resolved_companies = resolution.companies
+            if checkpoints is not None:
+                checkpoints.save_companies(resolved_companies)
+
+        # Theme tree used by a previous attempt of the workflow. Its checkpointed chunks and
+        # labels were computed with it, so it is used over the cached one.
+        checkpoint_tree = None
+        if checkpoints is not None:
+            tree = checkpoints.load_json(TAXONOMY_STAGE)
+            if tree is not None:
+                checkpoint_tree = SemanticTree.from_dict(tree)
 
-        thematic_screener = ThematicScreener(
+        start_date = request.start_date
+        previous_report = None
+        cached_theme_tree = None
+        if extends_id is not None:
+            previous_request = storage_manager.get_request(extends_id)
+            previous_report = storage_manager.get_completed_report(extends_id)
+            if previous_request is None or previous_report is None:
+                raise ValueError(f"Report {extends_id} to extend not found.")
+            start_date = (
+                date.fromisoformat(previous_request.end_date[:10]) + timedelta(days=1)
+            ).isoformat()
+            storage_manager.log_message(
+                request_id=request_id,
+                message=f"Extending report {extends_id}, screening from {start_date} to {request.end_date}",
+            )
+            cached_theme_tree = SemanticTree.from_dict(
+                previous_report.theme_taxonomy.model_dump()
+            )
+        elif checkpoint_tree is None:
+            cached_theme_tree = get_cached_theme_tree(request, storage_manager)
+
+        thematic_screener = ThematicScreenerPipeline(
+            bigdata=bigdata,
+            theme_tree=checkpoint_tree or cached_theme_tree,
+            retrieval_cache=get_retrieval_cache(),
+            shards=settings.SCREENER_SHARDS
+            if len(resolved_companies) >= settings.SCREENER_SHARD_MIN_COMPANIES
+            else 1,
+            shard_retries=settings.SCREENER_SHARD_RETRIES,
+            checkpoints=checkpoints,
             llm_model=request.llm_model,
             main_theme=request.theme,
             focus=request.focus,
             companies=resolved_companies,
-            start_date=request.start_date,
+            start_date=start_date,
             end_date=request.end_date,
             document_type=request.document_type,
             fiscal_year=request.fiscal_year,
@@ -161,47 +358,175 @@ def process_request(
             WorkflowObserver(request_id=request_id, storage_manager=storage_manager)
         )
 
-        results = thematic_screener.screen_companies(
-            document_limit=request.document_limit,
-            batch_size=request.batch_size,
-            frequency=request.frequency.value,
-        )
+        if previous_report is not None:
+            results = thematic_screener.extend(
+                df_labeled_previous=labeled_content_to_df(previous_report.content),
+                df_motivation_previous=motivations_to_df(previous_report.theme_scoring),
+                document_limit=request.document_limit,
+                batch_size=request.batch_size,
+                frequency=request.frequency.value,
+            )
+        else:
+            results = thematic_screener.screen_companies(
+                document_limit=request.document_limit,
+                batch_size=request.batch_size,
+                frequency=request.frequency.value,
+            )
         df_labeled = results["df_labeled"]
         df_company = results["df_company"]
         df_motivation = results["df_motivation"]
         theme_tree = results["theme_tree"]
 
-        workflow_execution_end = datetime.now()
+        # Trees generated by this workflow, or by a previous attempt, are cached
+        if cached_theme_tree is None:
+            save_generated_theme_tree(request, theme_tree, storage_manager)
 
-        # Send log
-        send_trace(
-            bigdata,
-            event_name=TraceEventName.THEMATIC_SCREENER_REPORT_GENERATED,
-            trace={
-                "bigdataClientVersion": version("bigdata-client"),
-                "workflowStartDate": workflow_execution_start.isoformat(
-                    timespec="seconds"
-                ),
-                "workflowEndDate": workflow_execution_end.isoformat(timespec="seconds"),
-                "watchlistLength": len(resolved_companies),
-            },
-        )
+        send_report_trace(bigdata, workflow_execution_start, len(resolved_companies))
 
         response = build_response(
             df_company=df_company,
             df_motivation=df_motivation,
             df_labeled=df_labeled,
             theme_tree=theme_tree,
+            search_parameters=thematic_screener.get_search_parameters(
+                request.batch_size, request.document_limit
+            ),
         )
 
+        log_throttling(request_id, storage_manager)
         storage_manager.mark_workflow_as_completed(request_id, request, response)
+        if checkpoints is not None:
+            checkpoints.clear()
 
         return response
 
     except Exception as e:
+        log_throttling(request_id, storage_manager)
+        storage_manager.log_message(
+            request_id=request_id,
+            message=f"Workflow failed with error: {str(e)}",
+        )
+        storage_manager.update_status(request_id, WorkflowStatus.FAILED)
+        raise e
+
+
+def process_batch(
+    workflows: list[tuple[UUID, ThematicScreenRequest]],
+    bigdata: Bigdata | None,
+    storage_manager: StorageManager,
+):
+    """Run the workflows of a batch of themes on the same companies and store their reports.
+
+    The companies are resolved once, and each query of the theme trees is searched once,
+    even when several themes share it. Each theme then labels the chunks found by its own
+    queries, the same as a screen of the theme alone, and scores and motivates the
+    companies on its own, so a theme that fails does not fail the others.
+    """
+    request_ids = [request_id for request_id, _ in workflows]
+
+    def fail(request_id: UUID, e: Exception):
+        log_throttling(request_id, storage_manager)
         storage_manager.log_message(
             request_id=request_id,
             message=f"Workflow failed with error: {str(e)}",
         )
         storage_manager.update_status(request_id, WorkflowStatus.FAILED)
+
+    try:
+        for request_id in request_ids:
+            storage_manager.update_status(request_id, WorkflowStatus.IN_PROGRESS)
+        if not bigdata:
+            raise ValueError("Bigdata client is not initialized.")
+
+        workflow_execution_start = datetime.now()
+
+        # Every theme of a batch shares the same companies and search parameters
+        request = workflows[0][1]
+        resolution = resolve_companies(request.companies, bigdata)
+        for request_id in request_ids:
+            storage_manager.log_message(
+                request_id=request_id, message=format_resolution_stats(resolution)
+            )
+        resolved_companies = resolution.companies
+
+        def create_screener(
+            theme_request: ThematicScreenRequest, theme_tree: SemanticTree | None
+        ) -> ThematicScreenerPipeline:
+            return ThematicScreenerPipeline(
+                bigdata=bigdata,
+                theme_tree=theme_tree,
+                retrieval_cache=get_retrieval_cache(),
+                llm_model=theme_request.llm_model,
+                main_theme=theme_request.theme,
+                focus=theme_request.focus,
+                companies=resolved_companies,
+                start_date=theme_request.start_date,
+                end_date=theme_request.end_date,
+                document_type=theme_request.document_type,
+                fiscal_year=theme_request.fiscal_year,
+                rerank_threshold=theme_request.rerank_threshold,
+            )
+
+        screeners = []
+        observers = []
+        for request_id, theme_request in workflows:
+            # Research tools marks it as optional, but expects an empty screen if not available
+            if theme_request.focus is None:
+                theme_request.focus = ""
+            cached_theme_tree = get_cached_theme_tree(theme_request, storage_manager)
+            thematic_screener = create_screener(theme_request, cached_theme_tree)
+            observer = WorkflowObserver(
+                request_id=request_id, storage_manager=storage_manager
+            )
+            thematic_screener.register_observer(observer)
+            observers.append(observer)
+            theme_tree = thematic_screener.build_theme_tree()
+            if cached_theme_tree is None:
+                save_generated_theme_tree(theme_request, theme_tree, storage_manager)
+            screeners.append((thematic_screener, theme_tree))
+
+        # Search each query of the themes once, the queries shared by several themes too
+        shared_screener = create_screener(request, None)
+        for observer in observers:
+            shared_screener.register_observer(observer)
+        theme_chunks = shared_screener.search_themes(
+            [theme_tree.get_terminal_summaries() for _, theme_tree in screeners],
+            document_limit=request.document_limit,
+            batch_size=request.batch_size,
+            frequency=request.frequency.value,
+        )
+    except Exception as e:
+        for request_id in request_ids:
+            fail(request_id, e)
         raise e
+
+    errors = []
+    for (request_id, theme_request), (
+        thematic_screener,
+        theme_tree,
+    ), df_sentences in zip(workflows, screeners, theme_chunks):
+        try:
+            with thematic_screener.traced(workflow_execution_start):
+                df_labeled = thematic_screener.label(theme_tree, df_sentences)
+                results = thematic_screener.score_and_motivate(theme_tree, df_labeled)
+            send_report_trace(
+                bigdata, workflow_execution_start, len(resolved_companies)
+            )
+            response = build_response(
+                df_company=results["df_company"],
+                df_motivation=results["df_motivation"],
+                df_labeled=results["df_labeled"],
+                theme_tree=theme_tree,
+                search_parameters=shared_screener.get_search_parameters(
+                    theme_request.batch_size, theme_request.document_limit
+                ),
+            )
+            log_throttling(request_id, storage_manager)
+            storage_manager.mark_workflow_as_completed(
+                request_id, theme_request, response
+            )
+        except Exception as e:
+            fail(request_id, e)
+            errors.append(e)
+    if errors:
+        raise errors[0]
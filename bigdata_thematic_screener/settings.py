@@ -32,6 +32,130 @@ class Settings(BaseSettings):
     # Data storage configuration
     DB_STRING: str = "sqlite:///thematic_screener.db"
 
+    # Reports are stored as JSON compressed with `gzip`, `zstd` (needs the optional
+    # zstandard package, gzip is used without it) or `none` for plain JSON. Reports stored
+    # with another setting stay readable, `python -m bigdata_thematic_screener
+    # migrate-reports` converts them to the current one.
+    REPORT_COMPRESSION: Literal["none", "gzip", "zstd"] = "gzip"
+
+    # Responses larger than RESPONSE_COMPRESSION_MIN_BYTES are compressed with brotli (needs
+    # the optional brotli package) or gzip, as accepted by the client. Encoded bodies of
+    # completed reports and static files are kept in memory up to
+    # ENCODED_BODY_CACHE_MAX_BYTES, and in the SQLite file ENCODED_BODY_CACHE_PATH up to
+    # ENCODED_BODY_CACHE_DISK_MAX_BYTES. Unset ENCODED_BODY_CACHE_PATH to keep them in
+    # memory only.
+    RESPONSE_COMPRESSION_MIN_BYTES: int = 1024
+    ENCODED_BODY_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    ENCODED_BODY_CACHE_PATH: str | None = "encoded_body_cache.db"
+    ENCODED_BODY_CACHE_DISK_MAX_BYTES: int = 256 * 1024 * 1024
+
+    # Static files can be reused by browsers for this long, then are revalidated with an
+    # ETag hashing their content
+    STATIC_CACHE_MAX_AGE_SECONDS: int = 24 * 60 * 60
+
+    # Workflow execution limits. Requests received when the queue is full are rejected
+    # with a 429 status code and a Retry-After header
+    MAX_CONCURRENT_WORKFLOWS: int = 2
+    MAX_QUEUED_WORKFLOWS: int = 20
+    QUEUE_RETRY_AFTER_SECONDS: int = 60
+
+    # Queued and running workflows are leased to the process that holds them, and the lease
+    # is renewed periodically. Workflows with an expired lease are resumed by another process,
+    # or after a restart, up to WORKFLOW_MAX_ATTEMPTS times.
+    WORKFLOW_LEASE_SECONDS: int = 60
+    WORKFLOW_MAX_ATTEMPTS: int = 3
+
+    # Set RUN_WORKFLOWS to false on API nodes when workflows are run by worker processes
+    # (`python -m bigdata_thematic_screener worker`) sharing the same database. API nodes then
+    # only queue workflows and serve their status. Workers check for queued workflows every
+    # WORKER_POLL_INTERVAL_SECONDS.
+    RUN_WORKFLOWS: bool = True
+    WORKER_POLL_INTERVAL_SECONDS: float = 2
+
+    # Identical requests received within this time return the existing report instead of
+    # running the workflow again. Set to 0 to disable.
+    REPORT_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+
+    # Companies resolved from watchlists and lists of entity IDs are cached in memory.
+    # Set RESOLUTION_CACHE_PATH to also keep them in a SQLite file across restarts.
+    RESOLUTION_CACHE_MAX_ENTRIES: int = 256
+    RESOLUTION_CACHE_TTL_SECONDS: int = 6 * 60 * 60
+    RESOLUTION_CACHE_PATH: str | None = None
+
+    # Large lists of entity IDs are resolved in chunks of RESOLUTION_CHUNK_SIZE IDs, requested
+    # concurrently by up to RESOLUTION_MAX_WORKERS threads. Failed chunks are retried
+    # RESOLUTION_CHUNK_RETRIES times.
+    RESOLUTION_CHUNK_SIZE: int = 500
+    RESOLUTION_MAX_WORKERS: int = 4
+    RESOLUTION_CHUNK_RETRIES: int = 2
+
+    # Theme trees are generated once per theme, focus and LLM model and reused by later
+    # workflows. Change TAXONOMY_CACHE_VERSION to generate them again, e.g. after a prompt change.
+    TAXONOMY_CACHE_ENABLED: bool = True
+    TAXONOMY_CACHE_VERSION: str = "1"
+
+    # LLM responses used to label chunks and generate motivations are stored in this SQLite
+    # file, and reused by identical calls. Least recently used responses are evicted past
+    # LLM_CACHE_MAX_BYTES. Unset LLM_CACHE_PATH to disable the cache.
+    LLM_CACHE_PATH: str | None = "llm_response_cache.db"
+    LLM_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+
+    # Search results of each company and query sentence are stored in this SQLite file for
+    # RETRIEVAL_CACHE_TTL_SECONDS, and reused by workflows running the same query on the same
+    # document type, fiscal year and dates. The sentences missing from the cache are searched
+    # on their own, up to RETRIEVAL_MAX_WORKERS at a time. Unset RETRIEVAL_CACHE_PATH to
+    # disable the cache.
+    RETRIEVAL_CACHE_PATH: str | None = "retrieval_cache.db"
+    RETRIEVAL_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+    RETRIEVAL_MAX_WORKERS: int = 4
+
+    # Screens of at least SCREENER_SHARD_MIN_COMPANIES companies are split in SCREENER_SHARDS
+    # shards of companies, searched and labeled in parallel. A failed shard is retried
+    # SCREENER_SHARD_RETRIES times on its own. Disabled by default, set SCREENER_SHARDS above
+    # 1 to enable.
+    SCREENER_SHARDS: int = 1
+    SCREENER_SHARD_MIN_COMPANIES: int = 100
+    SCREENER_SHARD_RETRIES: int = 1
+
+    # Searches with `batch_size` or `document_limit` set to `auto` run in rounds of
+    # AUTOTUNE_ROUND_BATCHES batches of entities. The batch size starts at
+    # AUTOTUNE_INITIAL_BATCH_SIZE, grows by AUTOTUNE_BATCH_SIZE_INCREASE after each round whose
+    # queries answer within AUTOTUNE_TARGET_LATENCY_SECONDS on average without failures, and
+    # is halved otherwise. An `auto` document limit is AUTOTUNE_DOCUMENTS_PER_ENTITY documents
+    # per entity of the batch.
+    AUTOTUNE_INITIAL_BATCH_SIZE: int = 10
+    AUTOTUNE_MIN_BATCH_SIZE: int = 1
+    AUTOTUNE_MAX_BATCH_SIZE: int = 50
+    AUTOTUNE_BATCH_SIZE_INCREASE: int = 2
+    AUTOTUNE_TARGET_LATENCY_SECONDS: float = 5.0
+    AUTOTUNE_ROUND_BATCHES: int = 8
+    AUTOTUNE_DOCUMENTS_PER_ENTITY: int = 10
+
+    # Outbound calls made by the workflows wait for a requests per minute budget of each
+    # provider, and of a tokens per minute budget for LLM providers. Budgets are shared by the
+    # workflows of a process, and by all the processes using the database when
+    # RATE_LIMIT_SHARED is set. Set a budget to 0 to disable it.
+    LLM_REQUESTS_PER_MINUTE: int = 500
+    LLM_TOKENS_PER_MINUTE: int = 200_000
+    BIGDATA_REQUESTS_PER_MINUTE: int = 300
+    RATE_LIMIT_SHARED: bool = False
+
+    # Outputs of the completed stages of each workflow (companies, taxonomy, chunks and
+    # labeled chunks) are stored in a directory per workflow in CHECKPOINT_DIR, so a failed
+    # workflow retried with `/status/{request_id}/retry` resumes from its last completed
+    # stage. They are removed once the workflow completes. Unset CHECKPOINT_DIR to disable.
+    # Frames are stored as Parquet with the `parquet` extra, and as compressed pickles
+    # without it.
+    CHECKPOINT_DIR: str | None = "checkpoints"
+    # Checkpoints of failed workflows not retried within CHECKPOINT_TTL_SECONDS are removed
+    # by the workers, as are the checkpoints left by workflows that no longer exist. Set
+    # to 0 to keep them until the workflow completes.
+    CHECKPOINT_TTL_SECONDS: int = 7 * 24 * 3600
+
+    # Interval between checks for new events on the `/status/{request_id}/events` stream
+    # when the workflow runs in another worker process
+    EVENTS_POLL_INTERVAL_SECONDS: float = 2.0
+
     # Server configuration
     HOST: str = "0.0.0.0"
     PORT: int = 8000
@@ -148,58 +148,89 @@ document.getElementById('screenerForm').onsubmit = async function (e) {
             throw new Error(`HTTP error ${response.status}`);
         }
         const data = await response.json();
-        // Start polling status endpoint every 5 seconds using request_id
+        // Follow the progress of the analysis using request_id
         if (data && data.request_id) {
             const requestId = data.request_id;
             let polling = true;
+            let logsSince = 0;
+            let etag = null;
             const logViewer = document.getElementById('logViewer');
+            const renderLogLine = (line) => {
+                let base = 'mb-1';
+                let color = '';
+                if (line.toLowerCase().includes('error')) color = 'text-red-400';
+                else if (line.toLowerCase().includes('success')) color = 'text-green-400';
+                else if (line.toLowerCase().includes('info')) color = 'text-sky-400';
+                return `<div class='${base} ${color}'>${line}</div>`;
+            };
+            const appendLogLines = (lines) => {
+                if (logsSince === 0) logViewer.innerHTML = '';
+                logViewer.insertAdjacentHTML('beforeend', lines.map(renderLogLine).join(''));
+                logViewer.scrollTop = logViewer.scrollHeight;
+            };
+            async function finishAnalysis(status) {
+                if (status === 'completed') {
+                    // Fetch the report only once, now that it is available
+                    const reportParams = new URLSearchParams(params);
+                    reportParams.append('logs_since', logsSince);
+                    const reportResp = await fetch(`/status/${requestId}?${reportParams}`);
+                    if (!reportResp.ok) {
+                        throw new Error(`Status HTTP error ${reportResp.status}`);
+                    }
+                    const reportData = await reportResp.json();
+
+                    // Update config badge BEFORE rendering so dashboard has access to it
+                    if (window.updateConfigBadge) {
+                        // Use exactly what the user typed for display
+                        const companiesText = document.getElementById('companies_text').value.trim();
+                        updateConfigBadge({
+                            theme: theme,
+                            companies: companiesText || 'Custom Universe',
+                            isDemo: false
+                        });
+                    }
+                    
+                    renderScreenerReport(reportData.report);
+                    showJsonBtn.style.display = 'inline-block';
+                    lastReport = reportData.report;
+                }
+                spinner.style.display = 'none';
+                submitBtn.disabled = false;
+                submitBtn.textContent = 'Run Analysis';
+            }
+            // Fallback when the event stream is not available: poll the status every 5 seconds
             async function pollStatus() {
 
                 try {
-                    const statusResp = await fetch(`/status/${requestId}?${params}`);
+                    // Only ask for new log lines, and skip the report until the workflow is done
+                    const statusParams = new URLSearchParams(params);
+                    statusParams.append('logs_since', logsSince);
+                    statusParams.append('include_report', 'false');
+                    const headers = etag ? { 'If-None-Match': etag } : {};
+                    const statusResp = await fetch(`/status/${requestId}?${statusParams}`, { headers });
+                    spinner.style.display = 'block';
+                    if (statusResp.status === 304) {
+                        if (polling) {
+                            setTimeout(pollStatus, 5000);
+                        }
+                        return;
+                    }
                     if (!statusResp.ok) {
                         throw new Error(`Status HTTP error ${statusResp.status}`);
                     }
+                    etag = statusResp.headers.get('ETag');
                     const statusData = await statusResp.json();
-                    spinner.style.display = 'block';
-                    // Render logs if available
-                    if (statusData.logs && Array.isArray(statusData.logs)) {
-                        logViewer.innerHTML = statusData.logs.map(line => {
-                            let base = 'mb-1';
-                            let color = '';
-                            if (line.toLowerCase().includes('error')) color = 'text-red-400';
-                            else if (line.toLowerCase().includes('success')) color = 'text-green-400';
-                            else if (line.toLowerCase().includes('info')) color = 'text-sky-400';
-                            return `<div class='${base} ${color}'>${line}</div>`;
-                        }).join('');
-                        logViewer.scrollTop = logViewer.scrollHeight;
-                    } else if (statusData.log) {
-                        logViewer.textContent = statusData.log;
-                    } else {
+                    // Append new logs if available
+                    if (statusData.logs && statusData.logs.length > 0) {
+                        appendLogLines(statusData.logs);
+                        logsSince = statusData.last_log_seq;
+                    } else if (logsSince === 0) {
                         logViewer.textContent = 'No logs yet.';
                     }
                     // Stop polling if status is 'completed' or 'failed'
                     if (statusData.status === 'completed' || statusData.status === 'failed') {
                         polling = false;
-                        if (statusData.status === 'completed') {
-                            // Update config badge BEFORE rendering so dashboard has access to it
-                            if (window.updateConfigBadge) {
-                                // Use exactly what the user typed for display
-                                const companiesText = document.getElementById('companies_text').value.trim();
-                                updateConfigBadge({
-                                    theme: theme,
-                                    companies: companiesText || 'Custom Universe',
-                                    isDemo: false
-                                });
-                            }
-                            
-                            renderScreenerReport(statusData.report);
-                            showJsonBtn.style.display = 'inline-block';
-                            lastReport = statusData.report;
-                        }
-                        spinner.style.display = 'none';
-                        submitBtn.disabled = false;
-                        submitBtn.textContent = 'Run Analysis';
+                        await finishAnalysis(statusData.status);
                         return;
                     }
                 } catch (err) {
@@ -209,7 +240,36 @@ document.getElementById('screenerForm').onsubmit = async function (e) {
                     setTimeout(pollStatus, 5000);
                 }
             }
-            pollStatus();
+            function streamStatus() {
+                const eventsParams = new URLSearchParams(params);
+                const events = new EventSource(`/status/${requestId}/events?${eventsParams}`);
+                spinner.style.display = 'block';
+                events.addEventListener('log', (event) => {
+                    appendLogLines([event.data]);
+                    logsSince = parseInt(event.lastEventId) || logsSince;
+                });
+                const onFinished = async (event) => {
+                    events.close();
+                    try {
+                        await finishAnalysis(event.type);
+                    } catch (err) {
+                        logViewer.innerHTML = `<div class=\"log-line log-error\">❌ Status Error: ${err.message}</div>`;
+                    }
+                };
+                events.addEventListener('completed', onFinished);
+                events.addEventListener('failed', onFinished);
+                events.onerror = () => {
+                    // The browser reconnects on its own unless the stream was closed for good
+                    if (events.readyState === EventSource.CLOSED) {
+                        pollStatus();
+                    }
+                };
+            }
+            if (window.EventSource) {
+                streamStatus();
+            } else {
+                pollStatus();
+            }
         }
     } catch (err) {
         alert(`❌ Error: ${err.message}`);
@@ -2,6 +2,8 @@ from enum import StrEnum
 
 from bigdata_client.tracking_services import TraceEvent
 from bigdata_client.tracking_services import send_trace as bigdata_send_trace
+from bigdata_research_tools.tracing import WorkflowTraceEvent
+from bigdata_research_tools.tracing import send_trace as research_tools_send_trace
 
 
 class TraceEventName(StrEnum):
@@ -17,3 +19,10 @@ def send_trace(bigdata_client, event_name: TraceEventName, trace: dict):
         )
     except Exception:
         pass
+
+
+def send_workflow_trace(bigdata_client, trace: WorkflowTraceEvent):
+    try:
+        research_tools_send_trace(bigdata_client, trace)
+    except Exception:
+        pass
@@ -0,0 +1,284 @@
+import signal
+import time
+from contextlib import nullcontext
+from functools import partial
+from threading import Event
+from uuid import UUID
+
+from bigdata_client import Bigdata
+from sqlalchemy import Engine
+from sqlmodel import Session, SQLModel, create_engine
+
+from bigdata_thematic_screener import LOG_LEVEL, logger
+from bigdata_thematic_screener.api.events import EventBroker
+from bigdata_thematic_screener.api.models import ThematicScreenRequest, WorkflowStatus
+from bigdata_thematic_screener.api.scheduler import (
+    WORKER_ID,
+    JobScheduler,
+    QueueFullError,
+)
+from bigdata_thematic_screener.api.sql_models import (
+    add_missing_columns,
+    migrate_workflow_logs,
+)
+from bigdata_thematic_screener.api.storage import StorageManager
+from bigdata_thematic_screener.checkpoints import get_expired_checkpoints
+from bigdata_thematic_screener.llm_cache import install_configured_llm_response_cache
+from bigdata_thematic_screener.rate_limit import (
+    install_configured_rate_limits,
+    track_throttling,
+)
+from bigdata_thematic_screener.service import process_batch, process_request
+from bigdata_thematic_screener.settings import settings
+
+# Interval between the removals of the expired checkpoints by a worker
+CHECKPOINT_CLEANUP_INTERVAL_SECONDS = 3600
+
+
+class WorkflowWorker:
+    """Runs the workflows stored in the database on a local scheduler.
+
+    Workflows run by this process are leased to `worker_id`, and their leases are renewed
+    by `maintain_queue`. It also claims the workflows queued without a lease, by API nodes
+    that do not run workflows, and the workflows whose lease expired because the process
+    holding them is gone. Claims are conditional updates, so several workers can share the
+    same database and each workflow is claimed by a single one. Once an hour, it removes
+    the expired checkpoints of the workflows that are not queued or running.
+
+    Args:
+        engine: Engine of the database storing the workflows.
+        bigdata: Client used by the workflows.
+        scheduler: Scheduler running the workflows in this process.
+        worker_id: Owner of the leases taken by this worker.
+        event_broker: Broker publishing the progress of the workflows to the API, when the
+            worker runs in the API process.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        bigdata: Bigdata | None,
+        scheduler: JobScheduler,
+        worker_id: str = WORKER_ID,
+        event_broker: EventBroker | None = None,
+    ):
+        self.engine = engine
+        self.bigdata = bigdata
+        self.scheduler = scheduler
+        self.worker_id = worker_id
+        self.event_broker = event_broker
+        self._checkpoints_cleaned_at: float | None = None
+
+    def submit(self, request: ThematicScreenRequest, request_id: UUID):
+        """Queue a workflow leased to this worker on the local scheduler.
+
+        Raises:
+            QueueFullError: If the local queue is full.
+        """
+        self.scheduler.submit(
+            request_id, partial(self.run_workflow, request, request_id)
+        )
+
+    def run_workflow(self, request: ThematicScreenRequest, request_id: UUID):
+        """Run a workflow with its own database session, as it outlives the request that created it."""
+        with Session(self.engine) as session, self._running([request_id]):
+            storage_manager = StorageManager(session, event_broker=self.event_broker)
+            try:
+                attempt = storage_manager.start_attempt(request_id)
+                if attempt > settings.WORKFLOW_MAX_ATTEMPTS:
+                    storage_manager.log_message(
+                        request_id,
+                        f"Workflow abandoned after {attempt - 1} interrupted attempts.",
+                    )
+                    storage_manager.update_status(request_id, WorkflowStatus.FAILED)
+                    return
+                with track_throttling():
+                    process_request(
+                        request,
+                        bigdata=self.bigdata,
+                        request_id=request_id,
+                        storage_manager=storage_manager,
+                        extends_id=storage_manager.get_extends_id(request_id),
+                    )
+            finally:
+                storage_manager.release_lease(request_id)
+
+    def _running(self, request_ids: list[UUID]):
+        """Mark the workflows run by this process as active in the event broker."""
+        if self.event_broker is None:
+            return nullcontext()
+        return self.event_broker.running(request_ids)
+
+    def submit_batch(self, batch_id: UUID):
+        """Queue the workflows of a batch on the local scheduler, to run together.
+
+        Raises:
+            QueueFullError: If the local queue is full.
+        """
+        self.scheduler.submit(batch_id, partial(self.run_batch, batch_id))
+
+    def run_batch(self, batch_id: UUID):
+        """Run the queued workflows of a batch, claiming the ones not leased to this worker yet."""
+        with Session(self.engine) as session:
+            storage_manager = StorageManager(session, event_broker=self.event_broker)
+            workflows = storage_manager.claim_batch_workflows(
+                batch_id, self.worker_id, settings.WORKFLOW_LEASE_SECONDS
+            )
+            with self._running([request_id for request_id, _ in workflows]):
+                try:
+                    runnable = []
+                    for request_id, request in workflows:
+                        attempt = storage_manager.start_attempt(request_id)
+                        if attempt > settings.WORKFLOW_MAX_ATTEMPTS:
+                            storage_manager.log_message(
+                                request_id,
+                                f"Workflow abandoned after {attempt - 1} interrupted attempts.",
+                            )
+                            storage_manager.update_status(
+                                request_id, WorkflowStatus.FAILED
+                            )
+                        else:
+                            runnable.append((request_id, request))
+                    if runnable:
+                        with track_throttling():
+                            process_batch(
+                                runnable,
+                                bigdata=self.bigdata,
+                                storage_manager=storage_manager,
+                            )
+                finally:
+                    for request_id, _ in workflows:
+                        storage_manager.release_lease(request_id)
+
+    def free_slots(self) -> int:
+        """Number of workflows this worker can start right away."""
+        return max(
+            self.scheduler.max_concurrent_jobs - len(self.scheduler.job_ids()), 0
+        )
+
+    def maintain_queue(self):
+        """Renew the leases of the workflows held by this worker, and claim as many
+        workflows as it can start: first the ones whose process is gone, then the ones
+        waiting for a worker."""
+        with Session(self.engine) as session:
+            storage_manager = StorageManager(session, event_broker=self.event_broker)
+            self._renew_leases(storage_manager)
+            orphaned_workflows = storage_manager.claim_orphaned_workflows(
+                self.worker_id,
+                settings.WORKFLOW_LEASE_SECONDS,
+                limit=self.free_slots(),
+            )
+            for request_id, request in orphaned_workflows:
+                if self._submit_claimed(storage_manager, request, request_id):
+                    logger.info("Resuming workflow", request_id=str(request_id))
+                    storage_manager.log_message(
+                        request_id,
+                        "The process running this workflow stopped, the workflow has been queued again.",
+                    )
+            queued_workflows = storage_manager.claim_queued_workflows(
+                self.worker_id,
+                settings.WORKFLOW_LEASE_SECONDS,
+                limit=self.free_slots(),
+            )
+            for request_id, request in queued_workflows:
+                if self._submit_claimed(storage_manager, request, request_id):
+                    logger.info("Claimed workflow", request_id=str(request_id))
+            if (
+                self._checkpoints_cleaned_at is None
+                or time.monotonic() - self._checkpoints_cleaned_at
+                >= CHECKPOINT_CLEANUP_INTERVAL_SECONDS
+            ):
+                self._checkpoints_cleaned_at = time.monotonic()
+                self.remove_expired_checkpoints(storage_manager)
+
+    def remove_expired_checkpoints(self, storage_manager: StorageManager):
+        """Remove the checkpoints older than `CHECKPOINT_TTL_SECONDS` of the failed
+        workflows, and of the workflows that no longer exist. Checkpoints of queued and
+        running workflows are kept, as they resume from them."""
+        if settings.CHECKPOINT_TTL_SECONDS <= 0:
+            return
+        removed = 0
+        for request_id, workflow_checkpoints in get_expired_checkpoints(
+            settings.CHECKPOINT_TTL_SECONDS
+        ):
+            if storage_manager.get_status(request_id) in (
+                WorkflowStatus.QUEUED,
+                WorkflowStatus.IN_PROGRESS,
+            ):
+                continue
+            workflow_checkpoints.clear()
+            removed += 1
+        if removed:
+            logger.info("Removed expired checkpoints", workflows=removed)
+
+    def _renew_leases(self, storage_manager: StorageManager):
+        storage_manager.renew_leases(
+            self.scheduler.job_ids(), self.worker_id, settings.WORKFLOW_LEASE_SECONDS
+        )
+
+    def _submit_claimed(
+        self,
+        storage_manager: StorageManager,
+        request: ThematicScreenRequest,
+        request_id: UUID,
+    ) -> bool:
+        try:
+            batch_id = storage_manager.get_batch_id(request_id)
+            if batch_id is None:
+                self.submit(request, request_id)
+            elif batch_id not in self.scheduler.job_ids():
+                # The batch job claims the other workflows of the batch
+                self.submit_batch(batch_id)
+        except QueueFullError:
+            # Give up the lease, it will be claimed again once there is room
+            storage_manager.release_lease(request_id)
+            return False
+        return True
+
+    def run(self, stop: Event, poll_interval: float):
+        """Claim and run workflows until `stop` is set. Workflows claimed but not started
+        yet are released, so other workers can take them, and running ones are allowed to
+        finish."""
+        self.scheduler.start()
+        logger.info("Worker started", worker_id=self.worker_id)
+        while not stop.is_set():
+            try:
+                self.maintain_queue()
+            except Exception as e:
+                logger.error("Worker maintenance failed", error=str(e))
+            stop.wait(poll_interval)
+
+        logger.info("Stopping worker", worker_id=self.worker_id)
+        dropped = self.scheduler.shutdown(wait=False)
+        with Session(self.engine) as session:
+            storage_manager = StorageManager(session)
+            for request_id in dropped:
+                storage_manager.release_lease(request_id)
+            # Keep the leases of the running workflows, or another worker would claim them
+            while self.scheduler.running_jobs():
+                self._renew_leases(storage_manager)
+                time.sleep(min(poll_interval, settings.WORKFLOW_LEASE_SECONDS / 3))
+
+
+def run_worker():
+    """Entry point of `python -m bigdata_thematic_screener worker`: run the workflows queued
+    in the database by the API nodes, until interrupted."""
+    engine = create_engine(settings.DB_STRING, echo=LOG_LEVEL == "DEBUG")
+    SQLModel.metadata.create_all(engine)
+    add_missing_columns(engine)
+    migrate_workflow_logs(engine)
+    install_configured_llm_response_cache()
+    install_configured_rate_limits(engine)
+
+    worker = WorkflowWorker(
+        engine,
+        bigdata=Bigdata(api_key=settings.BIGDATA_API_KEY),
+        scheduler=JobScheduler(
+            max_concurrent_jobs=settings.MAX_CONCURRENT_WORKFLOWS,
+            max_queued_jobs=settings.MAX_QUEUED_WORKFLOWS,
+        ),
+    )
+    stop = Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    worker.run(stop, poll_interval=settings.WORKER_POLL_INTERVAL_SECONDS)
@@ -6,5 +6,6 @@ os.environ.update(
         "BIGDATA_API_KEY": "fake-key",
         "OPENAI_API_KEY": "fake-key",
         "LOG_LEVEL": "ERROR",
+        "ENCODED_BODY_CACHE_PATH": "",
     }
 )
@@ -0,0 +1,108 @@
+import gzip
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+
+from bigdata_thematic_screener.api import compression
+from bigdata_thematic_screener.api.compression import (
+    CachedStaticFiles,
+    CompressionMiddleware,
+    EncodedBodyCache,
+    negotiate_encoding,
+)
+
+
+@pytest.mark.parametrize(
+    "accept_encoding,brotli_available,expected",
+    [
+        (None, True, "identity"),
+        ("gzip, deflate", True, "gzip"),
+        ("gzip, deflate, br", True, "br"),
+        ("gzip, deflate, br", False, "gzip"),
+        ("br;q=0.5, gzip", True, "gzip"),
+        ("*", True, "br"),
+        ("gzip;q=0, *;q=0.1", False, "identity"),
+        ("identity", True, "identity"),
+    ],
+)
+def test_negotiate_encoding(monkeypatch, accept_encoding, brotli_available, expected):
+    monkeypatch.setattr(compression, "BROTLI_AVAILABLE", brotli_available)
+    assert negotiate_encoding(accept_encoding) == expected
+
+
+def test_encoded_body_cache(tmp_path):
+    body_cache = EncodedBodyCache(max_bytes=10, path=str(tmp_path / "bodies.db"))
+    body_cache.set("a", "gzip", b"a" * 6)
+    body_cache.set("b", "gzip", b"b" * 6)
+    assert body_cache.get("b", "gzip") == b"b" * 6
+    assert body_cache.get("b", "br") is None
+    # Evicted from memory, still on disk
+    assert "gzip:a" not in body_cache._entries
+    assert body_cache.get("a", "gzip") == b"a" * 6
+
+    body = body_cache.get_or_encode("c", "gzip", lambda: b"body")
+    assert gzip.decompress(body) == b"body"
+    assert body_cache.get_or_encode("c", "gzip", lambda: b"other") == body
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(
+        compression, "get_encoded_body_cache", lambda: EncodedBodyCache(1024 * 1024)
+    )
+    (tmp_path / "data.json").write_text(json.dumps([{"key": "value"}] * 1000))
+    (tmp_path / "font.woff2").write_bytes(b"font" * 1000)
+
+    app = FastAPI()
+    app.add_middleware(
+        CompressionMiddleware, minimum_size=100, excluded_paths=("/static/",)
+    )
+    app.mount("/static", CachedStaticFiles(directory=tmp_path), name="static")
+
+    @app.get("/text", response_class=PlainTextResponse)
+    def text():
+        return "text" * 1000
+
+    return TestClient(app)
+
+
+def test_compression_middleware(client):
+    response = client.get("/text", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.text == "text" * 1000
+    response = client.get("/text", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+
+
+def test_cached_static_files(client):
+    response = client.get("/static/data.json", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Cache-Control"].startswith("public, max-age=")
+    assert response.json() == [{"key": "value"}] * 1000
+    etag = response.headers["ETag"]
+
+    assert (
+        client.get(
+            "/static/data.json",
+            headers={"Accept-Encoding": "gzip", "If-None-Match": etag},
+        ).status_code
+        == 304
+    )
+
+    # Each encoding has its own ETag
+    response = client.get("/static/data.json", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["ETag"] != etag
+    response = client.get(
+        "/static/data.json",
+        headers={"Accept-Encoding": "identity", "If-None-Match": etag},
+    )
+    assert response.status_code == 200
+    assert response.json() == [{"key": "value"}] * 1000
+
+    # Fonts are already compressed
+    response = client.get("/static/font.woff2", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
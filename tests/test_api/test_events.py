@@ -0,0 +1,57 @@
+import asyncio
+from uuid import uuid4
+
+from bigdata_thematic_screener.api.events import (
+    EventBroker,
+    WorkflowEvent,
+    WorkflowEventType,
+)
+from bigdata_thematic_screener.api.models import WorkflowStatus
+
+
+def test_workflow_event_to_sse():
+    event = WorkflowEvent(event=WorkflowEventType.LOG, data="line 1\nline 2", seq=3)
+    assert event.to_sse() == "id: 3\nevent: log\ndata: line 1\ndata: line 2\n\n"
+
+    event = WorkflowEvent(event=WorkflowEventType.STATUS, data="completed")
+    assert event.to_sse() == "event: status\ndata: completed\n\n"
+
+
+def test_event_broker_delivers_to_subscribers():
+    broker = EventBroker()
+    request_id = uuid4()
+
+    async def run():
+        subscription = broker.subscribe(request_id)
+        other = broker.subscribe(uuid4())
+        broker.publish_log(request_id, 1, "message")
+        broker.publish_status(request_id, WorkflowStatus.COMPLETED)
+
+        log = await subscription.get(timeout=1)
+        status = await subscription.get(timeout=1)
+        assert await other.get(timeout=0.01) is None
+
+        broker.unsubscribe(subscription)
+        broker.unsubscribe(other)
+        return log, status
+
+    log, status = asyncio.run(run())
+    assert log.event == WorkflowEventType.LOG
+    assert log.seq == 1
+    assert log.data == "message"
+    assert status.event == WorkflowEventType.STATUS
+    assert status.data == WorkflowStatus.COMPLETED.value
+
+
+def test_event_broker_tracks_active_workflows():
+    broker = EventBroker()
+    request_id = uuid4()
+    assert not broker.is_active(request_id)
+
+    # Statuses published for workflows run by other processes do not mark them as active
+    broker.publish_status(request_id, WorkflowStatus.QUEUED)
+    assert not broker.is_active(request_id)
+
+    with broker.running([request_id]):
+        assert broker.is_active(request_id)
+    assert not broker.is_active(request_id)
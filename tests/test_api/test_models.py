@@ -3,6 +3,7 @@ import pytest
 from bigdata_thematic_screener.api.models import (
     DocumentType,
     FrequencyEnum,
+    ThematicScreenBatchRequest,
     ThematicScreenRequest,
 )
 
@@ -106,3 +107,90 @@ def test_thematic_screen_request_model(
         assert req.companies == companies
     if rerank_threshold is not None:
         assert req.rerank_threshold == rerank_threshold
+
+
+def _request(**overrides) -> ThematicScreenRequest:
+    values = {
+        "theme": "Supply Chain Reshaping",
+        "companies": ["4A6F00", "D8442A"],
+        "start_date": "2025-06-01",
+        "end_date": "2025-08-01",
+        "fiscal_year": [2024, 2025],
+        "document_type": DocumentType.TRANSCRIPTS,
+        "frequency": FrequencyEnum.monthly,
+    }
+    values.update(overrides)
+    return ThematicScreenRequest(**values)
+
+
+def test_canonical_hash_ignores_ordering_and_empty_focus():
+    request = _request()
+    assert request.canonical_hash() == _request().canonical_hash()
+    assert (
+        request.canonical_hash()
+        == _request(
+            companies=["D8442A", "4A6F00"], fiscal_year=[2025, 2024], focus=""
+        ).canonical_hash()
+    )
+
+
+@pytest.mark.parametrize(
+    "overrides",
+    [
+        {"theme": "AI Adoption"},
+        {"focus": "Nearshoring"},
+        {"companies": ["4A6F00"]},
+        {"companies": "44118802-9104-4265-b97a-2e6d88d74893"},
+        {"end_date": "2025-09-01"},
+        {"llm_model": "openai::gpt-4o"},
+        {"fiscal_year": 2025},
+        {"frequency": FrequencyEnum.weekly},
+        {"document_limit": 50},
+        {"batch_size": 5},
+        {"rerank_threshold": 0.8},
+    ],
+)
+def test_canonical_hash_changes_with_parameters(overrides):
+    assert _request().canonical_hash() != _request(**overrides).canonical_hash()
+
+
+def test_batch_request_theme_requests():
+    batch_request = ThematicScreenBatchRequest(
+        themes=[
+            {"theme": "Supply Chain Reshaping", "focus": "Logistics"},
+            {"theme": "AI Adoption"},
+        ],
+        companies=["4A6F00", "D8442A"],
+        start_date="2025-06-01",
+        end_date="2025-08-01",
+        fiscal_year=2025,
+        frequency=FrequencyEnum.monthly,
+    )
+
+    requests = batch_request.theme_requests()
+
+    assert [(request.theme, request.focus) for request in requests] == [
+        ("Supply Chain Reshaping", "Logistics"),
+        ("AI Adoption", None),
+    ]
+    assert all(request.companies == ["4A6F00", "D8442A"] for request in requests)
+
+
+def test_batch_request_validates_each_theme():
+    with pytest.raises(ValueError):
+        ThematicScreenBatchRequest(
+            themes=[{"theme": "AI Adoption"}],
+            companies=["4A6F00"],
+            start_date="2025-08-01",
+            end_date="2025-06-01",
+            fiscal_year=2025,
+        )
+    with pytest.raises(ValueError):
+        ThematicScreenBatchRequest(
+            themes=[],
+            companies=["4A6F00"],
+            start_date="2025-06-01",
+            end_date="2025-08-01",
+            fiscal_year=2025,
+            frequency=FrequencyEnum.monthly,
+        )
@@ -0,0 +1,74 @@
+from threading import Event
+from uuid import uuid4
+
+import pytest
+
+from bigdata_thematic_screener.api.scheduler import JobScheduler, QueueFullError
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = JobScheduler(max_concurrent_jobs=1, max_queued_jobs=2)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def test_jobs_run_in_order():
+    scheduler = JobScheduler(max_concurrent_jobs=1, max_queued_jobs=10)
+    results = []
+    done = Event()
+    for i in range(5):
+        scheduler.submit(uuid4(), lambda i=i: results.append(i))
+    scheduler.submit(uuid4(), done.set)
+
+    assert done.wait(timeout=5)
+    assert results == [0, 1, 2, 3, 4]
+    scheduler.shutdown()
+
+
+def test_queue_position_and_backpressure(scheduler):
+    release = Event()
+    started = Event()
+    running_id, first_id, second_id = uuid4(), uuid4(), uuid4()
+
+    def blocking_job():
+        started.set()
+        release.wait(timeout=5)
+
+    scheduler.submit(running_id, blocking_job)
+    assert started.wait(timeout=5)
+
+    assert scheduler.submit(first_id, lambda: None) == 1
+    assert scheduler.submit(second_id, lambda: None) == 2
+    assert scheduler.queue_position(running_id) is None
+    assert scheduler.queue_position(second_id) == 2
+    assert scheduler.queue_depth() == 2
+    assert scheduler.running_jobs() == 1
+    assert scheduler.is_full()
+
+    with pytest.raises(QueueFullError):
+        scheduler.submit(uuid4(), lambda: None)
+
+    release.set()
+
+
+def test_failing_job_does_not_stop_worker(scheduler):
+    done = Event()
+
+    def failing_job():
+        raise RuntimeError("boom")
+
+    scheduler.submit(uuid4(), failing_job)
+    scheduler.submit(uuid4(), done.set)
+    assert done.wait(timeout=5)
+
+
+def test_submit_after_shutdown(scheduler):
+    scheduler.shutdown()
+    with pytest.raises(RuntimeError):
+        scheduler.submit(uuid4(), lambda: None)
+
+    scheduler.start()
+    done = Event()
+    scheduler.submit(uuid4(), done.set)
+    assert done.wait(timeout=5)
@@ -0,0 +1,600 @@
+from datetime import date, timedelta
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, delete
+
+from bigdata_thematic_screener.api import report_format
+from bigdata_thematic_screener.api.models import (
+    DocumentType,
+    FrequencyEnum,
+    ThematicScreenRequest,
+    WorkflowStatus,
+)
+from bigdata_thematic_screener.api.sql_models import (
+    SQLLabeledChunk,
+    SQLThematicScreenerReport,
+    add_missing_columns,
+    migrate_reports,
+    migrate_workflow_logs,
+)
+from bigdata_thematic_screener.api.storage import StorageManager
+from bigdata_thematic_screener.models import (
+    LabeledChunk,
+    LabeledContent,
+    SearchParameters,
+    ThematicScreenerResponse,
+    ThemeScoring,
+    ThemeTaxonomy,
+)
+
+
+@pytest.fixture
+def storage_manager():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield StorageManager(session)
+
+
+def test_log_message_appends_in_order(storage_manager):
+    request_id = uuid4()
+    storage_manager.update_status(request_id, WorkflowStatus.IN_PROGRESS)
+    for i in range(5):
+        storage_manager.log_message(request_id, f"message {i}")
+
+    assert storage_manager.get_logs(request_id) == [f"message {i}" for i in range(5)]
+
+
+def test_log_message_unknown_request(storage_manager):
+    with pytest.raises(ValueError):
+        storage_manager.log_message(uuid4(), "message")
+
+
+def test_logs_are_isolated_per_request(storage_manager):
+    request_a, request_b = uuid4(), uuid4()
+    storage_manager.update_status(request_a, WorkflowStatus.IN_PROGRESS)
+    storage_manager.update_status(request_b, WorkflowStatus.IN_PROGRESS)
+    storage_manager.log_message(request_a, "a1")
+    storage_manager.log_message(request_b, "b1")
+    storage_manager.log_message(request_a, "a2")
+
+    assert storage_manager.get_logs(request_a) == ["a1", "a2"]
+    assert storage_manager.get_logs(request_b) == ["b1"]
+    assert storage_manager.get_logs(uuid4()) is None
+
+
+def test_get_logs_since_seq(storage_manager):
+    request_id = uuid4()
+    storage_manager.update_status(request_id, WorkflowStatus.IN_PROGRESS)
+    for i in range(1, 6):
+        storage_manager.log_message(request_id, f"message {i}")
+
+    assert storage_manager.get_logs(request_id, since_seq=3) == [
+        "message 4",
+        "message 5",
+    ]
+    assert storage_manager.get_logs(request_id, since_seq=5) == []
+
+    report = storage_manager.get_report(request_id, since_seq=4)
+    assert report is not None
+    assert report.logs == ["message 5"]
+    assert report.report is None
+
+
+def test_get_report_last_log_seq(storage_manager):
+    request_id = uuid4()
+    storage_manager.update_status(request_id, WorkflowStatus.IN_PROGRESS)
+    storage_manager.log_message(request_id, "message 1")
+    storage_manager.log_message(request_id, "message 2")
+
+    report = storage_manager.get_report(request_id, include_report=False)
+    assert report.last_log_seq == 2
+
+    report = storage_manager.get_report(request_id, since_seq=report.last_log_seq)
+    assert report.logs == []
+    assert report.last_log_seq == 2
+
+
+def test_log_message_updates_last_updated(storage_manager):
+    request_id = uuid4()
+    storage_manager.update_status(request_id, WorkflowStatus.IN_PROGRESS)
+    last_updated = storage_manager.get_last_updated(request_id)
+    storage_manager.log_message(request_id, "message")
+
+    assert storage_manager.get_last_updated(request_id) > last_updated
+    assert storage_manager.get_last_updated(uuid4()) is None
+
+
+@pytest.fixture
+def screen_request():
+    return ThematicScreenRequest(
+        theme="Supply Chain Reshaping",
+        companies=["4A6F00", "D8442A"],
+        start_date="2025-01-01",
+        end_date="2025-12-31",
+        fiscal_year=2025,
+        document_type=DocumentType.TRANSCRIPTS,
+        frequency=FrequencyEnum.monthly,
+    )
+
+
+def test_claim_orphaned_workflows(storage_manager, screen_request):
+    alive, orphaned = uuid4(), uuid4()
+    storage_manager.create_workflow(alive, screen_request, "worker-a", 60)
+    storage_manager.create_workflow(orphaned, screen_request, "worker-b", -1)
+
+    claimed = storage_manager.claim_orphaned_workflows("worker-c", 60)
+
+    assert [request_id for request_id, _ in claimed] == [orphaned]
+    assert claimed[0][1] == screen_request
+    # Now leased to worker-c, nobody else can claim it
+    assert storage_manager.claim_orphaned_workflows("worker-d", 60) == []
+
+
+def test_claim_orphaned_workflows_skips_finished(storage_manager, screen_request):
+    request_id = uuid4()
+    storage_manager.create_workflow(request_id, screen_request, "worker-a", 60)
+    storage_manager.update_status(request_id, WorkflowStatus.FAILED)
+    storage_manager.release_lease(request_id)
+
+    assert storage_manager.claim_orphaned_workflows("worker-b", 60) == []
+
+
+def test_claim_queued_workflows(storage_manager, screen_request):
+    leased, first, second = uuid4(), uuid4(), uuid4()
+    storage_manager.create_workflow(leased, screen_request, "worker-a", 60)
+    storage_manager.create_workflow(first, screen_request, None, 60)
+    storage_manager.create_workflow(second, screen_request, None, 60)
+
+    assert storage_manager.count_queued_workflows() == 3
+    assert storage_manager.get_queue_position(second) == 3
+    # Never leased, so not orphaned
+    assert storage_manager.claim_orphaned_workflows("worker-b", 60) == []
+    claimed = storage_manager.claim_queued_workflows("worker-b", 60, limit=1)
+    assert [request_id for request_id, _ in claimed] == [first]
+    claimed = storage_manager.claim_queued_workflows("worker-c", 60)
+    assert [request_id for request_id, _ in claimed] == [second]
+    assert storage_manager.claim_queued_workflows("worker-d", 60) == []
+
+
+def test_renew_leases(storage_manager, screen_request):
+    request_id = uuid4()
+    storage_manager.create_workflow(request_id, screen_request, "worker-a", -1)
+    storage_manager.renew_leases([request_id], "worker-b", 60)
+    # Only the owner can renew its lease
+    assert len(storage_manager.claim_orphaned_workflows("worker-b", 60)) == 1
+
+    storage_manager.renew_leases([request_id], "worker-b", -1)
+    assert len(storage_manager.claim_orphaned_workflows("worker-c", 60)) == 1
+
+
+def test_start_attempt(storage_manager, screen_request):
+    request_id = uuid4()
+    storage_manager.create_workflow(request_id, screen_request, "worker-a", 60)
+    assert storage_manager.start_attempt(request_id) == 1
+    assert storage_manager.start_attempt(request_id) == 2
+
+
+def test_add_missing_columns():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE sqlworkflowstatus (id CHAR(32) PRIMARY KEY, last_updated DATETIME, status VARCHAR)"
+            )
+        )
+    add_missing_columns(engine)
+    SQLModel.metadata.create_all(engine)
+
+    columns = {
+        column["name"] for column in inspect(engine).get_columns("sqlworkflowstatus")
+    }
+    assert {"request", "lease_owner", "lease_expires_at", "attempts"} <= columns
+
+
+def test_migrate_workflow_logs():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    request_id = uuid4()
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE sqlworkflowstatus (id CHAR(32) PRIMARY KEY, last_updated DATETIME, status VARCHAR, logs JSON)"
+            )
+        )
+        connection.execute(
+            text(
+                "INSERT INTO sqlworkflowstatus VALUES (:id, '2025-01-01 00:00:00', 'completed', :logs)"
+            ),
+            {"id": request_id.hex, "logs": '["First", "Second"]'},
+        )
+    add_missing_columns(engine)
+    SQLModel.metadata.create_all(engine)
+
+    assert migrate_workflow_logs(engine) == 2
+    assert migrate_workflow_logs(engine) == 0
+    with Session(engine) as session:
+        assert StorageManager(session).get_logs(request_id) == ["First", "Second"]
+
+
+def test_find_cached_report(storage_manager, screen_request):
+    request_id = uuid4()
+    storage_manager.create_workflow(request_id, screen_request, "worker-a", 60)
+    storage_manager.mark_workflow_as_completed(
+        request_id,
+        screen_request,
+        ThematicScreenerResponse(
+            theme_scoring=ThemeScoring(root={}),
+            theme_taxonomy=ThemeTaxonomy(label="Root", node=1, summary=None),
+        ),
+    )
+    request_hash = screen_request.canonical_hash()
+
+    assert (
+        storage_manager.find_cached_report(request_hash, timedelta(hours=1))
+        == request_id
+    )
+    assert storage_manager.find_cached_report(request_hash, timedelta(0)) is None
+    assert storage_manager.find_cached_report("other", timedelta(hours=1)) is None
+
+
+def test_report_records_tuned_search_parameters(storage_manager, screen_request):
+    request_id = uuid4()
+    request = screen_request.model_copy(
+        update={"batch_size": "auto", "document_limit": "auto"}
+    )
+    storage_manager.create_workflow(request_id, request, "worker-a", 60)
+    search_parameters = SearchParameters(
+        batch_size=14, document_limit=140, tuned=True, batch_sizes=[10, 12, 14]
+    )
+    storage_manager.mark_workflow_as_completed(
+        request_id,
+        request,
+        ThematicScreenerResponse(
+            theme_scoring=ThemeScoring(root={}),
+            theme_taxonomy=ThemeTaxonomy(label="Root", node=1, summary=None),
+            search_parameters=search_parameters,
+        ),
+    )
+
+    report = storage_manager.db_session.get(SQLThematicScreenerReport, request_id)
+    assert (report.batch_size, report.document_limit) == (14, 140)
+    assert (
+        storage_manager.get_completed_report(request_id).search_parameters
+        == search_parameters
+    )
+    assert storage_manager.get_request(request_id).batch_size == "auto"
+
+
+def test_extending_workflow(storage_manager, screen_request):
+    base_id, extension_id = uuid4(), uuid4()
+    storage_manager.create_workflow(base_id, screen_request, "worker-a", 60)
+    report = ThematicScreenerResponse(
+        theme_scoring=ThemeScoring(root={}),
+        theme_taxonomy=ThemeTaxonomy(label="Root", node=1, summary=None),
+    )
+    assert storage_manager.get_completed_report(base_id) is None
+    storage_manager.mark_workflow_as_completed(base_id, screen_request, report)
+    extended_request = screen_request.model_copy(update={"end_date": "2099-01-01"})
+    storage_manager.create_workflow(
+        extension_id, extended_request, "worker-a", 60, extends_id=base_id
+    )
+
+    assert storage_manager.get_request(base_id) == screen_request
+    assert storage_manager.get_completed_report(base_id) == report
+    assert storage_manager.get_extends_id(extension_id) == base_id
+    assert storage_manager.get_extends_id(base_id) is None
+    assert storage_manager.get_request(uuid4()) is None
+
+
+def test_batch_workflows(storage_manager, screen_request):
+    batch_id, first, second, other = uuid4(), uuid4(), uuid4(), uuid4()
+    ai_request = screen_request.model_copy(update={"theme": "AI Adoption"})
+    storage_manager.create_workflow(first, screen_request, None, 60, batch_id=batch_id)
+    storage_manager.create_workflow(
+        second, ai_request, "worker-a", 60, batch_id=batch_id
+    )
+    storage_manager.create_workflow(other, screen_request, None, 60)
+
+    assert storage_manager.get_batch_id(first) == batch_id
+    assert storage_manager.get_batch_id(other) is None
+    assert storage_manager.get_batch(uuid4()) is None
+    batch = storage_manager.get_batch(batch_id)
+    assert batch.status == WorkflowStatus.QUEUED
+    assert [report.request_id for report in batch.reports] == [str(second), str(first)]
+
+    # Leased to another worker
+    claimed = storage_manager.claim_batch_workflows(batch_id, "worker-b", 60)
+    assert [request_id for request_id, _ in claimed] == [first]
+    storage_manager.renew_leases([batch_id], "worker-b", -1)
+    claimed = storage_manager.claim_batch_workflows(batch_id, "worker-b", 60)
+    assert [request_id for request_id, _ in claimed] == [first]
+
+    storage_manager.update_status(first, WorkflowStatus.COMPLETED)
+    assert storage_manager.get_batch(batch_id).status == WorkflowStatus.IN_PROGRESS
+    storage_manager.update_status(second, WorkflowStatus.FAILED)
+    assert storage_manager.get_batch(batch_id).status == WorkflowStatus.FAILED
+
+    storage_manager.release_lease(batch_id)
+    assert storage_manager.claim_orphaned_workflows("worker-c", 60) == []
+
+
+def test_followers_share_leader_logs_status_and_report(storage_manager, screen_request):
+    leader_id, follower_id = uuid4(), uuid4()
+    storage_manager.create_workflow(leader_id, screen_request, "worker-a", 60)
+    request_hash = screen_request.canonical_hash()
+    assert storage_manager.find_running_workflow(request_hash) == leader_id
+
+    status = storage_manager.attach_to_workflow(follower_id, screen_request, leader_id)
+    assert status == WorkflowStatus.QUEUED
+    assert storage_manager.get_execution_id(follower_id) == leader_id
+    assert storage_manager.get_execution_id(leader_id) == leader_id
+    # Followers are never leaders, nor resumed on their own
+    assert storage_manager.find_running_workflow(request_hash) == leader_id
+    storage_manager.renew_leases([leader_id], "worker-a", -1)
+    claimed = storage_manager.claim_orphaned_workflows("worker-b", 60)
+    assert [request_id for request_id, _ in claimed] == [leader_id]
+
+    storage_manager.update_status(leader_id, WorkflowStatus.IN_PROGRESS)
+    storage_manager.log_message(leader_id, "message")
+    assert storage_manager.get_status(follower_id) == WorkflowStatus.IN_PROGRESS
+    assert storage_manager.get_logs(follower_id) == ["message"]
+    assert storage_manager.get_last_updated(
+        follower_id
+    ) == storage_manager.get_last_updated(leader_id)
+
+    storage_manager.mark_workflow_as_completed(
+        leader_id,
+        screen_request,
+        ThematicScreenerResponse(
+            theme_scoring=ThemeScoring(root={}),
+            theme_taxonomy=ThemeTaxonomy(label="Root", node=1, summary=None),
+        ),
+    )
+    report = storage_manager.get_report(follower_id)
+    assert report.status == WorkflowStatus.COMPLETED
+    assert report.request_id == str(follower_id)
+    assert report.report is not None
+    # The copy reuses the report stored for the leader instead of encoding it again
+    leader_report = storage_manager._get_workflow_report(leader_id)
+    follower_report = storage_manager._get_workflow_report(follower_id)
+    assert follower_report.report_format == leader_report.report_format
+    assert follower_report.report_blob == leader_report.report_blob
+    assert storage_manager.find_running_workflow(request_hash) is None
+
+
+def test_followers_fail_with_leader(storage_manager, screen_request):
+    leader_id, follower_id = uuid4(), uuid4()
+    storage_manager.create_workflow(leader_id, screen_request, "worker-a", 60)
+    storage_manager.attach_to_workflow(follower_id, screen_request, leader_id)
+
+    storage_manager.update_status(leader_id, WorkflowStatus.FAILED)
+    assert storage_manager.get_status(follower_id) == WorkflowStatus.FAILED
+
+
+def test_requeue_failed_workflow(storage_manager, screen_request):
+    leader_id, follower_id = uuid4(), uuid4()
+    storage_manager.create_workflow(leader_id, screen_request, "worker-a", 60)
+    storage_manager.attach_to_workflow(follower_id, screen_request, leader_id)
+    # Only failed workflows are queued again
+    assert not storage_manager.requeue_workflow(leader_id, "worker-b", 60)
+
+    storage_manager.start_attempt(leader_id)
+    storage_manager.update_status(leader_id, WorkflowStatus.FAILED)
+    storage_manager.release_lease(leader_id)
+    assert storage_manager.requeue_workflow(leader_id, None, 60)
+
+    assert storage_manager.get_status(leader_id) == WorkflowStatus.QUEUED
+    assert storage_manager.get_status(follower_id) == WorkflowStatus.QUEUED
+    assert not storage_manager.requeue_workflow(leader_id, None, 60)
+    claimed = storage_manager.claim_queued_workflows("worker-b", 60)
+    assert [request_id for request_id, _ in claimed] == [leader_id]
+    assert storage_manager.start_attempt(leader_id) == 1
+
+
+def test_taxonomy_cache(storage_manager):
+    tree = {"label": "Root", "node": 1, "summary": "", "children": []}
+    assert (
+        storage_manager.get_cached_taxonomy("Theme", None, "openai::gpt", "1") is None
+    )
+
+    storage_manager.save_taxonomy("Theme", None, "openai::gpt", "1", tree)
+
+    assert (
+        storage_manager.get_cached_taxonomy(" Theme ", "", "openai::gpt", "1") == tree
+    )
+    assert (
+        storage_manager.get_cached_taxonomy("Theme", None, "openai::gpt", "2") is None
+    )
+    assert (
+        storage_manager.get_cached_taxonomy("Theme", "Focus", "openai::gpt", "1")
+        is None
+    )
+    [taxonomy] = storage_manager.list_taxonomies()
+    assert taxonomy.hits == 1
+    assert taxonomy.taxonomy.label == "Root"
+
+
+def test_evict_taxonomies(storage_manager):
+    tree = {"label": "Root", "node": 1, "summary": "", "children": []}
+    storage_manager.save_taxonomy("Theme A", None, "openai::gpt", "1", tree)
+    storage_manager.save_taxonomy("Theme B", None, "openai::gpt", "1", tree)
+    storage_manager.save_taxonomy("Theme B", "Focus", "openai::gpt", "1", tree)
+    taxonomy_a = next(
+        taxonomy
+        for taxonomy in storage_manager.list_taxonomies()
+        if taxonomy.theme == "Theme A"
+    )
+
+    assert storage_manager.evict_taxonomy(taxonomy_a.id)
+    assert not storage_manager.evict_taxonomy(taxonomy_a.id)
+    assert storage_manager.evict_taxonomies(theme="Theme B") == 2
+    assert storage_manager.list_taxonomies() == []
+
+
+def test_labeled_content_pages(storage_manager, screen_request):
+    leader_id, follower_id = uuid4(), uuid4()
+    storage_manager.create_workflow(leader_id, screen_request, "worker-a", 60)
+    storage_manager.attach_to_workflow(follower_id, screen_request, leader_id)
+    chunks = [
+        LabeledChunk(
+            time_period=f"{month} 2025",
+            date=f"2025-0{index + 1}-15",
+            company=company,
+            sector="Technology",
+            industry="Software",
+            country="US",
+            ticker=None,
+            document_id=f"D{index}",
+            headline="Headline",
+            quote="Quote",
+            motivation="Motivation",
+            theme=theme,
+        )
+        for index, (month, company, theme) in enumerate(
+            [
+                ("Jan", "A", "Theme1"),
+                ("Feb", "B", "Theme1"),
+                ("Mar", "A", "Theme2"),
+                ("Apr", "A", "Theme1"),
+            ]
+        )
+    ]
+    storage_manager.mark_workflow_as_completed(
+        leader_id,
+        screen_request,
+        ThematicScreenerResponse(
+            theme_scoring=ThemeScoring(root={}),
+            theme_taxonomy=ThemeTaxonomy(label="Root", node=1, summary=None),
+            content=LabeledContent(root=chunks),
+        ),
+    )
+
+    page = storage_manager.get_labeled_content(leader_id, company=["A"], limit=2)
+    assert page.content == [chunks[0], chunks[2]]
+    page = storage_manager.get_labeled_content(
+        leader_id, company=["A"], cursor=int(page.next_cursor), limit=2
+    )
+    assert page.content == [chunks[3]]
+    assert page.next_cursor is None
+
+    # Followers page through the chunks of their leader
+    page = storage_manager.get_labeled_content(
+        follower_id,
+        theme=["Theme1"],
+        date_from=date(2025, 2, 1),
+        date_to=date(2025, 4, 15),
+    )
+    assert page.request_id == str(follower_id)
+    assert page.content == [chunks[1], chunks[3]]
+    assert storage_manager.get_labeled_content(
+        leader_id, time_period=["Mar 2025"]
+    ).content == [chunks[2]]
+
+    # Reports stored before the chunks had their own table are indexed on first access
+    storage_manager.db_session.exec(delete(SQLLabeledChunk))
+    storage_manager.db_session.commit()
+    assert storage_manager.get_labeled_content(leader_id).content == chunks
+    assert storage_manager.get_labeled_content(uuid4()) is None
+
+    # Exported in batches, followers export the chunks of their leader
+    content_id = storage_manager.get_labeled_content_id(follower_id)
+    assert content_id == leader_id
+    batches = list(storage_manager.iter_labeled_chunks(content_id, batch_size=3))
+    assert [len(batch) for batch in batches] == [3, 1]
+    assert [LabeledChunk(**chunk) for batch in batches for chunk in batch] == chunks
+    assert list(
+        storage_manager.iter_labeled_chunks(content_id, company=["B"], batch_size=3)
+    ) == [[chunks[1].model_dump()]]
+    assert storage_manager.get_labeled_content_id(uuid4()) is None
+
+
+def test_compressed_reports(monkeypatch, storage_manager, screen_request):
+    json_id, gzip_id = uuid4(), uuid4()
+    report = ThematicScreenerResponse(
+        theme_scoring=ThemeScoring(root={}),
+        theme_taxonomy=ThemeTaxonomy(label="Root", node=1, summary=None),
+        content=LabeledContent(
+            root=[
+                LabeledChunk(
+                    time_period="Jan 2025",
+                    date="2025-01-15",
+                    company="A",
+                    sector="Technology",
+                    industry="Software",
+                    country="US",
+                    ticker="A",
+                    document_id="D",
+                    headline="Headline",
+                    quote="Quote",
+                    motivation="Motivation",
+                    theme="Theme",
+                )
+            ]
+        ),
+    )
+    for request_id, compression in ((json_id, "none"), (gzip_id, "gzip")):
+        monkeypatch.setattr(report_format.settings, "REPORT_COMPRESSION", compression)
+        storage_manager.create_workflow(request_id, screen_request, "worker-a", 60)
+        storage_manager.mark_workflow_as_completed(request_id, screen_request, report)
+
+    json_report = storage_manager.db_session.get(SQLThematicScreenerReport, json_id)
+    assert json_report.report_format == report_format.JSON_REPORT_FORMAT
+    assert json_report.report_blob is None
+    gzip_report = storage_manager.db_session.get(SQLThematicScreenerReport, gzip_id)
+    assert gzip_report.report_format == report_format.GZIP_REPORT_FORMAT
+    assert gzip_report.screener_report is None
+    for request_id in (json_id, gzip_id):
+        assert storage_manager.get_completed_report(request_id) == report
+        assert storage_manager.get_report(request_id).report == report
+        assert (
+            ThematicScreenerResponse.model_validate_json(
+                storage_manager.get_report_json(request_id)
+            )
+            == report
+        )
+
+    engine = storage_manager.db_session.get_bind()
+    assert migrate_reports(engine, report_format.GZIP_REPORT_FORMAT) == 1
+    assert migrate_reports(engine, report_format.GZIP_REPORT_FORMAT) == 0
+    storage_manager.db_session.expire_all()
+    assert json_report.report_format == report_format.GZIP_REPORT_FORMAT
+    assert storage_manager.get_completed_report(json_id) == report
+    assert migrate_reports(engine, report_format.JSON_REPORT_FORMAT) == 2
+    storage_manager.db_session.expire_all()
+    assert gzip_report.screener_report is not None
+    assert storage_manager.get_completed_report(gzip_id) == report
+
+    # zstd is optional
+    monkeypatch.setattr(report_format, "ZSTD_AVAILABLE", False)
+    assert report_format.get_report_format("zstd") == report_format.GZIP_REPORT_FORMAT
+
+
+def test_get_report_json_of_untagged_report(storage_manager, screen_request):
+    request_id = uuid4()
+    assert storage_manager.get_report_json(request_id) is None
+    storage_manager.create_workflow(request_id, screen_request, "worker-a", 60)
+    storage_manager.mark_workflow_as_completed(
+        request_id,
+        screen_request,
+        ThematicScreenerResponse(
+            theme_scoring=ThemeScoring(root={}),
+            theme_taxonomy=ThemeTaxonomy(label="Root", node=1, summary=None),
+        ),
+    )
+    # Reports stored before they were tagged with their format are not trusted as is
+    sql_report = storage_manager.db_session.get(SQLThematicScreenerReport, request_id)
+    sql_report.store_report(sql_report.load_report(), report_format.JSON_REPORT_FORMAT)
+    assert storage_manager.get_report_json(request_id) is not None
+    sql_report.report_format = None
+    storage_manager.db_session.commit()
+    assert storage_manager.get_report_json(request_id) is None
+    assert storage_manager.get_report(request_id).report is not None
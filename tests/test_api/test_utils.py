@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from bigdata_thematic_screener.api import utils
+from bigdata_thematic_screener.api.utils import (
+    compute_etag,
+    dumps_with_raw_json,
+    etag_matches,
+)
+
+
+def test_compute_etag_is_stable():
+    assert compute_etag("a", 1, True) == compute_etag("a", 1, True)
+    assert compute_etag("a", 1, True) != compute_etag("a", 2, True)
+    assert compute_etag("a").startswith('"') and compute_etag("a").endswith('"')
+
+
+@pytest.mark.parametrize(
+    "if_none_match,expected",
+    [
+        (None, False),
+        ('"other"', False),
+        ('"etag"', True),
+        ('"other", "etag"', True),
+        ("*", True),
+    ],
+)
+def test_etag_matches(if_none_match, expected):
+    assert etag_matches('"etag"', if_none_match) is expected
+
+
+@pytest.mark.parametrize(
+    "orjson_available",
+    [
+        False,
+        pytest.param(
+            True,
+            marks=pytest.mark.skipif(
+                not utils.ORJSON_AVAILABLE, reason="orjson is not installed"
+            ),
+        ),
+    ],
+)
+def test_dumps_with_raw_json(monkeypatch, orjson_available):
+    monkeypatch.setattr(utils, "ORJSON_AVAILABLE", orjson_available)
+    raw_json = b'{"a": [1, 2]}'
+    encoded = dumps_with_raw_json({"status": "é", "report": None}, "report", raw_json)
+    assert json.loads(encoded) == {"status": "é", "report": {"a": [1, 2]}}
+    assert json.loads(dumps_with_raw_json({}, "report", b"null")) == {"report": None}
@@ -1,14 +1,118 @@
+import json
+from threading import Timer
+from unittest.mock import MagicMock
+from uuid import UUID, uuid4
+
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
 
+from bigdata_thematic_screener.api import app as app_module
 from bigdata_thematic_screener.api.app import app
+from bigdata_thematic_screener.api.models import (
+    DocumentType,
+    FrequencyEnum,
+    ThematicScreenRequest,
+    WorkflowStatus,
+)
+from bigdata_thematic_screener.api.storage import StorageManager
+from bigdata_thematic_screener.checkpoints import get_workflow_checkpoints
+from bigdata_thematic_screener.models import (
+    LabeledChunk,
+    LabeledContent,
+    ThematicScreenerResponse,
+    ThemeScoring,
+    ThemeTaxonomy,
+)
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(app_module, "engine", engine)
+    return engine
+
+
+@pytest.fixture
+def storage_manager(engine):
+    with Session(engine) as session:
+        yield StorageManager(session)
 
 
 @pytest.fixture
-def client():
+def client(engine):
     return TestClient(app)
 
 
+@pytest.fixture
+def screen_request():
+    return ThematicScreenRequest(
+        theme="Supply Chain Reshaping",
+        companies=["4A6F00", "D8442A"],
+        start_date="2025-01-01",
+        end_date="2025-12-31",
+        fiscal_year=2025,
+        document_type=DocumentType.TRANSCRIPTS,
+        frequency=FrequencyEnum.monthly,
+    )
+
+
+@pytest.fixture
+def labeled_report():
+    chunks = [
+        LabeledChunk(
+            time_period=f"{month} 2025",
+            date=f"2025-0{index + 1}-15",
+            company=company,
+            sector="Technology",
+            industry="Software",
+            country="US",
+            ticker=None,
+            document_id=f"D{index}",
+            headline="Headline",
+            quote="Quote",
+            motivation="Motivation",
+            theme=theme,
+        )
+        for index, (month, company, theme) in enumerate(
+            [
+                ("Jan", "A", "Theme1"),
+                ("Feb", "B", "Theme1"),
+                ("Mar", "A", "Theme2"),
+                ("Apr", "A", "Theme1"),
+            ]
+        )
+    ]
+    return ThematicScreenerResponse(
+        theme_scoring=ThemeScoring(root={}),
+        theme_taxonomy=ThemeTaxonomy(label="Root", node=1, summary=None),
+        content=LabeledContent(root=chunks),
+    )
+
+
+def complete_workflow(storage_manager, screen_request, report=None):
+    request_id = uuid4()
+    storage_manager.create_workflow(request_id, screen_request, "worker-a", 60)
+    storage_manager.log_message(request_id, "Started")
+    storage_manager.log_message(request_id, "Done")
+    storage_manager.mark_workflow_as_completed(
+        request_id,
+        screen_request,
+        report
+        or ThematicScreenerResponse(
+            theme_scoring=ThemeScoring(root={}),
+            theme_taxonomy=ThemeTaxonomy(label="Root", node=1, summary=None),
+        ),
+    )
+    return request_id
+
+
 def test_health_check(client):
     response = client.get("/health")
     assert response.status_code == 200
@@ -17,3 +121,299 @@ def test_health_check(client):
     assert data["status"] == "ok"
     assert "version" in data
     assert isinstance(data["version"], str)
+
+
+def test_status(client, storage_manager, screen_request):
+    request_id = complete_workflow(storage_manager, screen_request)
+
+    response = client.get(f"/status/{request_id}")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == WorkflowStatus.COMPLETED
+    assert data["logs"] == ["Started", "Done"]
+    assert data["last_log_seq"] == 2
+    assert data["report"]["theme_taxonomy"]["label"] == "Root"
+
+    response = client.get(
+        f"/status/{request_id}", params={"logs_since": 1, "include_report": False}
+    )
+    data = response.json()
+    assert data["logs"] == ["Done"]
+    assert data["report"] is None
+
+    assert client.get(f"/status/{uuid4()}").status_code == 404
+
+
+def test_status_etag(client, storage_manager, screen_request):
+    request_id = uuid4()
+    storage_manager.create_workflow(request_id, screen_request, "worker-a", 60)
+    response = client.get(f"/status/{request_id}")
+    etag = response.headers["ETag"]
+
+    response = client.get(f"/status/{request_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # The ETag changes with the workflow
+    storage_manager.log_message(request_id, "Started")
+    response = client.get(f"/status/{request_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["logs"] == ["Started"]
+
+
+def test_status_etag_of_follower(client, storage_manager, screen_request):
+    leader_id, follower_id = uuid4(), uuid4()
+    storage_manager.create_workflow(leader_id, screen_request, "worker-a", 60)
+    storage_manager.attach_to_workflow(follower_id, screen_request, leader_id)
+    storage_manager.log_message(leader_id, "Started")
+    response = client.get(f"/status/{follower_id}")
+    etag = response.headers["ETag"]
+    assert response.json()["logs"] == ["Started"]
+
+    response = client.get(f"/status/{follower_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    # Follows the updates of the leader
+    storage_manager.log_message(leader_id, "Searching")
+    response = client.get(f"/status/{follower_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["last_updated"] == (
+        storage_manager.get_last_updated(leader_id).isoformat()
+    )
+    response = client.get(
+        f"/status/{follower_id}", headers={"If-None-Match": response.headers["ETag"]}
+    )
+    assert response.status_code == 304
+
+
+def test_status_queue(client, storage_manager, screen_request):
+    request_id = uuid4()
+    storage_manager.create_workflow(request_id, screen_request, None, 60)
+    response = client.get(f"/status/{request_id}")
+    data = response.json()
+    assert (data["queue_position"], data["queue_depth"]) == (1, 1)
+    etag = response.headers["ETag"]
+
+    # The ETag changes with the queue depth
+    storage_manager.create_workflow(
+        uuid4(), screen_request.model_copy(update={"focus": "x"}), None, 60
+    )
+    response = client.get(f"/status/{request_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["queue_position"], data["queue_depth"]) == (1, 2)
+
+    # Completed reports have no queue fields, including their cached bodies
+    completed_id = complete_workflow(storage_manager, screen_request)
+    for _ in range(2):
+        data = client.get(f"/status/{completed_id}").json()
+        assert (data["queue_position"], data["queue_depth"]) == (None, None)
+        storage_manager.create_workflow(
+            uuid4(), screen_request.model_copy(update={"focus": "y"}), None, 60
+        )
+
+
+def test_status_etag_per_encoding(client, storage_manager, screen_request):
+    request_id = complete_workflow(storage_manager, screen_request)
+    identity = client.get(
+        f"/status/{request_id}", headers={"Accept-Encoding": "identity"}
+    )
+    gzip = client.get(f"/status/{request_id}", headers={"Accept-Encoding": "gzip"})
+    assert identity.json() == gzip.json()
+    assert identity.headers["ETag"] != gzip.headers["ETag"]
+
+    response = client.get(
+        f"/status/{request_id}",
+        headers={"Accept-Encoding": "gzip", "If-None-Match": identity.headers["ETag"]},
+    )
+    assert response.status_code == 200
+    response = client.get(
+        f"/status/{request_id}",
+        headers={"Accept-Encoding": "gzip", "If-None-Match": gzip.headers["ETag"]},
+    )
+    assert response.status_code == 304
+
+
+def test_status_events(client, storage_manager, screen_request):
+    request_id = complete_workflow(storage_manager, screen_request)
+
+    response = client.get(f"/status/{request_id}/events", params={"logs_since": 1})
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/event-stream")
+    events = [
+        dict(line.split(": ", 1) for line in event.splitlines())
+        for event in response.text.split("\n\n")
+        if event
+    ]
+    assert events == [
+        {"id": "2", "event": "log", "data": "Done"},
+        {"event": "status", "data": "completed"},
+        {"event": "completed", "data": str(request_id)},
+    ]
+
+    assert client.get(f"/status/{uuid4()}/events").status_code == 404
+
+
+def test_report_content(client, storage_manager, screen_request, labeled_report):
+    request_id = complete_workflow(storage_manager, screen_request, labeled_report)
+    chunks = labeled_report.model_dump(mode="json")["content"]
+
+    response = client.get(f"/reports/{request_id}/content", params={"limit": 3})
+    assert response.status_code == 200
+    page = response.json()
+    assert page["request_id"] == str(request_id)
+    assert page["content"] == chunks[:3]
+    response = client.get(
+        f"/reports/{request_id}/content",
+        params={"limit": 3, "cursor": page["next_cursor"]},
+    )
+    page = response.json()
+    assert page["content"] == chunks[3:]
+    assert page["next_cursor"] is None
+
+    response = client.get(
+        f"/reports/{request_id}/content",
+        params={"company": "A", "theme": "Theme1", "date_from": "2025-02-01"},
+    )
+    assert response.json()["content"] == [chunks[3]]
+    response = client.get(
+        f"/reports/{request_id}/content", params={"period": ["Jan 2025", "Mar 2025"]}
+    )
+    assert response.json()["content"] == [chunks[0], chunks[2]]
+
+    response = client.get(f"/reports/{request_id}/content", params={"cursor": "x"})
+    assert response.status_code == 422
+    response = client.get(f"/reports/{request_id}/content", params={"limit": 0})
+    assert response.status_code == 422
+    assert client.get(f"/reports/{uuid4()}/content").status_code == 404
+
+
+def test_report_content_ndjson(client, storage_manager, screen_request, labeled_report):
+    request_id = complete_workflow(storage_manager, screen_request, labeled_report)
+    chunks = labeled_report.model_dump(mode="json")["content"]
+
+    response = client.get(f"/reports/{request_id}/content.ndjson")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("application/x-ndjson")
+    assert response.text.endswith("\n")
+    assert [json.loads(line) for line in response.text.splitlines()] == chunks
+
+    response = client.get(
+        f"/reports/{request_id}/content.ndjson",
+        params={"company": "A", "theme": "Theme1"},
+    )
+    assert [json.loads(line) for line in response.text.splitlines()] == [
+        chunks[0],
+        chunks[3],
+    ]
+    response = client.get(
+        f"/reports/{request_id}/content.ndjson", params={"company": "C"}
+    )
+    assert response.status_code == 200
+    assert response.text == ""
+
+    assert client.get(f"/reports/{uuid4()}/content.ndjson").status_code == 404
+
+
+def test_screen_companies_queue_full(monkeypatch, client, screen_request):
+    body = screen_request.model_dump(mode="json")
+    monkeypatch.setattr(app_module.settings, "MAX_QUEUED_WORKFLOWS", 1)
+    monkeypatch.setattr(app_module.settings, "QUEUE_RETRY_AFTER_SECONDS", 30)
+    assert client.post("/thematic-screener", json=body).status_code == 202
+
+    # Queued for the workers sharing the database
+    response = client.post("/thematic-screener", json={**body, "focus": "x"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "30"
+
+    # Queued for the scheduler of this process
+    monkeypatch.setattr(app_module, "WORKER", MagicMock(worker_id="worker-a"))
+    monkeypatch.setattr(app_module.scheduler, "is_full", lambda: True)
+    response = client.post("/thematic-screener", json={**body, "focus": "y"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "30"
+
+
+def test_extend_report(client, storage_manager, screen_request):
+    request_id = complete_workflow(storage_manager, screen_request)
+
+    response = client.post(
+        f"/thematic-screener/{request_id}/extend", json={"end_date": "2026-03-31"}
+    )
+    assert response.status_code == 202
+    extension_id = UUID(response.json()["request_id"])
+    extension = storage_manager.get_request(extension_id)
+    assert extension.end_date == "2026-03-31"
+    assert extension.start_date == screen_request.start_date
+    assert extension.theme == screen_request.theme
+
+    response = client.post(
+        f"/thematic-screener/{request_id}/extend", json={"end_date": "2025-06-30"}
+    )
+    assert response.status_code == 422
+    response = client.post(
+        f"/thematic-screener/{request_id}/extend", json={"end_date": "2026-02-30"}
+    )
+    assert response.status_code == 422
+    # Only completed reports can be extended
+    response = client.post(
+        f"/thematic-screener/{extension_id}/extend", json={"end_date": "2026-06-30"}
+    )
+    assert response.status_code == 409
+    response = client.post(
+        f"/thematic-screener/{uuid4()}/extend", json={"end_date": "2026-06-30"}
+    )
+    assert response.status_code == 404
+
+
+def test_retry_workflow(monkeypatch, tmp_path, client, storage_manager, screen_request):
+    monkeypatch.setattr(app_module.settings, "CHECKPOINT_DIR", str(tmp_path))
+    request_id = uuid4()
+    storage_manager.create_workflow(request_id, screen_request, "worker-a", 60)
+    get_workflow_checkpoints(request_id).save_json("taxonomy", {"label": "Root"})
+    storage_manager.update_status(request_id, WorkflowStatus.FAILED)
+
+    response = client.post(f"/status/{request_id}/retry")
+    assert response.status_code == 202
+    assert response.json()["status"] == WorkflowStatus.QUEUED
+    assert storage_manager.get_status(request_id) == WorkflowStatus.QUEUED
+    assert storage_manager.get_logs(request_id) == [
+        "Retrying workflow, resuming after stages: taxonomy"
+    ]
+
+    # Only failed workflows can be retried
+    assert client.post(f"/status/{request_id}/retry").status_code == 409
+    assert client.post(f"/status/{uuid4()}/retry").status_code == 404
+
+
+def test_status_events_of_workflow_run_by_another_process(
+    monkeypatch, client, engine, screen_request
+):
+    # API-only node: workflows are queued for the workers sharing the database
+    monkeypatch.setattr(app_module.settings, "EVENTS_POLL_INTERVAL_SECONDS", 0.05)
+    response = client.post("/thematic-screener", json=screen_request.model_dump())
+    request_id = UUID(response.json()["request_id"])
+
+    def run_in_worker():
+        with Session(engine) as session:
+            worker_storage_manager = StorageManager(session)
+            worker_storage_manager.update_status(request_id, WorkflowStatus.IN_PROGRESS)
+            worker_storage_manager.log_message(request_id, "Started")
+            worker_storage_manager.mark_workflow_as_completed(
+                request_id,
+                screen_request,
+                ThematicScreenerResponse(
+                    theme_scoring=ThemeScoring(root={}),
+                    theme_taxonomy=ThemeTaxonomy(label="Root", node=1, summary=None),
+                ),
+            )
+
+    worker = Timer(0.2, run_in_worker)
+    worker.start()
+    response = client.get(f"/status/{request_id}/events")
+    worker.join()
+
+    assert "event: log\ndata: Started" in response.text
+    assert response.text.endswith(f"event: completed\ndata: {request_id}\n\n")
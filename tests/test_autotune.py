@@ -0,0 +1,40 @@
+from bigdata_thematic_screener.autotune import (
+    BatchSizeTuner,
+    SearchStats,
+    current_search_stats,
+    track_searches,
+)
+
+
+def stats(latencies: list[float], failures: int = 0) -> SearchStats:
+    search_stats = SearchStats()
+    for index, latency in enumerate(latencies):
+        search_stats.record(latency, failed=index < failures)
+    return search_stats
+
+
+def test_tuner_increases_additively_and_decreases_multiplicatively():
+    tuner = BatchSizeTuner(initial=10, minimum=2, maximum=15, target_latency=5)
+
+    assert tuner.update(stats([1, 2])) == 12
+    assert tuner.update(stats([1, 2])) == 14
+    assert tuner.update(stats([1, 2])) == 15
+    # Slow queries
+    assert tuner.update(stats([8, 4])) == 7
+    # Failed queries, even if fast
+    assert tuner.update(stats([1, 1], failures=1)) == 3
+    assert tuner.update(stats([1], failures=1)) == 2
+    # Nothing searched
+    assert tuner.update(stats([])) == 2
+    assert tuner.history == [10, 12, 14, 15, 7, 3, 2]
+
+
+def test_track_searches():
+    assert current_search_stats.get() is None
+    with track_searches() as search_stats:
+        current_search_stats.get().record(2, failed=False)
+        current_search_stats.get().record(4, failed=True)
+    assert current_search_stats.get() is None
+    assert search_stats.queries == 2
+    assert search_stats.failures == 1
+    assert search_stats.mean_latency == 3
@@ -0,0 +1,78 @@
+from bigdata_thematic_screener.cache import (
+    CacheStats,
+    DiskCache,
+    TTLCache,
+    all_cache_stats,
+    get_cache_stats,
+)
+
+
+def test_cache_stats():
+    stats = CacheStats()
+    assert stats.hit_ratio == 0.0
+
+    stats.record_hit()
+    stats.record_hit()
+    stats.record_hit()
+    stats.record_miss()
+    assert stats.to_dict() == {"hits": 3, "misses": 1, "hit_ratio": 0.75}
+
+
+def test_cache_stats_registry():
+    stats = get_cache_stats("test-registry")
+    assert get_cache_stats("test-registry") is stats
+
+    stats.record_miss()
+    assert all_cache_stats()["test-registry"]["misses"] == 1
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(max_entries=2, ttl_seconds=-1)
+    cache.set("a", 1)
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_disk_cache_persists_values(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = DiskCache(path)
+    cache.set("a", b"value")
+    cache.close()
+
+    cache = DiskCache(path)
+    assert cache.get("a") == b"value"
+    assert cache.get("b") is None
+
+
+def test_disk_cache_expires_entries(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.db"), ttl_seconds=-1)
+    cache.set("a", b"value")
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.db"), max_bytes=10)
+    cache.set("a", b"12345")
+    cache.set("b", b"12345")
+    assert cache.get("a") == b"12345"
+    cache.set("c", b"12345")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"12345"
+    assert cache.size_bytes() == 10
@@ -0,0 +1,92 @@
+import os
+import time
+from uuid import uuid4
+
+import pandas as pd
+from bigdata_client.models.entities import Company
+
+from bigdata_thematic_screener import checkpoints
+from bigdata_thematic_screener.checkpoints import (
+    WorkflowCheckpoints,
+    get_expired_checkpoints,
+    get_workflow_checkpoints,
+)
+
+
+def make_company(entity_id: str) -> Company:
+    return Company(
+        id=entity_id,
+        name=f"Company {entity_id}",
+        volume=None,
+        description=None,
+        entity_type="COMP",
+        company_type=None,
+        country="US",
+        sector=None,
+        industry_group=None,
+        industry=None,
+        ticker=None,
+        webpage=None,
+        isin_values=[],
+        cusip_values=[],
+        sedol_values=[],
+        listing_values=[],
+    )
+
+
+def test_checkpoints_round_trip(tmp_path, monkeypatch):
+    # Without pyarrow, frames are stored as compressed pickles
+    monkeypatch.setattr(checkpoints, "PARQUET_AVAILABLE", False)
+    workflow_checkpoints = WorkflowCheckpoints(str(tmp_path), uuid4())
+    assert workflow_checkpoints.completed_stages() == []
+    assert workflow_checkpoints.load_frame("chunks") is None
+    assert workflow_checkpoints.load_companies() is None
+
+    df = pd.DataFrame(
+        {"Company": ["A", "B"], "Date": pd.to_datetime(["2025-01-01"] * 2)}
+    )
+    workflow_checkpoints.save_frame("chunks_1", df)
+    workflow_checkpoints.save_frame("labeled", df.iloc[0:0])
+    workflow_checkpoints.save_companies([make_company("A")])
+    workflow_checkpoints.save_json("taxonomy", {"label": "Theme"})
+
+    pd.testing.assert_frame_equal(workflow_checkpoints.load_frame("chunks_1"), df)
+    assert workflow_checkpoints.load_frame("labeled").empty
+    assert workflow_checkpoints.load_companies() == [make_company("A")]
+    assert workflow_checkpoints.load_json("taxonomy") == {"label": "Theme"}
+    assert workflow_checkpoints.completed_stages() == [
+        "companies",
+        "taxonomy",
+        "chunks",
+        "labeled",
+    ]
+    # No temporary files are left behind
+    assert not [
+        path
+        for path in workflow_checkpoints.path.iterdir()
+        if path.name.startswith(".")
+    ]
+
+    workflow_checkpoints.clear()
+    assert workflow_checkpoints.completed_stages() == []
+
+
+def test_expired_checkpoints(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoints.settings, "CHECKPOINT_DIR", str(tmp_path))
+    old_request_id, new_request_id = uuid4(), uuid4()
+    for request_id in (old_request_id, new_request_id):
+        get_workflow_checkpoints(request_id).save_json("taxonomy", {"label": "Theme"})
+    updated_at = time.time() - 3600
+    os.utime(tmp_path / str(old_request_id), (updated_at, updated_at))
+    (tmp_path / "other").mkdir()
+
+    expired = get_expired_checkpoints(600)
+
+    assert [request_id for request_id, _ in expired] == [old_request_id]
+    assert expired[0][1].updated_at() == updated_at
+
+
+def test_checkpoints_disabled(monkeypatch):
+    monkeypatch.setattr(checkpoints.settings, "CHECKPOINT_DIR", None)
+    assert get_workflow_checkpoints(uuid4()) is None
+    assert get_expired_checkpoints(0) == []
@@ -0,0 +1,133 @@
+import asyncio
+import importlib
+
+import pytest
+
+from bigdata_thematic_screener import llm_cache
+from bigdata_thematic_screener.llm_cache import (
+    AsyncCachedResponses,
+    CachedAsyncLLMEngine,
+    CachedLLMEngine,
+    CachedResponses,
+    LLMResponseCache,
+    install_llm_response_cache,
+)
+
+
+class StubLLMEngine:
+    """Answers offline with a response derived from the prompt, counting the calls."""
+
+    model = "stub-model"
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_response(self, chat_history: list[dict[str, str]], **kwargs) -> str:
+        self.calls += 1
+        return f"Response to {chat_history[-1]['content']}"
+
+
+class AsyncStubLLMEngine(StubLLMEngine):
+    async def get_response(self, chat_history: list[dict[str, str]], **kwargs) -> str:
+        return StubLLMEngine.get_response(self, chat_history, **kwargs)
+
+
+class CachedStubLLMEngine(CachedResponses, StubLLMEngine):
+    pass
+
+
+class CachedAsyncStubLLMEngine(AsyncCachedResponses, AsyncStubLLMEngine):
+    pass
+
+
+def prompt(content: str) -> list[dict[str, str]]:
+    return [
+        {"role": "system", "content": "Label the text"},
+        {"role": "user", "content": content},
+    ]
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = LLMResponseCache(str(tmp_path / "llm.db"))
+    monkeypatch.setattr(llm_cache, "response_cache", cache)
+    return cache
+
+
+def test_cached_engine_reuses_identical_calls(cache):
+    engine = CachedStubLLMEngine()
+
+    first = engine.get_response(prompt("text 1"), temperature=0)
+    second = engine.get_response(prompt("text 1"), temperature=0)
+
+    assert first == second == "Response to text 1"
+    assert engine.calls == 1
+
+
+def test_cached_engine_keys_on_prompt_and_parameters(cache):
+    engine = CachedStubLLMEngine()
+
+    engine.get_response(prompt("text 1"), temperature=0)
+    engine.get_response(prompt("text 2"), temperature=0)
+    engine.get_response(prompt("text 1"), temperature=1)
+
+    assert engine.calls == 3
+
+
+def test_cached_engine_is_shared_across_instances(cache):
+    CachedStubLLMEngine().get_response(prompt("text 1"))
+    engine = CachedStubLLMEngine()
+    engine.get_response(prompt("text 1"))
+
+    assert engine.calls == 0
+
+
+def test_async_cached_engine(cache):
+    engine = CachedAsyncStubLLMEngine()
+
+    async def run():
+        return await asyncio.gather(
+            engine.get_response(prompt("text 1")),
+            engine.get_response(prompt("text 2")),
+        )
+
+    assert asyncio.run(run()) == ["Response to text 1", "Response to text 2"]
+    assert asyncio.run(run()) == ["Response to text 1", "Response to text 2"]
+    assert engine.calls == 2
+
+
+def test_cached_engine_without_cache(monkeypatch):
+    monkeypatch.setattr(llm_cache, "response_cache", None)
+    engine = CachedStubLLMEngine()
+
+    engine.get_response(prompt("text 1"))
+    engine.get_response(prompt("text 1"))
+
+    assert engine.calls == 2
+
+
+def test_response_cache_is_size_bounded(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm.db"), max_bytes=100)
+    for i in range(10):
+        cache.set("model", prompt(f"text {i}"), {}, "x" * 30)
+
+    assert cache.store.size_bytes() <= 100
+    assert cache.get("model", prompt("text 9"), {}) == "x" * 30
+    assert cache.get("model", prompt("text 0"), {}) is None
+
+
+def test_install_llm_response_cache(tmp_path, monkeypatch):
+    for module_name in llm_cache.ENGINE_MODULES:
+        module = importlib.import_module(module_name)
+        for name in ("LLMEngine", "AsyncLLMEngine"):
+            if hasattr(module, name):
+                monkeypatch.setattr(module, name, getattr(module, name))
+    monkeypatch.setattr(llm_cache, "response_cache", None)
+    cache = LLMResponseCache(str(tmp_path / "llm.db"))
+
+    install_llm_response_cache(cache)
+
+    assert llm_cache.response_cache is cache
+    labeler = importlib.import_module("bigdata_research_tools.labeler.labeler")
+    assert labeler.LLMEngine is CachedLLMEngine
+    assert labeler.AsyncLLMEngine is CachedAsyncLLMEngine
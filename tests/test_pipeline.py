@@ -0,0 +1,427 @@
+from unittest.mock import MagicMock
+from uuid import uuid4
+
+import pandas as pd
+import pytest
+from bigdata_client.models.search import DocumentType
+from bigdata_research_tools.tracing import WorkflowStatus
+
+from bigdata_thematic_screener import pipeline
+from bigdata_thematic_screener.autotune import AUTO, current_search_stats
+from bigdata_thematic_screener.checkpoints import WorkflowCheckpoints
+from bigdata_thematic_screener.models import SearchParameters
+from bigdata_thematic_screener.pipeline import ThematicScreenerPipeline
+from bigdata_thematic_screener.retrieval import RetrievalCache
+from bigdata_thematic_screener.service import SemanticTree
+
+
+@pytest.fixture
+def theme_tree():
+    return SemanticTree.from_dict(
+        {
+            "label": "Theme",
+            "node": 1,
+            "summary": "Theme summary",
+            "children": [
+                {"label": "Sub-theme", "node": 2, "summary": "Sub-theme summary"}
+            ],
+        }
+    )
+
+
+@pytest.fixture
+def stages(monkeypatch, theme_tree):
+    stages = MagicMock()
+    stages.generate_theme_tree.return_value = theme_tree
+    stages.search_by_companies.return_value = pd.DataFrame({"masked_text": ["A quote"]})
+    stages.ScreenerLabeler.return_value.get_labels.return_value = pd.DataFrame(
+        {"Theme": ["Sub-theme"]}
+    )
+    stages.ScreenerLabeler.return_value.post_process_dataframe.side_effect = lambda df: (
+        df.assign(Company="A", Ticker="T1", Industry="I1")
+    )
+    stages.get_scored_df.return_value = pd.DataFrame({"Company": ["A"]})
+    stages.Motivation.return_value.generate_company_motivations.return_value = (
+        pd.DataFrame({"Company": ["A"], "Motivation": ["Growth"]})
+    )
+    for name in (
+        "generate_theme_tree",
+        "search_by_companies",
+        "ScreenerLabeler",
+        "get_scored_df",
+        "Motivation",
+    ):
+        monkeypatch.setattr(pipeline, name, getattr(stages, name))
+    return stages
+
+
+def make_pipeline(
+    theme_tree=None, retrieval_cache=None, companies=None, checkpoints=None
+) -> ThematicScreenerPipeline:
+    return ThematicScreenerPipeline(
+        bigdata=MagicMock(),
+        theme_tree=theme_tree,
+        retrieval_cache=retrieval_cache,
+        checkpoints=checkpoints,
+        llm_model="openai::gpt-4o-mini",
+        main_theme="Theme",
+        focus="",
+        companies=companies or [MagicMock()],
+        start_date="2025-01-01",
+        end_date="2025-12-31",
+        document_type=DocumentType.TRANSCRIPTS,
+    )
+
+
+def test_pipeline_generates_theme_tree(stages, theme_tree):
+    results = make_pipeline().screen_companies(frequency="M")
+
+    stages.generate_theme_tree.assert_called_once()
+    assert results["theme_tree"] is theme_tree
+    assert results["df_motivation"]["Motivation"].tolist() == ["Growth"]
+    assert stages.search_by_companies.call_args.kwargs["sentences"] == [
+        "Sub-theme summary"
+    ]
+
+
+def test_pipeline_sends_workflow_trace(stages, monkeypatch):
+    send_workflow_trace = MagicMock()
+    monkeypatch.setattr(pipeline, "send_workflow_trace", send_workflow_trace)
+    screener = make_pipeline()
+
+    screener.screen_companies(frequency="M")
+    stages.search_by_companies.side_effect = RuntimeError("Search failed")
+    with pytest.raises(RuntimeError):
+        screener.screen_companies(frequency="M")
+
+    traces = [call.args[1] for call in send_workflow_trace.call_args_list]
+    assert [trace.status for trace in traces] == [
+        WorkflowStatus.SUCCESS,
+        WorkflowStatus.FAILED,
+    ]
+    assert traces[0].name == "ThematicScreener"
+    assert traces[0].llm_model == "openai::gpt-4o-mini"
+    assert send_workflow_trace.call_args.args[0] is screener.bigdata
+
+
+def test_pipeline_reuses_theme_tree(stages, theme_tree):
+    results = make_pipeline(theme_tree=theme_tree).screen_companies(frequency="M")
+
+    stages.generate_theme_tree.assert_not_called()
+    assert results["theme_tree"] is theme_tree
+
+
+def test_pipeline_without_relevant_content(stages):
+    stages.ScreenerLabeler.return_value.post_process_dataframe.side_effect = lambda df: (
+        df.iloc[0:0]
+    )
+
+    results = make_pipeline().screen_companies(frequency="M")
+
+    assert results["df_company"].empty
+    stages.Motivation.assert_not_called()
+
+
+def test_pipeline_searches_only_queries_missing_from_retrieval_cache(stages, tmp_path):
+    def search_by_companies(companies, sentences, **kwargs):
+        # A chunk found by every sentence, and one found by this sentence only
+        return pd.DataFrame(
+            [
+                {
+                    "entity_id": company.id,
+                    "document_id": f"{company.id}-{source}",
+                    "sentence_id": f"{company.id}-{source}-1",
+                    "masked_text": f"{source} quote of {company.id}",
+                }
+                for company in companies
+                for source in ("Shared", sentences[0])
+            ]
+        )
+
+    stages.search_by_companies.side_effect = search_by_companies
+    cache = RetrievalCache(str(tmp_path / "retrieval.db"), ttl_seconds=60)
+    company_a, company_b = MagicMock(id="A"), MagicMock(id="B")
+
+    first = make_pipeline(retrieval_cache=cache, companies=[company_a])
+    first.search_sentences(
+        ["S1", "S2"], document_limit=10, batch_size=10, frequency="M"
+    )
+    stages.search_by_companies.reset_mock()
+    # Another theme sharing a sentence
+    second = make_pipeline(retrieval_cache=cache, companies=[company_b, company_a])
+    df_sentences = second.search_sentences(
+        ["S2", "S3"], document_limit=10, batch_size=10, frequency="M"
+    )
+
+    assert df_sentences["masked_text"].tolist() == [
+        "Shared quote of B",
+        "S2 quote of B",
+        "S3 quote of B",
+        "Shared quote of A",
+        "S2 quote of A",
+        "S3 quote of A",
+    ]
+    assert df_sentences.index.tolist() == list(range(6))
+    searched = {
+        (tuple(call.kwargs["sentences"]), tuple(c.id for c in call.kwargs["companies"]))
+        for call in stages.search_by_companies.call_args_list
+    }
+    assert searched == {(("S2",), ("B",)), (("S3",), ("B", "A"))}
+
+    # Results depend on the batch size
+    stages.search_by_companies.reset_mock()
+    second.search_sentences(["S2"], document_limit=10, batch_size=5, frequency="M")
+    assert stages.search_by_companies.call_count == 1
+
+
+def test_pipeline_searches_themes_like_standalone_screens(stages):
+    def search_by_companies(companies, sentences, **kwargs):
+        # A chunk found by every sentence, and one per sentence
+        return pd.DataFrame(
+            [
+                {
+                    "entity_id": company.id,
+                    "document_id": f"{company.id}-{source}",
+                    "sentence_id": f"{company.id}-{source}-1",
+                    "masked_text": f"{source} quote of {company.id}",
+                }
+                for company in companies
+                for source in ("Shared", *sentences)
+            ]
+        )
+
+    stages.search_by_companies.side_effect = search_by_companies
+    companies = [MagicMock(id="A"), MagicMock(id="B")]
+    theme_sentences = [["S1", "S2"], ["S2", "S3"]]
+    standalone = [
+        make_pipeline(companies=companies).search_sentences(
+            sentences, document_limit=10, batch_size=10, frequency="M"
+        )
+        for sentences in theme_sentences
+    ]
+    stages.search_by_companies.reset_mock()
+
+    batched = make_pipeline(companies=companies).search_themes(
+        theme_sentences, document_limit=10, batch_size=10, frequency="M"
+    )
+
+    # Each theme only gets the chunks of its own sentences
+    for df_batched, df_standalone in zip(batched, standalone):
+        pd.testing.assert_frame_equal(df_batched, df_standalone)
+    assert "S3 quote of A" not in batched[0]["masked_text"].tolist()
+    # Sentences shared by several themes are searched once
+    searched = sorted(
+        tuple(call.kwargs["sentences"])
+        for call in stages.search_by_companies.call_args_list
+    )
+    assert searched == [("S1",), ("S2",), ("S3",)]
+
+
+def test_pipeline_extend_merges_previous_chunks(stages, theme_tree):
+    df_previous = pd.DataFrame(
+        {
+            "Company": ["A", "B"],
+            "Date": ["2025-01-01", "2025-01-01"],
+            "Document ID": ["D1", "D2"],
+            "Quote": ["Old quote", "Other quote"],
+            "Theme": ["Sub-theme", "Sub-theme"],
+        }
+    )
+    df_motivation_previous = pd.DataFrame(
+        {"Company": ["A", "B"], "Motivation": ["Old", "Unchanged"]}
+    )
+    stages.ScreenerLabeler.return_value.post_process_dataframe.side_effect = lambda df: (
+        df.assign(Company="A", Date="2026-01-01", **{"Document ID": "D3"}, Quote="New")
+    )
+    stages.get_scored_df.return_value = pd.DataFrame({"Company": ["A", "B"]})
+
+    results = make_pipeline(theme_tree=theme_tree).extend(
+        df_previous, df_motivation_previous, frequency="M"
+    )
+
+    assert stages.search_by_companies.call_args.kwargs["start_date"] == "2025-01-01"
+    assert results["df_labeled"]["Quote"].tolist() == [
+        "Old quote",
+        "New",
+        "Other quote",
+    ]
+    scored = stages.get_scored_df.call_args_list[0].args[0]
+    assert len(scored) == 3
+    df_motivated = stages.Motivation.return_value.generate_company_motivations.call_args
+    assert set(df_motivated.kwargs["df"]["Company"]) == {"A"}
+    assert dict(results["df_motivation"].values.tolist()) == {
+        "A": "Growth",
+        "B": "Unchanged",
+    }
+
+
+def test_pipeline_extend_without_new_content(stages, theme_tree):
+    stages.search_by_companies.return_value = pd.DataFrame()
+    df_previous = pd.DataFrame(
+        {
+            "Company": ["A"],
+            "Date": ["2025-01-01"],
+            "Document ID": ["D1"],
+            "Quote": ["Old quote"],
+            "Theme": ["Sub-theme"],
+        }
+    )
+    df_motivation_previous = pd.DataFrame({"Company": ["A"], "Motivation": ["Old"]})
+
+    results = make_pipeline(theme_tree=theme_tree).extend(
+        df_previous, df_motivation_previous, frequency="M"
+    )
+
+    stages.Motivation.assert_not_called()
+    assert results["df_motivation"]["Motivation"].tolist() == ["Old"]
+
+
+@pytest.fixture
+def sharded_stages(stages):
+    def search_by_companies(companies, **kwargs):
+        return pd.DataFrame(
+            {
+                "entity_id": [company.id for company in companies],
+                "masked_text": [f"Quote of {company.id}" for company in companies],
+            }
+        )
+
+    stages.search_by_companies.side_effect = search_by_companies
+    stages.ScreenerLabeler.return_value.get_labels.side_effect = lambda **kwargs: (
+        pd.DataFrame({"Theme": ["Sub-theme"] * len(kwargs["texts"])})
+    )
+    stages.ScreenerLabeler.return_value.post_process_dataframe.side_effect = lambda df: (
+        df.assign(Company=df["entity_id"], Ticker="T", Industry="I")
+    )
+    return stages
+
+
+def test_pipeline_screens_shards_and_scores_merged_chunks(sharded_stages, theme_tree):
+    companies = [MagicMock(id=company_id) for company_id in ("D", "C", "B", "A")]
+    screener = ThematicScreenerPipeline(
+        bigdata=MagicMock(),
+        theme_tree=theme_tree,
+        shards=2,
+        llm_model="openai::gpt-4o-mini",
+        main_theme="Theme",
+        focus="",
+        companies=companies,
+        start_date="2025-01-01",
+        end_date="2025-12-31",
+        document_type=DocumentType.TRANSCRIPTS,
+    )
+    observer = MagicMock()
+    screener.register_observer(observer)
+
+    results = screener.screen_companies(frequency="M")
+
+    searched = [
+        [company.id for company in call.kwargs["companies"]]
+        for call in sharded_stages.search_by_companies.call_args_list
+    ]
+    assert sorted(searched) == [["B", "A"], ["D", "C"]]
+    assert results["df_labeled"]["Company"].tolist() == ["A", "B", "C", "D"]
+    scored = sharded_stages.get_scored_df.call_args_list[0].args[0]
+    assert len(scored) == 4
+    sharded_stages.Motivation.return_value.generate_company_motivations.assert_called_once()
+    messages = [call.args[0].message for call in observer.update.call_args_list]
+    assert "[Shard 1/2] Completed with 2 labeled chunks" in messages
+    assert "[Shard 2/2] Completed with 2 labeled chunks" in messages
+
+
+def test_pipeline_retries_failed_shard(sharded_stages, theme_tree):
+    search_by_companies = sharded_stages.search_by_companies.side_effect
+    failures = []
+
+    def flaky_search(companies, **kwargs):
+        if companies[0].id == "A" and not failures:
+            failures.append(companies)
+            raise RuntimeError("Search failed")
+        return search_by_companies(companies, **kwargs)
+
+    sharded_stages.search_by_companies.side_effect = flaky_search
+    screener = ThematicScreenerPipeline(
+        bigdata=MagicMock(),
+        theme_tree=theme_tree,
+        shards=2,
+        shard_retries=1,
+        llm_model="openai::gpt-4o-mini",
+        main_theme="Theme",
+        focus="",
+        companies=[MagicMock(id=company_id) for company_id in ("A", "B", "C")],
+        start_date="2025-01-01",
+        end_date="2025-12-31",
+        document_type=DocumentType.TRANSCRIPTS,
+    )
+
+    results = screener.screen_companies(frequency="M")
+
+    assert len(failures) == 1
+    assert sharded_stages.search_by_companies.call_count == 3
+    assert results["df_labeled"]["Company"].tolist() == ["A", "B", "C"]
+
+
+def test_pipeline_tunes_batch_size_between_rounds(stages, theme_tree, monkeypatch):
+    monkeypatch.setattr(pipeline.settings, "AUTOTUNE_INITIAL_BATCH_SIZE", 2)
+    monkeypatch.setattr(pipeline.settings, "AUTOTUNE_ROUND_BATCHES", 1)
+    monkeypatch.setattr(pipeline.settings, "AUTOTUNE_DOCUMENTS_PER_ENTITY", 10)
+    slow_rounds = iter([False, True, False])
+
+    def search_by_companies(companies, batch_size, **kwargs):
+        stats = current_search_stats.get()
+        stats.record(60 if next(slow_rounds) else 0.1, failed=False)
+        return pd.DataFrame({"masked_text": [f"{company}" for company in companies]})
+
+    stages.search_by_companies.side_effect = search_by_companies
+    companies = [f"C{i}" for i in range(8)]
+    screener = make_pipeline(theme_tree=theme_tree, companies=companies)
+
+    df_sentences = screener.search(theme_tree, AUTO, AUTO, "M")
+
+    # Grows from 2 to 4 companies per query, until a slow round halves it back to 2
+    batch_sizes = [
+        call.kwargs["batch_size"] for call in stages.search_by_companies.call_args_list
+    ]
+    assert batch_sizes == [2, 4, 2]
+    assert [
+        call.kwargs["document_limit"]
+        for call in stages.search_by_companies.call_args_list
+    ] == [20, 40, 20]
+    assert df_sentences["masked_text"].tolist() == companies
+    assert screener.get_search_parameters(AUTO, AUTO) == SearchParameters(
+        batch_size=2, document_limit=20, tuned=True, batch_sizes=[2, 4, 2]
+    )
+
+
+def test_pipeline_search_parameters_without_tuning(stages, theme_tree):
+    screener = make_pipeline(theme_tree=theme_tree)
+
+    screener.search(theme_tree, AUTO, 5, "M")
+
+    assert stages.search_by_companies.call_args.kwargs["document_limit"] == 50
+    assert screener.get_search_parameters(5, AUTO) == SearchParameters(
+        batch_size=5, document_limit=50
+    )
+
+
+def test_pipeline_resumes_from_checkpoints(stages, theme_tree, tmp_path):
+    checkpoints = WorkflowCheckpoints(str(tmp_path), uuid4())
+    labeler = stages.ScreenerLabeler.return_value
+    labeler.get_labels.side_effect = RuntimeError("Labeling failed")
+    with pytest.raises(RuntimeError):
+        make_pipeline(checkpoints=checkpoints).screen_companies(frequency="M")
+    assert checkpoints.completed_stages() == ["taxonomy", "chunks"]
+
+    # The retry reuses the chunks searched by the failed attempt
+    labeler.get_labels.side_effect = None
+    stages.generate_theme_tree.reset_mock()
+    stages.search_by_companies.reset_mock()
+    resumed_tree = SemanticTree.from_dict(checkpoints.load_json("taxonomy"))
+    results = make_pipeline(
+        theme_tree=resumed_tree, checkpoints=checkpoints
+    ).screen_companies(frequency="M")
+
+    stages.generate_theme_tree.assert_not_called()
+    stages.search_by_companies.assert_not_called()
+    assert results["df_labeled"]["Theme"].tolist() == ["Sub-theme"]
+    assert checkpoints.completed_stages() == ["taxonomy", "chunks", "labeled"]
@@ -0,0 +1,165 @@
+import asyncio
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, create_engine
+
+from bigdata_thematic_screener import rate_limit
+from bigdata_thematic_screener.rate_limit import (
+    AsyncRateLimitedResponses,
+    ProviderRateLimit,
+    RateLimitedLLMEngine,
+    RateLimitedResponses,
+    RateLimitedSearchManager,
+    RateLimits,
+    SharedTokenBucket,
+    TokenBucket,
+    estimate_tokens,
+    install_rate_limits,
+    throttle,
+    track_throttling,
+)
+
+
+class StubLLMEngine:
+    provider_name = "stub"
+
+    def get_response(self, chat_history: list[dict[str, str]], **kwargs) -> str:
+        return "x" * 400
+
+
+class AsyncStubLLMEngine(StubLLMEngine):
+    async def get_response(self, chat_history: list[dict[str, str]], **kwargs) -> str:
+        return StubLLMEngine.get_response(self, chat_history, **kwargs)
+
+
+class RateLimitedStubLLMEngine(RateLimitedResponses, StubLLMEngine):
+    pass
+
+
+class AsyncRateLimitedStubLLMEngine(AsyncRateLimitedResponses, AsyncStubLLMEngine):
+    pass
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    limits = RateLimits(
+        llm_requests_per_minute=60,
+        llm_tokens_per_minute=60_000,
+        bigdata_requests_per_minute=0,
+    )
+    monkeypatch.setattr(rate_limit, "rate_limits", limits)
+    return limits
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def test_token_bucket_waits_for_debt_to_be_refilled():
+    bucket = TokenBucket(per_minute=60, capacity=2)
+
+    assert bucket.reserve(1) == 0
+    assert bucket.reserve(1) == 0
+    # Each following reservation waits one more second, at 1 unit per second
+    assert bucket.reserve(1) == pytest.approx(1, abs=0.05)
+    assert bucket.reserve(1) == pytest.approx(2, abs=0.05)
+
+
+def test_shared_token_bucket_is_shared_through_the_database(engine):
+    first = SharedTokenBucket(engine, "provider:requests", per_minute=60, capacity=2)
+    second = SharedTokenBucket(engine, "provider:requests", per_minute=60, capacity=2)
+    other = SharedTokenBucket(engine, "other:requests", per_minute=60, capacity=2)
+
+    assert first.reserve(1) == 0
+    assert second.reserve(1) == 0
+    assert other.reserve(1) == 0
+    assert first.reserve(1) == pytest.approx(1, abs=0.05)
+    assert second.reserve(1) == pytest.approx(2, abs=0.05)
+
+
+def test_shared_token_bucket_concurrent_reservations(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'limits.db'}")
+    SQLModel.metadata.create_all(engine)
+    bucket = SharedTokenBucket(engine, "provider:requests", per_minute=6, capacity=1)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        waits = sorted(executor.map(lambda _: bucket.reserve(1), range(8)))
+
+    # Every reservation is counted once, 10 seconds apart
+    assert waits[0] == 0
+    assert waits[-1] == pytest.approx(70, abs=1)
+
+
+def test_provider_rate_limit_waits_for_both_budgets():
+    rate = ProviderRateLimit(
+        requests=TokenBucket(per_minute=60, capacity=10),
+        tokens=TokenBucket(per_minute=600, capacity=100),
+    )
+
+    assert rate.reserve(tokens=100) == 0
+    rate.charge(50)
+    # Enough requests left, but 50 tokens in debt at 10 tokens per second
+    assert rate.reserve(tokens=0) == 0
+    assert rate.reserve(tokens=10) == pytest.approx(6, abs=0.05)
+
+
+def test_disabled_budgets_are_not_enforced():
+    limits = RateLimits(0, 0, 0)
+
+    assert limits.get("openai").reserve(tokens=10**9) == 0
+    assert limits.get("bigdata").reserve() == 0
+
+
+def test_throttle_records_waits_in_current_workflow(monkeypatch):
+    limits = RateLimits(6000, 0, 0)
+    monkeypatch.setattr(rate_limit, "rate_limits", limits)
+    limits.get("stub").reserve()
+    limits.get("stub").requests.reserve(5999)
+
+    with track_throttling() as stats:
+        throttle("stub")
+        throttle("bigdata")
+
+    assert stats.calls == {"stub": 1, "bigdata": 1}
+    assert stats.waits["stub"] == pytest.approx(0.01, abs=0.005)
+    assert stats.waits["bigdata"] == 0
+    assert "bigdata: 0.0s over 1 calls" in stats.format()
+    assert rate_limit.current_throttle_stats.get() is None
+
+
+def test_rate_limited_engine_counts_prompt_and_response_tokens(limits):
+    with track_throttling() as stats:
+        engine = RateLimitedStubLLMEngine()
+    prompt = [{"role": "user", "content": "y" * 400}]
+
+    assert engine.get_response(prompt) == "x" * 400
+    assert (
+        asyncio.run(AsyncRateLimitedStubLLMEngine().get_response(prompt)) == "x" * 400
+    )
+    # Stats of the context the engine was created in
+    assert stats.calls == {"stub": 1}
+    tokens = limits.get("stub").tokens
+    assert tokens.reserve(0) == 0
+    assert tokens.capacity - tokens._tokens == pytest.approx(
+        4 * estimate_tokens("x" * 400), abs=5
+    )
+
+
+def test_install_rate_limits(monkeypatch, limits):
+    tree = importlib.import_module(rate_limit.TREE_MODULE)
+    search = importlib.import_module(rate_limit.SEARCH_MODULE)
+    monkeypatch.setattr(tree, "LLMEngine", StubLLMEngine, raising=False)
+    monkeypatch.setattr(search, "SearchManager", search.SearchManager)
+
+    install_rate_limits(limits)
+
+    assert rate_limit.rate_limits is limits
+    # The theme trees are generated within the rate limits, without the response cache
+    assert tree.LLMEngine is RateLimitedLLMEngine
+    assert search.SearchManager is RateLimitedSearchManager
@@ -0,0 +1,135 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from bigdata_client.models.entities import Company
+
+from bigdata_thematic_screener.cache import get_cache_stats
+from bigdata_thematic_screener.resolution import (
+    ResolutionCache,
+    get_entities_in_chunks,
+    prepare_companies,
+    resolution_cache_key,
+    resolve_companies,
+)
+
+
+def make_entity(entity_id: str):
+    if entity_id == "C":
+        return SimpleNamespace(id=entity_id, entity_type="PEOP")
+    return Company(
+        id=entity_id,
+        name=f"Company {entity_id}",
+        volume=None,
+        description=None,
+        entity_type="COMP",
+        company_type=None,
+        country="US",
+        sector=None,
+        industry_group=None,
+        industry=None,
+        ticker=None,
+        webpage=None,
+        isin_values=[],
+        cusip_values=[],
+        sedol_values=[],
+        listing_values=[],
+    )
+
+
+@pytest.fixture
+def bigdata():
+    bigdata = MagicMock()
+    bigdata.watchlists.get.return_value.items = ["A", "B", "A", "C"]
+    bigdata.knowledge_graph.get_entities.side_effect = lambda ids: [
+        make_entity(entity_id) for entity_id in ids
+    ]
+    return bigdata
+
+
+@pytest.fixture
+def cache():
+    return ResolutionCache(max_entries=10, ttl_seconds=60)
+
+
+def test_prepare_companies_dedups_and_keeps_companies(bigdata, cache):
+    companies = prepare_companies("watchlist-id", bigdata, cache)
+    assert [company.id for company in companies] == ["A", "B"]
+
+
+def test_prepare_companies_no_entities(bigdata, cache):
+    bigdata.knowledge_graph.get_entities.side_effect = lambda ids: []
+    with pytest.raises(ValueError):
+        prepare_companies(["A"], bigdata, cache)
+
+
+def test_resolve_companies_uses_cache(bigdata, cache):
+    stats = get_cache_stats("entity_resolution")
+    hits, misses = stats.hits, stats.misses
+
+    first = resolve_companies("watchlist-id", bigdata, cache)
+    second = resolve_companies("watchlist-id", bigdata, cache)
+
+    assert not first.cache_hit
+    assert second.cache_hit
+    assert second.companies == first.companies
+    assert bigdata.watchlists.get.call_count == 1
+    assert (stats.hits - hits, stats.misses - misses) == (1, 1)
+
+
+def test_resolve_companies_without_cache(bigdata):
+    resolve_companies(["A", "B"], bigdata, cache=None)
+    resolve_companies(["A", "B"], bigdata, cache=None)
+    assert bigdata.knowledge_graph.get_entities.call_count == 2
+
+
+def test_resolution_cache_key():
+    assert resolution_cache_key("watchlist-id") == "watchlist:watchlist-id"
+    assert resolution_cache_key(["A", "B"]) == resolution_cache_key(["B", "A", "B"])
+    assert resolution_cache_key(["A", "B"]) != resolution_cache_key(["A"])
+
+
+def test_resolution_cache_disk_tier(bigdata, tmp_path):
+    path = str(tmp_path / "resolution.db")
+    resolve_companies(["A", "B"], bigdata, ResolutionCache(10, 60, disk_path=path))
+
+    # A new process starts with an empty memory tier
+    restarted = ResolutionCache(10, 60, disk_path=path)
+    resolution = resolve_companies(["B", "A"], bigdata, restarted)
+
+    assert resolution.cache_hit
+    assert [company.id for company in resolution.companies] == ["A", "B"]
+    assert bigdata.knowledge_graph.get_entities.call_count == 1
+
+
+def test_get_entities_in_chunks_keeps_order(bigdata):
+    entity_ids = [f"E{i}" for i in range(10)] + ["E0"]
+
+    entities = get_entities_in_chunks(bigdata, entity_ids, chunk_size=3, max_workers=4)
+
+    assert [entity.id for entity in entities] == [f"E{i}" for i in range(10)]
+    assert bigdata.knowledge_graph.get_entities.call_count == 4
+
+
+def test_get_entities_in_chunks_retries_failed_chunks(bigdata, monkeypatch):
+    monkeypatch.setattr(
+        "bigdata_thematic_screener.resolution.time.sleep", lambda _: None
+    )
+    get_entities = bigdata.knowledge_graph.get_entities.side_effect
+    failures = {"E3": 1}
+
+    def flaky_get_entities(ids):
+        if failures.get(ids[0], 0) > 0:
+            failures[ids[0]] -= 1
+            raise TimeoutError("Timed out")
+        return get_entities(ids)
+
+    bigdata.knowledge_graph.get_entities.side_effect = flaky_get_entities
+    entity_ids = [f"E{i}" for i in range(6)]
+
+    entities = get_entities_in_chunks(bigdata, entity_ids, chunk_size=3, max_retries=1)
+    assert [entity.id for entity in entities] == entity_ids
+
+    failures["E3"] = 2
+    with pytest.raises(TimeoutError):
+        get_entities_in_chunks(bigdata, entity_ids, chunk_size=3, max_retries=1)
@@ -0,0 +1,52 @@
+import pandas as pd
+
+from bigdata_thematic_screener.retrieval import RetrievalCache, compute_query_hash
+
+
+def test_retrieval_cache_roundtrip(tmp_path):
+    cache = RetrievalCache(str(tmp_path / "retrieval.db"), ttl_seconds=60)
+    df = pd.DataFrame(
+        {
+            "timestamp_utc": pd.to_datetime(["2025-01-01", "2025-02-01"]),
+            "entity_id": ["A", "A"],
+            "masked_text": ["Quote 1", "Quote 2"],
+        }
+    )
+
+    cache.set("key", df)
+
+    pd.testing.assert_frame_equal(cache.get("key"), df)
+    assert cache.get("other") is None
+
+
+def test_retrieval_cache_expires_entries(tmp_path):
+    cache = RetrievalCache(str(tmp_path / "retrieval.db"), ttl_seconds=-1)
+    cache.set("key", pd.DataFrame({"entity_id": ["A"]}))
+
+    assert cache.get("key") is None
+
+
+def test_retrieval_cache_key():
+    key = RetrievalCache.compute_key(
+        "A", "TRANSCRIPTS", [2025, 2024], ("2025-01-01", "2025-12-31", "M"), "hash"
+    )
+
+    assert key == RetrievalCache.compute_key(
+        "A", "TRANSCRIPTS", [2024, 2025], ("2025-01-01", "2025-12-31", "M"), "hash"
+    )
+    assert key != RetrievalCache.compute_key(
+        "B", "TRANSCRIPTS", [2024, 2025], ("2025-01-01", "2025-12-31", "M"), "hash"
+    )
+    assert key != RetrievalCache.compute_key(
+        "A", "TRANSCRIPTS", [2024, 2025], ("2025-01-01", "2025-12-31", "Y"), "hash"
+    )
+
+
+def test_query_hash():
+    query_hash = compute_query_hash("Sentence", 10, 10, None)
+
+    assert query_hash == compute_query_hash("Sentence", 10, 10, None)
+    assert query_hash != compute_query_hash("Other sentence", 10, 10, None)
+    assert query_hash != compute_query_hash("Sentence", 20, 10, None)
+    assert query_hash != compute_query_hash("Sentence", 10, 5, None)
+    assert query_hash != compute_query_hash("Sentence", 10, 10, 0.5)
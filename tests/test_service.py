@@ -1,13 +1,37 @@
+from unittest.mock import MagicMock
+from uuid import uuid4
+
 import pandas as pd
 import pytest
+from pydantic import ValidationError
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
 
+from bigdata_thematic_screener import service
+from bigdata_thematic_screener.api.models import (
+    DocumentType,
+    FrequencyEnum,
+    ThematicScreenRequest,
+    WorkflowStatus,
+)
+from bigdata_thematic_screener.api.storage import StorageManager
+from bigdata_thematic_screener.checkpoints import get_workflow_checkpoints
 from bigdata_thematic_screener.models import (
+    LabeledChunk,
     LabeledContent,
     ThematicScreenerResponse,
     ThemeScoring,
     ThemeTaxonomy,
 )
-from bigdata_thematic_screener.service import SemanticTree, build_response
+from bigdata_thematic_screener.service import (
+    LABELED_CHUNK_COLUMNS,
+    SemanticTree,
+    build_response,
+    labeled_content_from_df,
+    labeled_content_to_df,
+    motivations_to_df,
+    process_request,
+)
 
 
 @pytest.fixture
@@ -109,3 +133,117 @@ def test_build_response(df_company, df_labeled, df_motivation, theme_tree):
     assert isinstance(response.theme_scoring, ThemeScoring)
     assert isinstance(response.content, LabeledContent)
     assert len(response.content.root) == 2
+
+
+def test_stored_report_round_trips_to_dataframes(
+    df_company, df_labeled, df_motivation, theme_tree
+):
+    response = build_response(df_company, df_motivation, df_labeled, theme_tree)
+
+    pd.testing.assert_frame_equal(labeled_content_to_df(response.content), df_labeled)
+    pd.testing.assert_frame_equal(
+        motivations_to_df(response.theme_scoring), df_motivation
+    )
+
+
+def test_build_response_joins_first_motivation(df_company, df_labeled, theme_tree):
+    df_motivation = pd.DataFrame(
+        {"Company": ["B", "B"], "Motivation": ["Decline", "Duplicate"]}
+    )
+
+    response = build_response(df_company, df_motivation, df_labeled, theme_tree)
+
+    scoring = response.theme_scoring.root
+    assert scoring["A"].motivation is None
+    assert scoring["B"].motivation == "Decline"
+    # Scores of a theme missing for some companies are not reported
+    assert scoring["A"].themes.root == {"Theme1": 55}
+    assert scoring["B"].themes.root == {"Theme1": 45}
+
+
+def test_labeled_content_matches_validated_chunks(df_labeled):
+    df_labeled.loc[0, "Ticker"] = None
+
+    content = labeled_content_from_df(df_labeled)
+
+    assert content.root[0].ticker is None
+    assert content == LabeledContent(
+        root=[
+            LabeledChunk(
+                **{
+                    field: record[column]
+                    for field, column in LABELED_CHUNK_COLUMNS.items()
+                }
+            )
+            for record in df_labeled.to_dict(orient="records")
+        ]
+    )
+    assert labeled_content_from_df(pd.DataFrame()).root == []
+
+
+def test_labeled_content_validates_untrusted_columns(df_labeled):
+    df_labeled["Date"] = pd.to_datetime(df_labeled["Date"])
+
+    with pytest.raises(ValidationError):
+        labeled_content_from_df(df_labeled)
+
+
+def test_retry_resumes_with_checkpointed_tree(
+    tmp_path, monkeypatch, df_company, df_labeled, df_motivation, theme_tree
+):
+    monkeypatch.setattr(service.settings, "CHECKPOINT_DIR", str(tmp_path))
+    monkeypatch.setattr(service.settings, "TAXONOMY_CACHE_ENABLED", True)
+    monkeypatch.setattr(service, "get_retrieval_cache", lambda: None)
+    monkeypatch.setattr(service, "send_report_trace", lambda *args: None)
+    pipeline_trees = []
+
+    class StubPipeline:
+        def __init__(self, theme_tree, **kwargs):
+            pipeline_trees.append(theme_tree)
+            self.theme_tree = theme_tree
+
+        def register_observer(self, observer):
+            pass
+
+        def screen_companies(self, **kwargs):
+            return {
+                "df_labeled": df_labeled,
+                "df_company": df_company,
+                "df_motivation": df_motivation,
+                "theme_tree": self.theme_tree,
+            }
+
+        def get_search_parameters(self, batch_size, document_limit):
+            return None
+
+    monkeypatch.setattr(service, "ThematicScreenerPipeline", StubPipeline)
+    request = ThematicScreenRequest(
+        theme="Theme",
+        companies=["4A6F00"],
+        start_date="2025-01-01",
+        end_date="2025-12-31",
+        fiscal_year=2025,
+        document_type=DocumentType.TRANSCRIPTS,
+        frequency=FrequencyEnum.monthly,
+    )
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    request_id = uuid4()
+    with Session(engine) as session:
+        storage_manager = StorageManager(session)
+        storage_manager.create_workflow(request_id, request, "worker-a", 60)
+        # The failed attempt labeled the chunks with the tree it generated, and another
+        # workflow cached a different tree for the same theme since
+        workflow_checkpoints = get_workflow_checkpoints(request_id)
+        workflow_checkpoints.save_companies([])
+        workflow_checkpoints.save_json("taxonomy", theme_tree._to_dict())
+        cached_tree = SemanticTree(label="Other", node=1, summary="Other tree")
+        service.save_generated_theme_tree(request, cached_tree, storage_manager)
+
+        response = process_request(request, MagicMock(), request_id, storage_manager)
+
+        assert [tree.label for tree in pipeline_trees] == ["Root"]
+        assert response.theme_taxonomy.label == "Root"
+        assert storage_manager.get_status(request_id) == WorkflowStatus.COMPLETED
+        # The cache holds the tree of the report
+        assert service.get_cached_theme_tree(request, storage_manager).label == "Root"
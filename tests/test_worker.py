@@ -0,0 +1,215 @@
+import multiprocessing
+import os
+import time
+from uuid import UUID, uuid4
+
+import pytest
+from sqlmodel import Session, SQLModel, create_engine
+
+from bigdata_thematic_screener import worker
+from bigdata_thematic_screener.api.models import (
+    DocumentType,
+    FrequencyEnum,
+    ThematicScreenRequest,
+    WorkflowStatus,
+)
+from bigdata_thematic_screener.api.scheduler import JobScheduler
+from bigdata_thematic_screener.api.sql_models import SQLWorkflowStatus
+from bigdata_thematic_screener.api.storage import StorageManager
+from bigdata_thematic_screener.checkpoints import get_workflow_checkpoints
+from bigdata_thematic_screener.models import (
+    ThematicScreenerResponse,
+    ThemeScoring,
+    ThemeTaxonomy,
+)
+from bigdata_thematic_screener.worker import WorkflowWorker
+
+
+@pytest.fixture
+def screen_request():
+    return ThematicScreenRequest(
+        theme="Supply Chain Reshaping",
+        companies=["4A6F00", "D8442A"],
+        start_date="2025-01-01",
+        end_date="2025-12-31",
+        fiscal_year=2025,
+        document_type=DocumentType.TRANSCRIPTS,
+        frequency=FrequencyEnum.monthly,
+    )
+
+
+@pytest.fixture
+def db_string(tmp_path):
+    db_string = f"sqlite:///{tmp_path / 'workflows.db'}"
+    SQLModel.metadata.create_all(create_engine(db_string))
+    return db_string
+
+
+def queue_workflows(db_string: str, request: ThematicScreenRequest, count: int):
+    request_ids = [uuid4() for _ in range(count)]
+    with Session(create_engine(db_string)) as session:
+        storage_manager = StorageManager(session)
+        for request_id in request_ids:
+            storage_manager.create_workflow(request_id, request, None, 60)
+    return request_ids
+
+
+def claim_workflows(db_string: str, worker_id: str, results):
+    with Session(create_engine(db_string)) as session:
+        storage_manager = StorageManager(session)
+        claimed = []
+        while batch := storage_manager.claim_queued_workflows(worker_id, 60, limit=1):
+            claimed.extend(str(request_id) for request_id, _ in batch)
+        results.put((worker_id, claimed))
+
+
+def test_workers_in_several_processes_claim_each_workflow_once(
+    db_string, screen_request
+):
+    request_ids = queue_workflows(db_string, screen_request, 20)
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=claim_workflows, args=(db_string, f"worker-{i}", results)
+        )
+        for i in range(3)
+    ]
+    for process in processes:
+        process.start()
+    claims = dict(results.get(timeout=60) for _ in processes)
+    for process in processes:
+        process.join(timeout=60)
+
+    claimed = [request_id for ids in claims.values() for request_id in ids]
+    assert sorted(claimed) == sorted(str(request_id) for request_id in request_ids)
+    with Session(create_engine(db_string)) as session:
+        for worker_id, ids in claims.items():
+            for request_id in ids:
+                workflow_status = session.get(SQLWorkflowStatus, UUID(request_id))
+                assert workflow_status.lease_owner == worker_id
+
+
+def test_worker_runs_claimed_workflows(db_string, screen_request, monkeypatch):
+    def process_request(request, bigdata, request_id, storage_manager, extends_id):
+        storage_manager.mark_workflow_as_completed(
+            request_id,
+            request,
+            ThematicScreenerResponse(
+                theme_scoring=ThemeScoring(root={}),
+                theme_taxonomy=ThemeTaxonomy(label="Root", node=1, summary=None),
+            ),
+        )
+
+    monkeypatch.setattr(worker, "process_request", process_request)
+    request_ids = queue_workflows(db_string, screen_request, 3)
+    scheduler = JobScheduler(max_concurrent_jobs=2, max_queued_jobs=10)
+    workflow_worker = WorkflowWorker(
+        create_engine(db_string), bigdata=None, scheduler=scheduler, worker_id="w"
+    )
+
+    workflow_worker.maintain_queue()
+    # Only claims the workflows it can start
+    assert len(scheduler.job_ids()) <= 2
+    deadline = time.monotonic() + 10
+    with Session(create_engine(db_string)) as session:
+        storage_manager = StorageManager(session)
+        while time.monotonic() < deadline:
+            workflow_worker.maintain_queue()
+            statuses = [
+                storage_manager.get_status(request_id) for request_id in request_ids
+            ]
+            # Leases are released once the jobs return
+            if (
+                all(status == WorkflowStatus.COMPLETED for status in statuses)
+                and not scheduler.job_ids()
+            ):
+                break
+            time.sleep(0.05)
+        assert statuses == [WorkflowStatus.COMPLETED] * 3
+        for request_id in request_ids:
+            session.expire_all()
+            assert session.get(SQLWorkflowStatus, request_id).lease_owner is None
+    scheduler.shutdown()
+
+
+def test_worker_runs_batches_together(db_string, screen_request, monkeypatch):
+    batches = []
+
+    def process_batch(workflows, bigdata, storage_manager):
+        batches.append([request_id for request_id, _ in workflows])
+        for request_id, request in workflows:
+            storage_manager.mark_workflow_as_completed(
+                request_id,
+                request,
+                ThematicScreenerResponse(
+                    theme_scoring=ThemeScoring(root={}),
+                    theme_taxonomy=ThemeTaxonomy(label="Root", node=1, summary=None),
+                ),
+            )
+
+    monkeypatch.setattr(worker, "process_batch", process_batch)
+    batch_id = uuid4()
+    request_ids = [uuid4() for _ in range(3)]
+    with Session(create_engine(db_string)) as session:
+        storage_manager = StorageManager(session)
+        for request_id in request_ids:
+            storage_manager.create_workflow(
+                request_id, screen_request, None, 60, batch_id=batch_id
+            )
+    scheduler = JobScheduler(max_concurrent_jobs=1, max_queued_jobs=10)
+    workflow_worker = WorkflowWorker(
+        create_engine(db_string), bigdata=None, scheduler=scheduler, worker_id="w"
+    )
+
+    # Claims a single workflow, the batch job claims the others
+    workflow_worker.maintain_queue()
+    deadline = time.monotonic() + 10
+    with Session(create_engine(db_string)) as session:
+        storage_manager = StorageManager(session)
+        while time.monotonic() < deadline:
+            session.expire_all()
+            batch = storage_manager.get_batch(batch_id)
+            if batch.status == WorkflowStatus.COMPLETED:
+                break
+            time.sleep(0.05)
+        assert batch.status == WorkflowStatus.COMPLETED
+    assert len(batches) == 1
+    assert sorted(batches[0]) == sorted(request_ids)
+    scheduler.shutdown()
+
+
+def test_worker_removes_expired_checkpoints(
+    tmp_path, db_string, screen_request, monkeypatch
+):
+    monkeypatch.setattr(
+        worker.settings, "CHECKPOINT_DIR", str(tmp_path / "checkpoints")
+    )
+    monkeypatch.setattr(worker.settings, "CHECKPOINT_TTL_SECONDS", 600)
+    failed_id, running_id, recent_id = queue_workflows(db_string, screen_request, 3)
+    deleted_id = uuid4()
+    with Session(create_engine(db_string)) as session:
+        storage_manager = StorageManager(session)
+        storage_manager.update_status(failed_id, WorkflowStatus.FAILED)
+        storage_manager.update_status(running_id, WorkflowStatus.IN_PROGRESS)
+        storage_manager.update_status(recent_id, WorkflowStatus.FAILED)
+        updated_at = time.time() - 3600
+        for request_id in (failed_id, running_id, recent_id, deleted_id):
+            workflow_checkpoints = get_workflow_checkpoints(request_id)
+            workflow_checkpoints.save_json("taxonomy", {"label": "Theme"})
+            if request_id != recent_id:
+                os.utime(workflow_checkpoints.path, (updated_at, updated_at))
+        workflow_worker = WorkflowWorker(
+            create_engine(db_string),
+            bigdata=None,
+            scheduler=JobScheduler(max_concurrent_jobs=1, max_queued_jobs=1),
+            worker_id="w",
+        )
+
+        workflow_worker.remove_expired_checkpoints(storage_manager)
+
+        assert get_workflow_checkpoints(failed_id).completed_stages() == []
+        assert get_workflow_checkpoints(deleted_id).completed_stages() == []
+        # Running workflows resume from their checkpoints
+        assert get_workflow_checkpoints(running_id).completed_stages() == ["taxonomy"]
+        assert get_workflow_checkpoints(recent_id).completed_stages() == ["taxonomy"]